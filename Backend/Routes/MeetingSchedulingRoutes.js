@@ -3,6 +3,8 @@ const router=express.Router();
 const dotenv = require('dotenv');
 const User = require('../Schema/UserSchema');
 const MeetingData = require('../Schema/MeetingDataSchema');
+const Transcript = require('../Schema/TranscriptSchema');
+const crypto = require('crypto');
 dotenv.config();
 
 router.post('/schedule-meeting', async (req, res) => {
@@ -128,54 +130,148 @@ router.post('/schedule-meeting', async (req, res) => {
       return res.status(500).json({ error: error.message });
     }
   });
-  router.post('/update-meeting-info', async (req, res) => {
+  // Transcript fields may be sent inline or as a digest of a transcript uploaded to /transcripts
+  const resolveTranscript = async (inline, ref) => {
+    if (!ref) {
+      return inline;
+    }
+    const transcript = await Transcript.findOne({ digest: ref });
+    if (!transcript) {
+      throw Object.assign(new Error(`Unknown transcript reference ${ref}`), { status: 400 });
+    }
+    return transcript.text;
+  };
+
+  // Store the results of one recorded meeting; returns the HTTP status and body to send
+  const applyMeetingUpdate = async (update) => {
+    const { username, task_id, meeting_minutes_and_tasks } = update;
+
+    // Validate required fields
+    if (!username || !task_id) {
+      return { status: 400, body: { error: 'Username and task_id are required' } };
+    }
+
+    let raw_transcript, adjusted_transcript;
     try {
-      const { username, task_id, raw_transcript, adjusted_transcript, meeting_minutes_and_tasks } = req.body;
-      
-      // Validate required fields
-      if (!username || !task_id) {
-        return res.status(400).json({ error: 'Username and task_id are required' });
-      }
-      
-      // Find the user by username and update the specific task
-      const updatedUser = await User.findOneAndUpdate(
-        { 
-          username: username, 
-          "tasks.uniqueTaskId": task_id 
-        },
-        { 
-          $set: { 
-            "tasks.$.isMeeting.status": "completed",
-            "tasks.$.isMeeting.meetingRawData": raw_transcript,
-            "tasks.$.isMeeting.meetingMinutes": meeting_minutes_and_tasks,
-            "tasks.$.isMeeting.meetingSummary": adjusted_transcript
-          } 
-        },
-        { new: true } // Return the updated document
-      );
-      
-      if (!updatedUser) {
-        return res.status(404).json({ error: 'User or task not found' });
+      raw_transcript = await resolveTranscript(update.raw_transcript, update.raw_transcript_ref);
+      adjusted_transcript = await resolveTranscript(update.adjusted_transcript, update.adjusted_transcript_ref);
+    } catch (error) {
+      if (error.status) {
+        return { status: error.status, body: { error: error.message } };
       }
-      
-      // Find the specific task that was updated
-      const updatedTask = updatedUser.tasks.find(task => task.uniqueTaskId === task_id);
-      
-      res.status(200).json({ 
+      throw error;
+    }
+
+    // Find the user by username and update the specific task
+    const updatedUser = await User.findOneAndUpdate(
+      { 
+        username: username, 
+        "tasks.uniqueTaskId": task_id 
+      },
+      { 
+        $set: { 
+          "tasks.$.isMeeting.status": "completed",
+          "tasks.$.isMeeting.meetingRawData": raw_transcript,
+          "tasks.$.isMeeting.meetingMinutes": meeting_minutes_and_tasks,
+          "tasks.$.isMeeting.meetingSummary": adjusted_transcript
+        } 
+      },
+      { new: true } // Return the updated document
+    );
+
+    if (!updatedUser) {
+      return { status: 404, body: { error: 'User or task not found' } };
+    }
+
+    // Find the specific task that was updated
+    const updatedTask = updatedUser.tasks.find(task => task.uniqueTaskId === task_id);
+
+    return {
+      status: 200,
+      body: {
         message: 'Meeting information updated successfully',
         updatedTask
-      });
-      
+      }
+    };
+  };
+
+  router.post('/update-meeting-info', async (req, res) => {
+    try {
+      const { status, body } = await applyMeetingUpdate(req.body);
+      res.status(status).json(body);
     } catch (error) {
       console.error('Error updating meeting info:', error);
       res.status(500).json({ error: 'Internal server error' });
     }
   });
+
+  // Several meetings' results in one request, sent by the recording service when it is
+  // catching up on deliveries. Each update gets its own status in the response.
+  router.post('/update-meeting-info/batch', async (req, res) => {
+    const { updates } = req.body;
+    if (!Array.isArray(updates)) {
+      return res.status(400).json({ error: 'updates must be an array' });
+    }
+
+    const results = [];
+    for (const update of updates) {
+      try {
+        const { status, body } = await applyMeetingUpdate(update);
+        results.push({ status, error: body.error });
+      } catch (error) {
+        console.error('Error updating meeting info:', error);
+        results.push({ status: 500, error: 'Internal server error' });
+      }
+    }
+    res.json({ results });
+  });
+
+  router.get('/transcripts/:digest', async (req, res) => {
+    try {
+      const transcript = await Transcript.findOne({ digest: req.params.digest });
+      if (!transcript) {
+        return res.status(404).json({ message: 'Transcript not found' });
+      }
+      res.json({ digest: transcript.digest, text: transcript.text });
+    } catch (err) {
+      console.error('Error fetching transcript:', err.message);
+      res.status(500).json({ message: 'Server error' });
+    }
+  });
+
+  // Upload a transcript under the SHA-256 digest of its text; uploading it again is a no-op
+  router.put('/transcripts/:digest', async (req, res) => {
+    try {
+      const { digest } = req.params;
+      const { text } = req.body;
+      if (typeof text !== 'string') {
+        return res.status(400).json({ message: 'text is required' });
+      }
+      if (crypto.createHash('sha256').update(text, 'utf8').digest('hex') !== digest) {
+        return res.status(400).json({ message: 'Digest does not match text' });
+      }
+
+      await Transcript.updateOne({ digest }, { $setOnInsert: { digest, text } }, { upsert: true });
+      res.json({ digest });
+    } catch (err) {
+      console.error('Error storing transcript:', err.message);
+      res.status(500).json({ message: 'Server error' });
+    }
+  });
   
   router.get('/meeting-records', async (req, res) => {
     try {
-      console.log("here");
-      const meetingRecords = await MeetingData.find();
+      // ?since=<ISO date> returns only records created or changed at or after that time,
+      // so the recording scheduler can sync incrementally
+      const filter = {};
+      if (req.query.since) {
+        const since = new Date(req.query.since);
+        if (isNaN(since.getTime())) {
+          return res.status(400).json({ message: 'Invalid since date' });
+        }
+        filter.updatedAt = { $gte: since };
+      }
+      const meetingRecords = await MeetingData.find(filter).sort({ updatedAt: 1 });
       res.json(meetingRecords);
     } catch (err) {
       console.error('Error fetching meeting records:', err.message);
@@ -183,6 +279,93 @@ router.post('/schedule-meeting', async (req, res) => {
     }
   });
   
+  // Atomically claim a meeting record for one Services node. Succeeds when the record is
+  // unclaimed, its claim has expired, or the caller already holds it.
+  router.post('/meeting-records/:taskId/claim', async (req, res) => {
+    try {
+      const { taskId } = req.params;
+      const { owner, ttl_seconds } = req.body;
+      if (!owner || !ttl_seconds) {
+        return res.status(400).json({ message: 'owner and ttl_seconds are required' });
+      }
+
+      const now = new Date();
+      const claimExpiresAt = new Date(now.getTime() + ttl_seconds * 1000);
+      const record = await MeetingData.findOneAndUpdate(
+        {
+          taskId,
+          $or: [{ claimedBy: null }, { claimedBy: owner }, { claimExpiresAt: { $lt: now } }]
+        },
+        { $set: { claimedBy: owner, claimExpiresAt } },
+        { new: true }
+      );
+
+      if (!record) {
+        const existing = await MeetingData.findOne({ taskId });
+        if (!existing) {
+          return res.status(404).json({ message: 'Meeting record not found with this taskId' });
+        }
+        return res.status(409).json({
+          message: 'Meeting record is claimed',
+          claimedBy: existing.claimedBy,
+          claimExpiresAt: existing.claimExpiresAt
+        });
+      }
+
+      res.json({ claimed: true, claimedBy: owner, claimExpiresAt });
+    } catch (err) {
+      console.error('Error claiming meeting record:', err.message);
+      res.status(500).json({ message: 'Server error' });
+    }
+  });
+
+  // Extend a claim; only its holder can
+  router.post('/meeting-records/:taskId/heartbeat', async (req, res) => {
+    try {
+      const { taskId } = req.params;
+      const { owner, ttl_seconds } = req.body;
+      if (!owner || !ttl_seconds) {
+        return res.status(400).json({ message: 'owner and ttl_seconds are required' });
+      }
+
+      const claimExpiresAt = new Date(Date.now() + ttl_seconds * 1000);
+      const record = await MeetingData.findOneAndUpdate(
+        { taskId, claimedBy: owner },
+        { $set: { claimExpiresAt } },
+        { new: true }
+      );
+
+      if (!record) {
+        return res.status(409).json({ message: 'Meeting record is not claimed by this owner' });
+      }
+      res.json({ claimed: true, claimedBy: owner, claimExpiresAt });
+    } catch (err) {
+      console.error('Error renewing meeting record claim:', err.message);
+      res.status(500).json({ message: 'Server error' });
+    }
+  });
+
+  router.post('/meeting-records/:taskId/release', async (req, res) => {
+    try {
+      const { taskId } = req.params;
+      const { owner } = req.body;
+
+      const record = await MeetingData.findOneAndUpdate(
+        { taskId, claimedBy: owner },
+        { $set: { claimedBy: null, claimExpiresAt: null } },
+        { new: true }
+      );
+
+      if (!record) {
+        return res.status(404).json({ message: 'No claim by this owner' });
+      }
+      res.json({ released: true });
+    } catch (err) {
+      console.error('Error releasing meeting record claim:', err.message);
+      res.status(500).json({ message: 'Server error' });
+    }
+  });
+
  router.delete('/delete-meeting-record/:taskId', async (req, res) => {
     try {
       const { taskId } = req.params;
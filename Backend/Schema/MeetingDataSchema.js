@@ -24,6 +24,15 @@ const meetingRecordSchema = new mongoose.Schema({
   username: {
     type: String,
     required: true
+  },
+  // Services node currently recording this meeting, and when its claim lapses without a heartbeat
+  claimedBy: {
+    type: String,
+    default: null
+  },
+  claimExpiresAt: {
+    type: Date,
+    default: null
   }
 }, { timestamps: true });
 
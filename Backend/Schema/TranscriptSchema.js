@@ -0,0 +1,18 @@
+const mongoose = require('mongoose');
+
+// Transcripts uploaded once by the recording service and referenced by their SHA-256 digest
+const transcriptSchema = new mongoose.Schema({
+  digest: {
+    type: String,
+    required: true,
+    unique: true
+  },
+  text: {
+    type: String,
+    required: true
+  }
+}, { timestamps: true });
+
+const Transcript = mongoose.model('Transcript', transcriptSchema);
+
+module.exports = Transcript;
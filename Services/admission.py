@@ -0,0 +1,165 @@
+import os
+import shutil
+import asyncio
+import time
+
+from job_queue import ADHOC, MEMORY_PER_RECORDING_MB
+from metrics import Counter, Gauge, child_process_usage
+
+# Host CPU use (percent of all cores) above which no more recordings are started;
+# ad-hoc ones stop at a lower level, keeping the rest for scheduled meetings
+ADMISSION_MAX_CPU_PERCENT = float(os.getenv("ADMISSION_MAX_CPU_PERCENT", 85))
+ADMISSION_ADHOC_MAX_CPU_PERCENT = float(os.getenv("ADMISSION_ADHOC_MAX_CPU_PERCENT", 70))
+# Free disk space, on the storage volume, below which no more recordings are started
+ADMISSION_MIN_FREE_DISK_MB = int(os.getenv("ADMISSION_MIN_FREE_DISK_MB", 2048))
+# Ad-hoc recordings must leave memory for this many more scheduled ones
+ADMISSION_SCHEDULED_HEADROOM = int(os.getenv("ADMISSION_SCHEDULED_HEADROOM", 1))
+# Ad-hoc requests are refused once this many jobs are already waiting
+ADMISSION_MAX_QUEUED = int(os.getenv("ADMISSION_MAX_QUEUED", 10))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", 60))
+ADMISSION_SAMPLE_SECONDS = 5
+# A recording started this recently has not reached its full memory footprint yet, so
+# it is counted at the expected size on top of what is measured
+RAMP_UP_SECONDS = 60
+
+ADMISSION_REJECTIONS = Counter(
+    "metamate_admission_rejections_total", "Recording requests refused for lack of resources", ["reason"]
+)
+
+
+class Decision:
+    def __init__(self, admitted, reason=None, retry_after=None):
+        self.admitted = admitted
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def __bool__(self):
+        return self.admitted
+
+
+def _read_cpu_times():
+    """(busy, total) jiffies across all cores, from /proc/stat"""
+    with open("/proc/stat") as f:
+        fields = [int(value) for value in f.readline().split()[1:]]
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+    return sum(fields) - idle, sum(fields)
+
+
+def _available_memory_mb():
+    with open("/proc/meminfo") as f:
+        for line in f:
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) / 1024
+    raise ValueError("MemAvailable missing from /proc/meminfo")
+
+
+class AdmissionController:
+    """Decides whether the host can take another recording, from live resource usage
+
+    Host CPU, available memory and free disk are sampled in the background,
+    along with the memory of each running recorder's process tree (Chrome,
+    ffmpeg, Xvfb, ...), which gives the expected size of one more recording.
+    Recordings started within RAMP_UP_SECONDS are counted at that size on top
+    of the measured memory. Scheduled meetings only need room for themselves;
+    ad-hoc ones must also leave memory for ADMISSION_SCHEDULED_HEADROOM more
+    recordings, and stop at a lower CPU level.
+    """
+
+    def __init__(self, job_queue, recorder_pids, storage_dir="storage"):
+        self.job_queue = job_queue
+        self.recorder_pids = recorder_pids
+        self.storage_dir = storage_dir
+
+        self.sample = None
+        self._cpu_times = None
+        self._started = []
+        self._task = None
+
+        Gauge("metamate_host_cpu_percent", "Host CPU use over the last sample",
+              collect=lambda: self._sampled("cpu_percent"))
+        Gauge("metamate_host_available_memory_mb", "Memory available for new processes",
+              collect=lambda: self._sampled("available_memory_mb"))
+        Gauge("metamate_host_free_disk_mb", "Free space on the storage volume",
+              collect=lambda: self._sampled("free_disk_mb"))
+
+    def _sampled(self, field):
+        return {(): self.sample[field]} if self.sample else {}
+
+    def start(self):
+        """Sample in the background; must be called from the running event loop"""
+        self.refresh()
+        self._task = asyncio.create_task(self._run(), name="admission-sampler")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(ADMISSION_SAMPLE_SECONDS)
+            try:
+                # Listed here, on the loop, where the supervisor's set of recorders changes
+                await asyncio.to_thread(self.refresh, self.recorder_pids())
+            except Exception as e:
+                print(f"Resource sampling failed: {e}")
+
+    def refresh(self, pids=None):
+        busy, total = _read_cpu_times()
+        if self._cpu_times and total > self._cpu_times[1]:
+            cpu_percent = 100 * (busy - self._cpu_times[0]) / (total - self._cpu_times[1])
+        else:
+            cpu_percent = 100 * busy / total
+        self._cpu_times = (busy, total)
+
+        recording_mb = []
+        for pid in self.recorder_pids() if pids is None else pids:
+            usage = child_process_usage(pid, include_root=True)
+            recording_mb.append(sum(rss for _, rss in usage.values()) / (1024 * 1024))
+
+        self.sample = {
+            "time": time.time(),
+            "cpu_percent": round(cpu_percent, 1),
+            "available_memory_mb": round(_available_memory_mb()),
+            "free_disk_mb": round(shutil.disk_usage(self.storage_dir).free / (1024 * 1024)),
+            "recordings": len(recording_mb),
+            # Recorders still joining are far smaller than ones capturing a meeting
+            "recording_mb": round(max(recording_mb + [MEMORY_PER_RECORDING_MB])),
+        }
+
+    def note_started(self):
+        """Count a recording that is just starting until its usage shows in the samples"""
+        now = time.time()
+        self._started = [started for started in self._started if now - started < RAMP_UP_SECONDS] + [now]
+
+    def _ramping_up(self):
+        now = time.time()
+        return sum(1 for started in self._started if now - started < RAMP_UP_SECONDS)
+
+    def check(self, priority=ADHOC, request=False):
+        """Whether one more recording of this priority fits right now
+
+        request is set for new recording requests, which are also refused when
+        the queue is long, and counted in the rejection metric.
+        """
+        if request and priority == ADHOC and self.job_queue.depth() >= ADMISSION_MAX_QUEUED:
+            return self._reject("queue_full", f"{ADMISSION_MAX_QUEUED} recordings are already waiting", request)
+
+        sample = self.sample
+        if sample is None:
+            return Decision(True)
+
+        max_cpu_percent = ADMISSION_ADHOC_MAX_CPU_PERCENT if priority == ADHOC else ADMISSION_MAX_CPU_PERCENT
+        if sample["cpu_percent"] > max_cpu_percent:
+            return self._reject("cpu", f"host CPU at {sample['cpu_percent']:.0f}%", request)
+
+        needed = 1 + (ADMISSION_SCHEDULED_HEADROOM if priority == ADHOC else 0)
+        memory_mb = sample["available_memory_mb"] - self._ramping_up() * sample["recording_mb"]
+        if memory_mb < needed * sample["recording_mb"]:
+            return self._reject("memory", f"{memory_mb:.0f} MB available, a recording needs about "
+                                          f"{sample['recording_mb']} MB", request)
+
+        if sample["free_disk_mb"] < ADMISSION_MIN_FREE_DISK_MB:
+            return self._reject("disk", f"{sample['free_disk_mb']} MB free on the storage volume", request)
+
+        return Decision(True)
+
+    def _reject(self, reason, detail, request):
+        if request:
+            ADMISSION_REJECTIONS.inc(reason=reason)
+        return Decision(False, f"{reason}: {detail}", ADMISSION_RETRY_AFTER_SECONDS)
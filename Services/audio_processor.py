@@ -1,17 +1,34 @@
 import os
+import re
 import time
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnableParallel, RunnablePassthrough
 from google.generativeai import configure
-from deepgram import DeepgramClient, PrerecordedOptions
+from transcription import DEFAULT_DEEPGRAM_API_KEY, get_backend
+from result_cache import ResultCache, file_digest, text_digest
+from metrics import OPERATION_SECONDS
+from tracing import span
 
-def remove_non_ascii(text):
-    return ''.join(i for i in text if ord(i) < 128)
+# How transcripts are summarized:
+#   single    - clean the whole transcript in one call, then generate minutes from it
+#   parallel  - clean the transcript and generate minutes from the raw transcript at the same time
+#   mapreduce - clean and take notes on transcript chunks concurrently, then reduce the notes
+#   auto      - mapreduce when the transcript is longer than one chunk, single otherwise
+SUMMARY_MODES = ("single", "parallel", "mapreduce", "auto")
+SUMMARY_MODE = os.getenv("SUMMARY_MODE", "auto")
+SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", 12000))
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", 4))
 
-def product_assistant(ascii_transcript, llm):
-    system_prompt = """You are an intelligent assistant specializing in meeting transcription and summarization. Your task is to process a raw transcript of a meeting and produce two outputs:
+LLM_MODEL = "gemini-2.0-flash"
+LLM_TEMPERATURE = 0.5
+
+# Transcripts and LLM outputs are cached by content hash so a retried job
+# does not pay for transcription or Gemini calls it has already made
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE", "1").lower() not in ("0", "false", "no")
+
+CLEANUP_PROMPT = """You are an intelligent assistant specializing in meeting transcription and summarization. Your task is to process a raw transcript of a meeting and produce two outputs:
 
 Cleaned Transcript
 
@@ -31,31 +48,7 @@ Avoid excessive detail — keep it concise and clear.
 
 Focus on clarity, professionalism, and readability in both outputs. The cleaned transcript should be easy to scan, and the summary should serve as a quick reference for anyone who missed the meeting."""
 
-    prompt_input = system_prompt + "\n" + ascii_transcript
-    response = llm.invoke(prompt_input)
-    return response.content
-
-def process_audio(recording_id, audio_file_path="audio.mp3", api_key=None, deepgram_api_key="b0a780c4baf6565a49a07b8fef1284bd3ad52384", save_files=True):
-    
-    storage_path = os.path.join("transcripts")
-    os.makedirs(storage_path, exist_ok=True)
-    
-    # null checks for api
-    if api_key is None:
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if api_key is None:
-            raise ValueError("Google API key not provided. Please provide it as an argument or set GOOGLE_API_KEY environment variable.")
-    
-    configure(api_key=api_key)
-
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash",
-        google_api_key=api_key,
-        temperature=0.5,
-    )
-
-    # Setting up template and chain
-    template = """
+MINUTES_TEMPLATE = """
     Generate meeting minutes and a list of tasks based on the provided context.
 
     Context:
@@ -69,45 +62,168 @@ def process_audio(recording_id, audio_file_path="audio.mp3", api_key=None, deepg
     - Actionable items with assignees and deadlines
     """
 
-    prompt = ChatPromptTemplate.from_template(template)
+NOTES_TEMPLATE = """You are reading part {part} of {total} of a meeting transcript. Extract concise notes covering:
 
-    chain = (
-        {"context": RunnablePassthrough()}
-        | prompt
+- Key points discussed
+- Decisions made
+- Action items, with assignees and deadlines where mentioned
+
+Only include what is in this part of the transcript.
+
+Transcript part:
+{context}"""
+
+CHUNK_CLEANUP_TEMPLATE = """You are cleaning up part {part} of {total} of a raw meeting transcript. The parts are cleaned separately and joined back together, so return only the cleaned transcript of this part: no headings, summary or commentary.
+
+Remove filler words, false starts, repetitions, and irrelevant small talk.
+
+Correct grammar and punctuation while preserving the original speaker's intent and tone.
+
+Attribute speaker names clearly if provided.
+
+Organize the transcript into readable paragraphs with appropriate line breaks.
+
+Transcript part:
+{context}"""
+
+SUMMARY_TEMPLATE = """Write a brief, high-level summary (3-5 bullet points) of a meeting from the notes below, capturing the most important discussion topics, decisions made, and any next steps. Keep it concise and clear.
+
+Notes:
+{context}"""
+
+COLLAPSE_TEMPLATE = """Merge the following notes from consecutive parts of one meeting into a single set of concise notes. Keep every decision and action item, with assignees and deadlines, and drop repetition.
+
+Notes:
+{context}"""
+
+def remove_non_ascii(text):
+    return ''.join(i for i in text if ord(i) < 128)
+
+def product_assistant(ascii_transcript, llm):
+    prompt_input = CLEANUP_PROMPT + "\n" + ascii_transcript
+    response = llm.invoke(prompt_input)
+    return response.content
+
+def parallel_summarize(ascii_transcript, llm, minutes_chain):
+    """Clean the transcript and generate minutes from the raw transcript concurrently"""
+    cleanup_chain = (
+        RunnableLambda(lambda transcript: CLEANUP_PROMPT + "\n" + transcript)
+        | llm
+        | StrOutputParser()
+    )
+    outputs = RunnableParallel(
+        adjusted_transcript=cleanup_chain,
+        meeting_minutes_and_tasks=minutes_chain,
+    ).invoke(ascii_transcript)
+    return outputs["adjusted_transcript"], outputs["meeting_minutes_and_tasks"]
+
+def split_transcript(text, chunk_chars):
+    """Split a transcript into chunks of at most chunk_chars, breaking at speaker turns, then sentences"""
+    units = []
+    for turn in text.splitlines():
+        turn = turn.strip()
+        if not turn:
+            continue
+        if len(turn) <= chunk_chars:
+            units.append(turn)
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", turn):
+            # A single run-on "sentence" longer than a chunk is cut at word boundaries
+            while len(sentence) > chunk_chars:
+                cut = sentence.rfind(" ", 0, chunk_chars)
+                cut = cut if cut > 0 else chunk_chars
+                units.append(sentence[:cut])
+                sentence = sentence[cut:].strip()
+            if sentence:
+                units.append(sentence)
+
+    return _pack(units, chunk_chars)
+
+def _pack(units, chunk_chars, separator="\n"):
+    """Greedily join consecutive units into chunks no longer than chunk_chars"""
+    chunks = []
+    current = ""
+    for unit in units:
+        if current and len(current) + len(separator) + len(unit) > chunk_chars:
+            chunks.append(current)
+            current = unit
+        else:
+            current = f"{current}{separator}{unit}" if current else unit
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _llm_batch(llm, prompts, max_concurrency):
+    responses = llm.batch(prompts, config={"max_concurrency": max_concurrency})
+    return [response.content for response in responses]
+
+def map_reduce_summarize(ascii_transcript, llm, minutes_chain, chunk_chars=SUMMARY_CHUNK_CHARS, max_concurrency=SUMMARY_MAX_CONCURRENCY):
+    """Clean and take notes on transcript chunks concurrently, then reduce the notes into minutes
+
+    Chunks are cleaned with a prompt that returns only their text, so the
+    joined transcript carries a single summary, written from the reduced notes
+    like the minutes.
+    """
+    chunks = split_transcript(ascii_transcript, chunk_chars)
+    total = len(chunks)
+    print(f"Summarizing transcript in {total} chunks (max {max_concurrency} concurrent LLM calls)...")
+
+    # Map: cleanup and notes for every chunk share one bounded batch
+    cleanup_prompts = [
+        CHUNK_CLEANUP_TEMPLATE.format(part=index + 1, total=total, context=chunk)
+        for index, chunk in enumerate(chunks)
+    ]
+    notes_prompts = [
+        NOTES_TEMPLATE.format(part=index + 1, total=total, context=chunk)
+        for index, chunk in enumerate(chunks)
+    ]
+    outputs = _llm_batch(llm, cleanup_prompts + notes_prompts, max_concurrency)
+    cleaned_chunks = outputs[:total]
+    notes = outputs[total:]
+
+    # Collapse: merge notes until they fit into a single reduce call
+    while len(notes) > 1 and sum(len(note) for note in notes) > chunk_chars:
+        groups = _pack(notes, chunk_chars, separator="\n\n")
+        if len(groups) == len(notes):
+            break
+        print(f"Collapsing {len(notes)} sets of notes into {len(groups)}...")
+        notes = _llm_batch(
+            llm, [COLLAPSE_TEMPLATE.format(context=group) for group in groups], max_concurrency
+        )
+
+    # Reduce: the minutes, and the summary that follows the cleaned transcript
+    summary_chain = (
+        RunnableLambda(lambda context: SUMMARY_TEMPLATE.format(context=context))
         | llm
         | StrOutputParser()
     )
+    outputs = RunnableParallel(
+        summary=summary_chain,
+        meeting_minutes_and_tasks=minutes_chain,
+    ).invoke("\n\n".join(notes))
+
+    adjusted_transcript = (
+        "Cleaned Transcript\n\n" + "\n\n".join(cleaned_chunks)
+        + "\n\nMinimal Summary\n\n" + outputs["summary"]
+    )
+    return adjusted_transcript, outputs["meeting_minutes_and_tasks"]
 
+def transcribe_audio(audio_file_path, backend):
     # Check if audio file exists
     if not os.path.exists(audio_file_path):
         raise FileNotFoundError(f"Audio file not found at {audio_file_path}")
     
     file_size = os.path.getsize(audio_file_path) / (1024 * 1024)  # Size in MB
     
-    print(f"Starting Deepgram transcription. File size: {file_size:.2f} MB")
-    print("Transcribing audio with Deepgram... This may take several minutes.")
+    print(f"Starting {backend.name} transcription. File size: {file_size:.2f} MB")
+    print("Transcribing audio... This may take several minutes.")
     
     start_time = time.time()
-    deepgram = DeepgramClient(deepgram_api_key)
     
     try:
-        with open(audio_file_path, 'rb') as buffer_data:
-            payload = {'buffer': buffer_data}
-            
-            options = PrerecordedOptions(
-                smart_format=True,
-                model="nova-2",
-                language="en-US"
-            )
-            
-            print("Sending request to Deepgram API...")
-            response = deepgram.listen.rest.v('1').transcribe_file(payload, options)
-            
-            # too much long response - just need the transcript
-            raw_transcript = response['results']['channels'][0]['alternatives'][0]['transcript']
-    
+        raw_transcript = backend.transcribe(audio_file_path)
     except Exception as e:
-        print(f"Error during Deepgram transcription: {str(e)}")
+        print(f"Error during {backend.name} transcription: {str(e)}")
         print("This could be due to network issues or API limitations.")
         print("You may want to try again or check your API key.")
         raise
@@ -115,14 +231,134 @@ def process_audio(recording_id, audio_file_path="audio.mp3", api_key=None, deepg
     elapsed_time = time.time() - start_time
     minutes, seconds = divmod(int(elapsed_time), 60)
     print(f"Transcription complete in {minutes}m {seconds}s.")
+    return raw_transcript
+
+def build_llm(api_key=None):
+    # null checks for api
+    if api_key is None:
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if api_key is None:
+            raise ValueError("Google API key not provided. Please provide it as an argument or set GOOGLE_API_KEY environment variable.")
     
+    configure(api_key=api_key)
+
+    return ChatGoogleGenerativeAI(
+        model=LLM_MODEL,
+        google_api_key=api_key,
+        temperature=LLM_TEMPERATURE,
+    )
+
+def build_minutes_chain(llm):
+    # Setting up template and chain
+    prompt = ChatPromptTemplate.from_template(MINUTES_TEMPLATE)
+
+    return (
+        {"context": RunnablePassthrough()}
+        | prompt
+        | llm
+        | StrOutputParser()
+    )
+
+def default_cache():
+    return ResultCache() if RESULT_CACHE_ENABLED else None
+
+def _cached(cache, label, compute, *key_parts):
+    """Run compute, or reuse its result from a previous run over the same inputs"""
+    def timed_compute():
+        with span(label), OPERATION_SECONDS.time(operation=label):
+            return compute()
+
+    if not cache:
+        return timed_compute()
+    return cache.get_or_compute(text_digest(label, *key_parts), timed_compute, label=label)
+
+def transcribe_recording(audio_file_path, deepgram_api_key=DEFAULT_DEEPGRAM_API_KEY, transcription_backend=None, cache=None):
+    """Raw transcript for an audio file, reusing a cached one for identical audio"""
+    backend = transcription_backend or get_backend(deepgram_api_key=deepgram_api_key)
+    return _cached(
+        cache,
+        "transcript",
+        lambda: transcribe_audio(audio_file_path, backend),
+        backend.cache_id, file_digest(audio_file_path),
+    )
+
+def summarize_transcript(raw_transcript, llm=None, api_key=None, summary_mode=None, cache=None):
+    """Cleaned transcript and meeting minutes/tasks for a raw transcript"""
+    summary_mode = summary_mode or SUMMARY_MODE
+    if summary_mode not in SUMMARY_MODES:
+        raise ValueError(f"Unknown summary mode: {summary_mode}")
+
+    llm = llm or build_llm(api_key)
+    chain = build_minutes_chain(llm)
     ascii_transcript = remove_non_ascii(raw_transcript)
+
+    if summary_mode == "auto":
+        summary_mode = "mapreduce" if len(ascii_transcript) > SUMMARY_CHUNK_CHARS else "single"
+
+    # Cache keys cover everything that shapes the output: input text, prompts, model and mode
+    if summary_mode == "mapreduce":
+        adjusted_transcript, meeting_minutes_and_tasks = _cached(
+            cache,
+            "mapreduce",
+            lambda: list(map_reduce_summarize(ascii_transcript, llm, chain)),
+            LLM_MODEL, LLM_TEMPERATURE, SUMMARY_CHUNK_CHARS,
+            CHUNK_CLEANUP_TEMPLATE, NOTES_TEMPLATE, COLLAPSE_TEMPLATE, SUMMARY_TEMPLATE, MINUTES_TEMPLATE,
+            ascii_transcript,
+        )
+    elif summary_mode == "parallel":
+        print("Cleaning transcript and generating meeting minutes in parallel...")
+        adjusted_transcript, meeting_minutes_and_tasks = _cached(
+            cache,
+            "parallel",
+            lambda: list(parallel_summarize(ascii_transcript, llm, chain)),
+            LLM_MODEL, LLM_TEMPERATURE, CLEANUP_PROMPT, MINUTES_TEMPLATE, ascii_transcript,
+        )
+    else:
+        print("Processing transcript with LLM...")
+        adjusted_transcript = _cached(
+            cache,
+            "cleanup",
+            lambda: product_assistant(ascii_transcript, llm),
+            LLM_MODEL, LLM_TEMPERATURE, CLEANUP_PROMPT, ascii_transcript,
+        )
+        
+        print("Generating meeting minutes and tasks...")
+        meeting_minutes_and_tasks = _cached(
+            cache,
+            "minutes",
+            lambda: chain.invoke(adjusted_transcript),
+            LLM_MODEL, LLM_TEMPERATURE, MINUTES_TEMPLATE, adjusted_transcript,
+        )
+
+    return adjusted_transcript, meeting_minutes_and_tasks
+
+def process_audio(recording_id, audio_file_path="audio.mp3", api_key=None, deepgram_api_key=DEFAULT_DEEPGRAM_API_KEY, save_files=True, output_dir=".", on_stage=None, raw_transcript=None, transcription_backend=None, summary_mode=None, cache=None):
     
-    print("Processing transcript with LLM...")
-    adjusted_transcript = product_assistant(ascii_transcript, llm)
+    storage_path = os.path.join(output_dir, "transcripts")
+    os.makedirs(storage_path, exist_ok=True)
+    
+    llm = build_llm(api_key)
+
+    if cache is None:
+        cache = default_cache()
+
+    if raw_transcript is not None:
+        # Transcribed live while the meeting was in progress
+        print(f"Using live transcript ({len(raw_transcript)} characters), skipping transcription.")
+    else:
+        raw_transcript = transcribe_recording(
+            audio_file_path,
+            deepgram_api_key=deepgram_api_key,
+            transcription_backend=transcription_backend,
+            cache=cache,
+        )
     
-    print("Generating meeting minutes and tasks...")
-    meeting_minutes_and_tasks = chain.invoke({"context": adjusted_transcript})
+    if on_stage:
+        on_stage("summarizing")
+
+    adjusted_transcript, meeting_minutes_and_tasks = summarize_transcript(
+        raw_transcript, llm=llm, summary_mode=summary_mode, cache=cache
+    )
 
     # Saving output to path dir
     if save_files:
@@ -0,0 +1,278 @@
+import os
+import gzip
+import json
+import time
+import uuid
+import random
+import asyncio
+
+import httpx
+
+BACKEND_TIMEOUT_SECONDS = float(os.getenv("BACKEND_TIMEOUT_SECONDS", 30))
+BACKEND_MAX_RETRIES = int(os.getenv("BACKEND_MAX_RETRIES", 4))
+BACKEND_POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", 10))
+# Retry delays grow exponentially from the base up to the cap, with full jitter
+BACKOFF_BASE_SECONDS = 1
+BACKOFF_CAP_SECONDS = 30
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# JSON bodies at least this large are sent gzip-compressed ("none" to disable)
+BACKEND_COMPRESSION = os.getenv("BACKEND_COMPRESSION", "gzip")
+BACKEND_COMPRESS_MIN_BYTES = int(os.getenv("BACKEND_COMPRESS_MIN_BYTES", 16 * 1024))
+
+OUTBOX_DIR = os.getenv("OUTBOX_DIR", os.path.join("storage", "outbox"))
+OUTBOX_FLUSH_SECONDS = int(os.getenv("OUTBOX_FLUSH_SECONDS", 60))
+# Pending deliveries to the same endpoint are sent together, up to this many per request
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 20))
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Seconds to wait before retry number attempt (from 0); honours a Retry-After header"""
+    if retry_after:
+        try:
+            return min(BACKOFF_CAP_SECONDS, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+class BackendClient:
+    """Shared async HTTP client for the backend: pooled connections, timeouts and jittered retries"""
+
+    def __init__(self, base_url, timeout=BACKEND_TIMEOUT_SECONDS, max_retries=BACKEND_MAX_RETRIES,
+                 pool_size=BACKEND_POOL_SIZE, compression=BACKEND_COMPRESSION,
+                 compress_min_bytes=BACKEND_COMPRESS_MIN_BYTES):
+        self.base_url = (base_url or "").rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+
+        self.session = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+
+    def url(self, path):
+        return path if path.startswith(("http://", "https://")) else self.base_url + path
+
+    def _encode_json(self, kwargs):
+        """Serialize a json= body once, gzip-compressing it if it is large"""
+        body = json.dumps(kwargs.pop("json")).encode("utf-8")
+        headers = dict(kwargs.pop("headers", None) or {}, **{"Content-Type": "application/json"})
+        if self.compression == "gzip" and len(body) >= self.compress_min_bytes:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        kwargs["content"] = body
+        kwargs["headers"] = headers
+
+    async def request(self, method, path, retries=None, **kwargs):
+        """Send a request, retrying connection errors, timeouts and 429/5xx responses
+
+        Returns the last response, or raises the last httpx.HTTPError once
+        retries are used up.
+        """
+        retries = self.max_retries if retries is None else retries
+        kwargs.setdefault("timeout", self.timeout)
+        if kwargs.get("json") is not None:
+            self._encode_json(kwargs)
+        url = self.url(path)
+
+        for attempt in range(retries + 1):
+            try:
+                response = await self.session.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                if attempt == retries:
+                    raise
+                delay = backoff_delay(attempt)
+                print(f"{method} {url} failed ({e}), retrying in {delay:.1f}s")
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == retries:
+                    return response
+                delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+                print(f"{method} {url} returned {response.status_code}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    async def close(self):
+        await self.session.aclose()
+
+
+class Outbox:
+    """Requests that could not be delivered, kept on disk and resent in the background
+
+    Each entry is one JSON file. Entries for an endpoint listed in batch_paths
+    are resent together through its batch endpoint, which takes {"updates": [...]}
+    and answers with one status per update. Entries the backend rejects outright
+    (4xx other than 429) are moved to the dead/ subdirectory instead of being
+    retried forever. on_settled, if given, is called with each entry once it is
+    delivered or rejected, along with whether it was delivered and the status.
+    """
+
+    def __init__(self, client, directory=OUTBOX_DIR, flush_interval=OUTBOX_FLUSH_SECONDS,
+                 batch_paths=None, batch_size=OUTBOX_BATCH_SIZE, on_settled=None):
+        self.client = client
+        self.directory = directory
+        self.dead_directory = os.path.join(directory, "dead")
+        self.flush_interval = flush_interval
+        self.batch_paths = batch_paths or {}
+        self.batch_size = batch_size
+        self.on_settled = on_settled
+        self._lock = asyncio.Lock()
+        self._task = None
+        os.makedirs(self.dead_directory, exist_ok=True)
+
+    def add(self, method, path, payload, meta=None):
+        """Keep a request for later delivery; meta is stored with it for on_settled"""
+        entry_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        entry = {"id": entry_id, "method": method, "path": path, "payload": payload,
+                 "meta": meta or {}, "attempts": 0, "created_at": time.time()}
+        self._write(entry)
+        print(f"Queued {method} {path} in outbox as {entry_id}")
+        return entry_id
+
+    def _path(self, entry_id):
+        return os.path.join(self.directory, f"{entry_id}.json")
+
+    def _write(self, entry):
+        # Write then rename, so a crash never leaves a truncated entry
+        path = self._path(entry["id"])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def _load(self, entry_id):
+        try:
+            with open(self._path(entry_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Unreadable outbox entry {entry_id}: {e}")
+            self._bury(entry_id)
+            return None
+
+    def _bury(self, entry_id):
+        path = self._path(entry_id)
+        os.replace(path, os.path.join(self.dead_directory, os.path.basename(path)))
+
+    def _retry_later(self, entry):
+        # Entries already settled by a partly delivered batch must not come back
+        if os.path.exists(self._path(entry["id"])):
+            entry["attempts"] += 1
+            self._write(entry)
+
+    def _settle(self, entry, status_code):
+        """Remove, keep or bury an entry by the status the backend gave it; True if delivered"""
+        if 200 <= status_code < 300:
+            os.remove(self._path(entry["id"]))
+            print(f"Delivered outbox entry {entry['id']}")
+            self._notify(entry, True, status_code)
+            return True
+        if status_code in RETRY_STATUSES:
+            self._retry_later(entry)
+        else:
+            print(f"Backend rejected outbox entry {entry['id']} ({status_code}), moving to dead/")
+            self._bury(entry["id"])
+            self._notify(entry, False, status_code)
+        return False
+
+    def _notify(self, entry, delivered, status_code):
+        if not self.on_settled:
+            return
+        try:
+            self.on_settled(entry, delivered, status_code)
+        except Exception as e:
+            print(f"Outbox settle handler failed for {entry['id']}: {e}")
+
+    def has(self, entry_id):
+        """Whether an entry is still waiting to be delivered"""
+        return os.path.exists(self._path(entry_id))
+
+    def pending(self):
+        return sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+
+    def _batches(self, entries):
+        """Entries grouped into requests: batchable ones by endpoint, the rest one by one"""
+        batches = []
+        groups = {}
+        for entry in entries:
+            if entry["method"] == "POST" and entry["path"] in self.batch_paths:
+                groups.setdefault(entry["path"], []).append(entry)
+            else:
+                batches.append([entry])
+        for group in groups.values():
+            for start in range(0, len(group), self.batch_size):
+                batches.append(group[start:start + self.batch_size])
+        return batches
+
+    async def _send(self, batch):
+        """Deliver one batch; returns how many entries were delivered, or None if the backend is struggling"""
+        entry = batch[0]
+        if len(batch) == 1:
+            response = await self.client.request(entry["method"], entry["path"], retries=0, json=entry["payload"])
+            if response.status_code in RETRY_STATUSES:
+                self._retry_later(entry)
+                return None
+            return int(self._settle(entry, response.status_code))
+
+        response = await self.client.post(
+            self.batch_paths[entry["path"]], retries=0, json={"updates": [e["payload"] for e in batch]}
+        )
+        if response.status_code in RETRY_STATUSES:
+            for e in batch:
+                self._retry_later(e)
+            return None
+        if not response.is_success:
+            # Batch endpoint unavailable; fall back to one request per entry
+            print(f"Batch delivery failed ({response.status_code}), sending {len(batch)} entries one by one")
+            delivered = 0
+            for e in batch:
+                sent = await self._send([e])
+                if sent is None:
+                    return None
+                delivered += sent
+            return delivered
+
+        results = response.json()["results"]
+        print(f"Delivered a batch of {len(batch)} outbox entries")
+        return sum(self._settle(e, result["status"]) for e, result in zip(batch, results))
+
+    async def flush(self):
+        """Try to deliver every pending entry once, oldest first; returns how many were delivered"""
+        delivered = 0
+        async with self._lock:
+            entries = [entry for entry in map(self._load, self.pending()) if entry]
+            for batch in self._batches(entries):
+                try:
+                    sent = await self._send(batch)
+                except httpx.HTTPError as e:
+                    print(f"Outbox delivery failed: {e}")
+                    for entry in batch:
+                        self._retry_later(entry)
+                    sent = None
+                if sent is None:
+                    # The backend is unreachable or overloaded; leave the rest for the next flush
+                    break
+                delivered += sent
+        return delivered
+
+    def start(self):
+        """Flush in the background; must be called from the running event loop"""
+        self._task = asyncio.create_task(self._run(), name="outbox")
+
+    async def _run(self):
+        while True:
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Outbox flush failed: {e}")
+            await asyncio.sleep(self.flush_interval)
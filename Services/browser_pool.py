@@ -0,0 +1,283 @@
+import os
+import json
+import shutil
+import subprocess
+import threading
+import time
+
+import requests
+
+from media_slots import MediaSlot
+
+# Chrome instances kept launched, on their own display and sinks, ready for the next recording
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 1))
+# One persistent profile per media slot, so Google sessions survive between recordings
+PROFILE_ROOT = os.getenv("CHROME_PROFILE_DIR", os.path.join("storage", "chrome_profiles"))
+BASE_DEBUG_PORT = int(os.getenv("BROWSER_BASE_DEBUG_PORT", 9300))
+# A browser warmed for a scheduled meeting is given up if its recording has not leased it by then
+BROWSER_RESERVATION_SECONDS = int(os.getenv("BROWSER_RESERVATION_SECONDS", 600))
+# Browser UI language; undetected-chromedriver otherwise picks it from the system locale
+CHROME_LANG = os.getenv("CHROME_LANG", "en-US")
+
+CHROME_ARGS = [
+    "--use-fake-ui-for-media-stream",
+    "--window-size=1920,1080",
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-application-cache",
+    "--disable-dev-shm-usage",
+    "--log-level=3",
+    f"--lang={CHROME_LANG}",
+]
+
+# Flags undetected-chromedriver adds when it starts Chrome for the cold path.
+# Warm browsers are started by the pool, so they get them here.
+UNDETECTED_ARGS = [
+    "--no-default-browser-check",
+    "--no-first-run",
+    "--remote-debugging-host=127.0.0.1",
+]
+
+# Handed to the recorder process so it attaches to a leased browser instead of launching one
+DEBUGGER_ADDRESS_ENV = "BROWSER_DEBUGGER_ADDRESS"
+SLOT_INDEX_ENV = "MEDIA_SLOT_INDEX"
+
+
+def profile_dir(slot_index):
+    """Persistent user-data-dir for the browser running in a media slot"""
+    path = os.path.abspath(os.path.join(PROFILE_ROOT, f"profile_{slot_index}"))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def clear_exit_type(user_data_dir):
+    """Mark the profile's last exit as clean, as undetected-chromedriver does before launching
+
+    Otherwise a browser that was killed comes back with a "restore pages" bubble.
+    """
+    path = os.path.join(user_data_dir, "Default", "Preferences")
+    try:
+        with open(path, encoding="latin1") as f:
+            config = json.load(f)
+        if config.get("profile", {}).get("exit_type") is None:
+            return
+        config["profile"]["exit_type"] = None
+        with open(path, "w", encoding="latin1") as f:
+            json.dump(config, f)
+    except (OSError, ValueError):
+        pass
+
+
+def chrome_binary():
+    for name in ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser"):
+        path = shutil.which(name)
+        if path:
+            return path
+    raise RuntimeError("No Chrome binary found on PATH")
+
+
+class WarmBrowser:
+    """A Chrome process with remote debugging, running in its own media slot
+
+    Launched the way undetected-chromedriver launches Chrome: started directly,
+    so chromedriver adds no automation switches, and driven later through the
+    patched chromedriver attached over the debugging port.
+    """
+
+    def __init__(self, slot):
+        self.slot = slot
+        self.port = BASE_DEBUG_PORT + slot.index
+        self.debugger_address = f"127.0.0.1:{self.port}"
+        self.process = None
+
+    def launch(self, timeout=30):
+        if not self.slot.start_display():
+            raise RuntimeError(f"Display {self.slot.display} did not start")
+        self.slot.setup_audio()
+
+        user_data_dir = profile_dir(self.slot.index)
+        clear_exit_type(user_data_dir)
+        cmd = [
+            chrome_binary(), *CHROME_ARGS, *UNDETECTED_ARGS,
+            f"--user-data-dir={user_data_dir}",
+            f"--remote-debugging-port={self.port}",
+            "about:blank",
+        ]
+        self.process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=dict(os.environ, **self.slot.env())
+        )
+
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                requests.get(f"http://{self.debugger_address}/json/version", timeout=2)
+                return
+            except requests.RequestException:
+                time.sleep(0.2)
+
+        raise RuntimeError(f"Chrome did not open its debugging port {self.port}")
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def env(self):
+        """Environment for a recorder process that should use this browser"""
+        return dict(self.slot.env(), **{
+            DEBUGGER_ADDRESS_ENV: self.debugger_address,
+            SLOT_INDEX_ENV: str(self.slot.index),
+        })
+
+    def reset(self):
+        """Leave a single blank tab, dropping whatever the last recording had open"""
+        base_url = f"http://{self.debugger_address}/json"
+        blank = requests.put(f"{base_url}/new?about:blank", timeout=5).json()
+        for target in requests.get(f"{base_url}/list", timeout=5).json():
+            if target.get("type") == "page" and target["id"] != blank["id"]:
+                requests.get(f"{base_url}/close/{target['id']}", timeout=5)
+
+    def close(self):
+        if self.is_alive():
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+        self.slot.release()
+
+
+class BrowserPool:
+    """Keeps a few signed-in browsers warm and leases them to recordings
+
+    On top of size, one browser is kept for each reservation made ahead of a
+    scheduled meeting. A reservation ends when that meeting's recording leases
+    a browser, when it is given up with unreserve, or after its timeout;
+    browsers beyond what the pool then needs are shut down.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE):
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._launching = 0
+        # Reservation key (the meeting's task id) -> when it lapses
+        self._reserved = {}
+
+    def start(self):
+        if self.size > 0:
+            self._replenish()
+
+    def _target(self):
+        """Idle browsers the pool should hold; expects the lock to be held"""
+        now = time.time()
+        for key, expires_at in list(self._reserved.items()):
+            if expires_at <= now:
+                print(f"Browser reservation for {key} expired")
+                del self._reserved[key]
+        return self.size + len(self._reserved)
+
+    def prewarm(self, key, timeout=BROWSER_RESERVATION_SECONDS):
+        """Launch one extra browser for the recording of key, about to start; its lease uses it up"""
+        with self._lock:
+            self._reserved[key] = time.time() + timeout
+        self._replenish()
+
+    def unreserve(self, key):
+        """Give up the reservation for key, whose recording will not lease a browser here"""
+        with self._lock:
+            if self._reserved.pop(key, None) is None:
+                return
+        print(f"Browser reservation for {key} released")
+        self._replenish()
+
+    def reserved_count(self):
+        with self._lock:
+            return len(self._reserved)
+
+    def _replenish(self):
+        """Launch browsers in the background until the pool is back to its target, and close surplus ones"""
+        with self._lock:
+            target = self._target()
+            missing = max(0, target - len(self._idle) - self._launching)
+            self._launching += missing
+            surplus = self._idle[target:]
+            del self._idle[target:]
+
+        for browser in surplus:
+            print(f"Closing surplus warm browser on display {browser.slot.display}")
+            browser.close()
+        for _ in range(missing):
+            thread = threading.Thread(target=self._launch_one)
+            thread.daemon = True
+            thread.start()
+
+    def _launch_one(self):
+        browser = None
+        try:
+            browser = WarmBrowser(MediaSlot.acquire())
+            browser.launch()
+        except Exception as e:
+            print(f"Failed to launch warm browser: {e}")
+            if browser:
+                browser.close()
+            with self._lock:
+                self._launching -= 1
+            return
+
+        # In one step with the launch count, so a concurrent _replenish never counts it twice or not at all
+        with self._lock:
+            self._launching -= 1
+            # A reservation may have ended while the browser was starting
+            needed = len(self._idle) < self._target()
+            if needed:
+                self._idle.append(browser)
+        if needed:
+            print(f"Warm browser ready on display {browser.slot.display}")
+        else:
+            browser.close()
+
+    def idle_count(self):
+        with self._lock:
+            return len(self._idle)
+
+    def lease(self, key=None):
+        """An idle warm browser, or None if the recorder should start its own
+
+        key is the reservation made for this recording, if any; other
+        recordings leave reservations in place, so a replacement is launched.
+        """
+        browser = None
+        with self._lock:
+            if key:
+                self._reserved.pop(key, None)
+            while self._idle and browser is None:
+                candidate = self._idle.pop(0)
+                if candidate.is_alive():
+                    browser = candidate
+                else:
+                    candidate.close()
+
+        self._replenish()
+        return browser
+
+    def release(self, browser, healthy=True):
+        """Recycle a leased browser back into the pool, or shut it down"""
+        if healthy and browser.is_alive():
+            try:
+                browser.reset()
+                with self._lock:
+                    if len(self._idle) < self._target():
+                        self._idle.append(browser)
+                        return
+            except (requests.RequestException, ValueError) as e:
+                print(f"Failed to recycle browser on {browser.slot.display}: {e}")
+
+        browser.close()
+        self._replenish()
@@ -0,0 +1,210 @@
+import os
+import socket
+import sqlite3
+import asyncio
+import threading
+import time
+
+import httpx
+
+from meeting_scheduler import parse_time
+
+# How long a claim on a scheduled meeting lasts without a heartbeat
+CLAIM_TTL_SECONDS = int(os.getenv("CLAIM_TTL_SECONDS", 120))
+HEARTBEAT_INTERVAL_SECONDS = max(1, CLAIM_TTL_SECONDS // 3)
+
+# Stable across restarts of the same node, so it can keep renewing claims it made before
+NODE_ID = os.getenv("NODE_ID") or socket.gethostname()
+
+# A lapsed claim is retried this long after its expiry, so the holder's last heartbeat has landed
+CLAIM_RETRY_MARGIN_SECONDS = 1
+
+# "backend" to claim through SERVER_API (shared by all nodes), "local" for a single host
+CLAIM_STORE = os.getenv("CLAIM_STORE", "backend")
+
+
+class Claim:
+    """Outcome of a claim attempt; true when the claim was taken
+
+    When another node holds the claim, expires_at is when it lapses unless
+    that node heartbeats it. gone is set when the record no longer exists.
+    """
+
+    def __init__(self, claimed, expires_at=None, gone=False):
+        self.claimed = claimed
+        self.expires_at = expires_at
+        self.gone = gone
+
+    def __bool__(self):
+        return self.claimed
+
+    @property
+    def unknown(self):
+        """True when the claim store could not be reached, so nobody is known to hold it"""
+        return not self.claimed and not self.gone and not self.expires_at
+
+    def retry_at(self):
+        """When a failed claim is worth trying again, or None if it never is"""
+        if self.claimed or self.gone:
+            return None
+        if self.unknown:
+            return time.time() + HEARTBEAT_INTERVAL_SECONDS
+        return self.expires_at + CLAIM_RETRY_MARGIN_SECONDS
+
+
+class BackendClaims:
+    """Claims on meeting records held by the backend, shared by every Services node"""
+
+    def __init__(self, client, timeout=10):
+        self.client = client
+        self.timeout = timeout
+
+    async def _post(self, task_id, action, **body):
+        """The backend's response, or None if it could not be reached"""
+        try:
+            return await self.client.post(
+                f"/meeting-records/{task_id}/{action}", json=body, timeout=self.timeout, retries=1
+            )
+        except httpx.HTTPError as e:
+            print(f"Claim {action} for {task_id} failed: {e}")
+            return None
+
+    async def claim(self, key, owner, ttl=CLAIM_TTL_SECONDS):
+        """Take the claim if it is free, expired or already ours"""
+        response = await self._post(key, "claim", owner=owner, ttl_seconds=ttl)
+        if response is None:
+            return Claim(False)
+        if response.status_code == 200:
+            return Claim(True)
+        if response.status_code == 404:
+            return Claim(False, gone=True)
+
+        expires_at = None
+        if response.status_code == 409:
+            try:
+                expires_at = parse_time(response.json()["claimExpiresAt"])
+            except (ValueError, KeyError, TypeError, AttributeError):
+                pass
+        return Claim(False, expires_at=expires_at)
+
+    async def renew(self, key, owner, ttl=CLAIM_TTL_SECONDS):
+        """True if renewed, False if the claim is no longer ours, None if the backend could not tell"""
+        response = await self._post(key, "heartbeat", owner=owner, ttl_seconds=ttl)
+        if response is None or response.status_code >= 500:
+            return None
+        return response.status_code == 200
+
+    async def release(self, key, owner):
+        response = await self._post(key, "release", owner=owner)
+        return response is not None and response.status_code == 200
+
+
+class LocalClaims:
+    """Claims in a SQLite file, for a single host or for tests without a backend
+
+    Same async interface as BackendClaims; each call is a single local
+    statement, so it runs inline on the event loop.
+    """
+
+    def __init__(self, db_path=os.path.join("storage", "claims.db")):
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS claims (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    async def claim(self, key, owner, ttl=CLAIM_TTL_SECONDS):
+        now = time.time()
+        with self._lock:
+            # One statement, so two processes sharing the file cannot both win
+            cursor = self._conn.execute(
+                """
+                INSERT INTO claims (key, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE claims.owner = excluded.owner OR claims.expires_at < ?
+                """,
+                (key, owner, now + ttl, now),
+            )
+            if cursor.rowcount == 1:
+                return Claim(True)
+            row = self._conn.execute("SELECT expires_at FROM claims WHERE key = ?", (key,)).fetchone()
+        return Claim(False, expires_at=row[0] if row else None)
+
+    async def renew(self, key, owner, ttl=CLAIM_TTL_SECONDS):
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE claims SET expires_at = ? WHERE key = ? AND owner = ?", (time.time() + ttl, key, owner)
+            )
+        return cursor.rowcount == 1
+
+    async def release(self, key, owner):
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM claims WHERE key = ? AND owner = ?", (key, owner))
+        return cursor.rowcount == 1
+
+
+def get_claims(client):
+    if CLAIM_STORE == "local":
+        return LocalClaims()
+    return BackendClaims(client)
+
+
+class ClaimKeeper:
+    """Heartbeats the claims of jobs this node has not finished yet
+
+    on_lost(key) is awaited when a claim is refused by the store, or when it
+    could not be renewed for longer than it lasts, so the job holding it can
+    stop before another node records the same meeting.
+    """
+
+    def __init__(self, claims, list_keys, owner=NODE_ID, ttl=CLAIM_TTL_SECONDS,
+                 interval=HEARTBEAT_INTERVAL_SECONDS, on_lost=None):
+        self.claims = claims
+        self.list_keys = list_keys
+        self.owner = owner
+        self.ttl = ttl
+        self.interval = interval
+        self.on_lost = on_lost
+        # When each key was last known to be ours
+        self._renewed_at = {}
+        self._task = None
+
+    def start(self):
+        """Heartbeat in the background; must be called from the running event loop"""
+        self._task = asyncio.create_task(self._run(), name="claim-keeper")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                keys = self.list_keys()
+            except Exception as e:
+                print(f"Failed to list claimed jobs: {e}")
+                continue
+            await self.heartbeat(keys)
+
+    async def heartbeat(self, keys):
+        """Renew each key once and report the ones that are lost"""
+        now = time.time()
+        # Keys seen for the first time were claimed just before their job was queued
+        self._renewed_at = {key: self._renewed_at.get(key, now) for key in keys}
+        for key in keys:
+            renewed = await self.claims.renew(key, self.owner, self.ttl)
+            if renewed:
+                self._renewed_at[key] = time.time()
+                continue
+            if renewed is None and time.time() - self._renewed_at[key] < self.ttl:
+                print(f"Could not renew claim on {key}, will try again")
+                continue
+
+            print(f"Lost claim on {key}; another node may pick it up")
+            self._renewed_at.pop(key)
+            if self.on_lost:
+                try:
+                    await self.on_lost(key)
+                except Exception as e:
+                    print(f"Failed to stop the job holding {key}: {e}")
@@ -0,0 +1,85 @@
+import os
+import io
+import time
+
+from PIL import Image
+
+# Periodic screenshots kept per recording; older ones are overwritten
+SCREENSHOT_RING_SIZE = int(os.getenv("SCREENSHOT_RING_SIZE", 10))
+# Routine screenshots are downscaled to this width and stored as JPEG
+SCREENSHOT_MAX_WIDTH = int(os.getenv("SCREENSHOT_MAX_WIDTH", 960))
+SCREENSHOT_JPEG_QUALITY = int(os.getenv("SCREENSHOT_JPEG_QUALITY", 60))
+# Full-resolution dumps are only taken on failures, and only this many per recording
+MAX_FAILURE_DUMPS = 5
+
+
+class ScreenshotStore:
+    """Screenshots for one recording, kept within a fixed disk budget
+
+    Named step captures and a ring buffer of periodic captures are stored as
+    small JPEGs; full-resolution PNGs plus the page source are written only
+    when something fails.
+    """
+
+    def __init__(self, screenshots_dir, ring_size=SCREENSHOT_RING_SIZE,
+                 max_width=SCREENSHOT_MAX_WIDTH, quality=SCREENSHOT_JPEG_QUALITY):
+        self.screenshots_dir = screenshots_dir
+        self.ring_size = ring_size
+        self.max_width = max_width
+        self.quality = quality
+        self._ring_index = 0
+        self._failure_dumps = 0
+        os.makedirs(screenshots_dir, exist_ok=True)
+
+    def reset(self):
+        """Clear screenshots left by a previous recording of the same meeting"""
+        for f in os.listdir(self.screenshots_dir):
+            os.remove(os.path.join(self.screenshots_dir, f))
+        self._ring_index = 0
+        self._failure_dumps = 0
+
+    def _compress(self, png_bytes):
+        image = Image.open(io.BytesIO(png_bytes)).convert("RGB")
+        if image.width > self.max_width:
+            height = int(image.height * self.max_width / image.width)
+            image = image.resize((self.max_width, height), Image.BILINEAR)
+
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=self.quality, optimize=True)
+        return output.getvalue()
+
+    def _write(self, filename, data):
+        path = os.path.join(self.screenshots_dir, filename)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def capture(self, driver, name):
+        """Downscaled JPEG of a named step, e.g. 'email_entry'"""
+        try:
+            return self._write(f"{name}.jpg", self._compress(driver.get_screenshot_as_png()))
+        except Exception as e:
+            print(f"Failed to take screenshot: {e}")
+            return None
+
+    def capture_periodic(self, driver):
+        """Downscaled JPEG into the next ring buffer slot"""
+        slot = self._ring_index % self.ring_size
+        self._ring_index += 1
+        return self.capture(driver, f"periodic_{slot:02d}")
+
+    def dump_failure(self, driver, name):
+        """Full-resolution PNG and page source for diagnosing a failed step"""
+        if self._failure_dumps >= MAX_FAILURE_DUMPS:
+            print(f"Failure dump limit reached, skipping {name}")
+            return None
+        self._failure_dumps += 1
+
+        stamp = int(time.time())
+        try:
+            path = self._write(f"failure_{name}_{stamp}.png", driver.get_screenshot_as_png())
+            self._write(f"failure_{name}_{stamp}.html", driver.page_source.encode("utf-8", errors="replace"))
+            return path
+        except Exception as e:
+            print(f"Failed to take failure screenshot: {e}")
+            return None
@@ -1,2 +1,2 @@
 Xvfb :99 -screen 0 1920x1080x24 &
-export DISPLAY=:99; python3 server.py
\ No newline at end of file
+export DISPLAY=:99; python3 run_server.py
\ No newline at end of file
@@ -0,0 +1,81 @@
+import threading
+import time
+
+
+class JobIndex:
+    """In-memory view of the jobs running on this node, for the status API
+
+    Holds what the job database does not: when each stage started and ended,
+    and the recorder's latest progress. Entries are dropped when the job
+    finishes; the database remains the record of finished jobs.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        # Pipeline stages report from worker threads
+        self._lock = threading.Lock()
+
+    def begin(self, job):
+        now = time.time()
+        with self._lock:
+            self._jobs[job["job_id"]] = {
+                "job_id": job["job_id"],
+                "meeting_link": job["meeting_link"],
+                "task_id": job["task_id"],
+                "source": job["source"],
+                "attempt": job["attempts"],
+                "state": job["state"],
+                "started_at": now,
+                "stages": [{"stage": job["state"], "started_at": now, "finished_at": None}],
+                "recorder": {"phase": None, "steps": []},
+            }
+
+    def set_state(self, job_id, state):
+        now = time.time()
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if not entry or entry["state"] == state:
+                return
+            entry["state"] = state
+            entry["stages"][-1]["finished_at"] = now
+            entry["stages"].append({"stage": state, "started_at": now, "finished_at": None})
+
+    def recorder_event(self, job_id, event):
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if not entry:
+                return
+            if event["event"] == "step":
+                entry["recorder"]["steps"].append(
+                    {"step": event["step"], "status": event["status"], "seconds": event["seconds"]}
+                )
+            else:
+                entry["recorder"]["phase"] = event["event"]
+
+    def finish(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def __contains__(self, job_id):
+        return job_id in self._jobs
+
+    def get(self, job_id):
+        """A copy of a running job's entry with stage durations filled in, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if not entry:
+                return None
+            stages = [
+                dict(stage, seconds=round((stage["finished_at"] or now) - stage["started_at"], 3))
+                for stage in entry["stages"]
+            ]
+            return dict(
+                entry,
+                stages=stages,
+                recorder=dict(entry["recorder"], steps=list(entry["recorder"]["steps"])),
+                running_seconds=round(now - entry["started_at"], 3),
+            )
+
+    def list(self):
+        return [job for job in map(self.get, list(self._jobs)) if job]
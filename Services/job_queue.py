@@ -0,0 +1,298 @@
+import os
+import asyncio
+import sqlite3
+import threading
+import time
+import json
+import uuid
+import traceback
+
+# Job states, in the order a recording moves through them
+QUEUED = "queued"
+JOINING = "joining"
+RECORDING = "recording"
+TRANSCODING = "transcoding"
+TRANSCRIBING = "transcribing"
+SUMMARIZING = "summarizing"
+POSTING = "posting"
+DONE = "done"
+FAILED = "failed"
+
+# Where a job came from; scheduled meetings are started before ad-hoc requests
+ADHOC = "adhoc"
+SCHEDULED = "scheduled"
+
+JOB_STATES = (QUEUED, JOINING, RECORDING, TRANSCODING, TRANSCRIBING, SUMMARIZING, POSTING, DONE, FAILED)
+TERMINAL_STATES = (DONE, FAILED)
+# States reached after the meeting itself has been captured; a job interrupted
+# in one of these can be resumed without joining the meeting again
+POST_RECORDING_STATES = (TRANSCODING, TRANSCRIBING, SUMMARIZING, POSTING)
+# Resuming from these needs neither a recorder nor the media decoding before
+# transcription, so such jobs start without waiting for admission
+UNGATED_RESUME_STAGES = (TRANSCRIBING, SUMMARIZING, POSTING)
+
+# Rough per-recording footprint of one Chrome + ffmpeg + Xvfb stack
+CPUS_PER_RECORDING = 2
+MEMORY_PER_RECORDING_MB = 1536
+
+
+def default_pool_size():
+    """Number of recordings this host can run at once, based on CPU and memory"""
+    configured = os.getenv("MAX_CONCURRENT_RECORDINGS")
+    if configured:
+        return max(1, int(configured))
+
+    cpu_slots = (os.cpu_count() or 1) // CPUS_PER_RECORDING
+
+    try:
+        total_memory_mb = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        memory_slots = int(total_memory_mb // MEMORY_PER_RECORDING_MB)
+    except (ValueError, OSError, AttributeError):
+        memory_slots = cpu_slots
+
+    return max(1, min(cpu_slots, memory_slots))
+
+
+def new_job_id(meeting_link):
+    """Unique job id that still names the meeting, since the same Meet link gets reused"""
+    meeting_code = meeting_link.rstrip("/").split("/")[-1].split("?")[0]
+    return f"{meeting_code}-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+class JobQueue:
+    """Durable recording job queue backed by a SQLite file"""
+
+    def __init__(self, db_path=os.path.join("storage", "jobs.db")):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                meeting_link TEXT NOT NULL,
+                task_id TEXT,
+                username TEXT,
+                source TEXT NOT NULL DEFAULT 'adhoc',
+                options TEXT NOT NULL DEFAULT '{}',
+                state TEXT NOT NULL,
+                resume_stage TEXT,
+                dedupe_key TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "dedupe_key" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN dedupe_key TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_dedupe_key ON jobs (dedupe_key)")
+
+    def _row_to_job(self, row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["options"] = json.loads(job["options"] or "{}")
+        return job
+
+    def enqueue(self, job_id, meeting_link, task_id, username, source=ADHOC, options=None, dedupe_key=None):
+        """Add a job, or return the existing one if a job for the same work is still in flight
+
+        Jobs are the same work when they share a dedupe_key (e.g. the scheduled
+        task or the meeting link), or the job_id when no key is given.
+        """
+        now = time.time()
+        with self._lock:
+            column, value = ("dedupe_key", dedupe_key) if dedupe_key else ("job_id", job_id)
+            existing = self._find_in_flight(column, value)
+            if existing:
+                return existing, False
+
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO jobs
+                    (job_id, meeting_link, task_id, username, source, options, state,
+                     resume_stage, dedupe_key, attempts, error, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, NULL, ?, 0, NULL, ?, ?)
+                """,
+                (job_id, meeting_link, task_id, username, source, json.dumps(options or {}), QUEUED,
+                 dedupe_key, now, now),
+            )
+            return self.get(job_id), True
+
+    def _find_in_flight(self, column, value):
+        placeholders = ", ".join("?" for _ in TERMINAL_STATES)
+        return self._row_to_job(self._conn.execute(
+            f"SELECT * FROM jobs WHERE {column} = ? AND state NOT IN ({placeholders}) LIMIT 1",
+            (value, *TERMINAL_STATES),
+        ).fetchone())
+
+    def in_flight(self, dedupe_key):
+        """The queued or running job for this work, if there is one"""
+        return self._find_in_flight("dedupe_key", dedupe_key)
+
+    def claim_next(self, source=None, resume_stages=None):
+        """Atomically take the next queued job, scheduled ones first, and mark it as joining
+
+        source and resume_stages, if given, restrict which queued jobs are taken.
+        """
+        conditions = ["state = ?"]
+        params = [QUEUED]
+        if source:
+            conditions.append("source = ?")
+            params.append(source)
+        if resume_stages:
+            conditions.append(f"resume_stage IN ({', '.join('?' for _ in resume_stages)})")
+            params.extend(resume_stages)
+
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT * FROM jobs WHERE {' AND '.join(conditions)} ORDER BY source = ? DESC, created_at LIMIT 1",
+                (*params, SCHEDULED),
+            ).fetchone()
+            if row is None:
+                return None
+
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, updated_at = ? WHERE job_id = ?",
+                (JOINING, time.time(), row["job_id"]),
+            )
+            job = self._row_to_job(row)
+            job["state"] = JOINING
+            job["attempts"] += 1
+            return job
+
+    def set_state(self, job_id, state, error=None):
+        """Record a job's progress through the pipeline"""
+        if state not in JOB_STATES:
+            raise ValueError(f"Unknown job state: {state}")
+
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (state, error, time.time(), job_id),
+            )
+        print(f"Job {job_id} -> {state}" + (f" ({error})" if error else ""))
+
+    def get(self, job_id):
+        row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def list_jobs(self, states=None):
+        if states:
+            placeholders = ", ".join("?" for _ in states)
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE state IN ({placeholders}) ORDER BY created_at", tuple(states)
+            ).fetchall()
+        else:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY created_at").fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def depth(self):
+        """Number of jobs waiting for a worker"""
+        return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE state = ?", (QUEUED,)).fetchone()[0]
+
+    def cancel(self, job_id, error="cancelled"):
+        """Fail a job that is still waiting for a worker; False if a worker already has it"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE job_id = ? AND state = ?",
+                (FAILED, error, time.time(), job_id, QUEUED),
+            )
+        if cursor.rowcount:
+            print(f"Job {job_id} -> {FAILED} ({error})")
+        return cursor.rowcount == 1
+
+    def requeue(self, job_id, resume_stage=None):
+        """Put a finished or failed job back on the queue"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, resume_stage = ?, error = NULL, updated_at = ? WHERE job_id = ?",
+                (QUEUED, resume_stage, time.time(), job_id),
+            )
+
+    def requeue_interrupted(self):
+        """Put jobs that were in flight when the process died back on the queue"""
+        in_flight = [state for state in JOB_STATES if state not in TERMINAL_STATES and state != QUEUED]
+        placeholders = ", ".join("?" for _ in in_flight)
+        with self._lock:
+            cursor = self._conn.execute(
+                f"""
+                UPDATE jobs SET resume_stage = state, state = ?, updated_at = ?
+                WHERE state IN ({placeholders})
+                """,
+                (QUEUED, time.time(), *in_flight),
+            )
+        if cursor.rowcount:
+            print(f"Requeued {cursor.rowcount} interrupted job(s)")
+        return cursor.rowcount
+
+
+class WorkerPool:
+    """Fixed number of asyncio tasks draining a JobQueue with a coroutine handler
+
+    admit, if given, is asked whether a job of a given source may start now;
+    while it refuses, jobs stay queued. Jobs resuming in UNGATED_RESUME_STAGES
+    are not asked about: they do not start a recorder.
+    """
+
+    def __init__(self, queue, handler, size=None, poll_interval=5, admit=None):
+        self.queue = queue
+        self.handler = handler
+        self.admit = admit
+        self.size = size or default_pool_size()
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+
+    def start(self):
+        """Start the workers; must be called from the running event loop"""
+        for index in range(self.size):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"recording-worker-{index}"))
+        print(f"Recording worker pool started with {self.size} worker(s)")
+
+    def notify(self):
+        """Wake idle workers after a job has been enqueued"""
+        self._wakeup.set()
+
+    def _claim(self):
+        if not self.admit:
+            return self.queue.claim_next()
+        # Finishing recordings that were already made must not wait for room for new ones
+        job = self.queue.claim_next(resume_stages=UNGATED_RESUME_STAGES)
+        if job:
+            return job
+        if self.admit(ADHOC):
+            return self.queue.claim_next()
+        # Only room for the meetings users scheduled ahead
+        if self.admit(SCHEDULED):
+            return self.queue.claim_next(source=SCHEDULED)
+        return None
+
+    async def _worker(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            try:
+                await self.handler(job)
+            except Exception as e:
+                print(f"Worker error for job {job['job_id']}: {str(e)}")
+                print(traceback.format_exc())
+                self.queue.set_state(job["job_id"], FAILED, error=str(e))
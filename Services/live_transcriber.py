@@ -0,0 +1,141 @@
+import os
+import json
+import wave
+import threading
+import traceback
+
+from media import CHUNK_PATTERN
+from transcription import get_backend, stitch
+
+# Rolling chunks written by the recorder's ffmpeg segment output
+LIVE_CHUNK_SECONDS = int(os.getenv("LIVE_CHUNK_SECONDS", 30))
+# Audio from the end of the previous chunk prepended to each chunk, so words
+# cut at a boundary are heard whole at least once
+LIVE_CHUNK_OVERLAP_SECONDS = float(os.getenv("LIVE_CHUNK_OVERLAP_SECONDS", 3))
+
+CHUNKS_DIR = "chunks"
+LIVE_TRANSCRIPT_FILE = "live_transcript.txt"
+LIVE_STATE_FILE = "live_transcript.json"
+
+
+def live_transcription_enabled():
+    return os.getenv("LIVE_TRANSCRIPTION", "").lower() in ("1", "true", "yes")
+
+
+def _write_with_overlap(previous_chunk, chunk, output_path, overlap_seconds):
+    """Write chunk to output_path, prefixed by the last overlap_seconds of previous_chunk"""
+    with wave.open(chunk, "rb") as current:
+        params = current.getparams()
+        frames = current.readframes(current.getnframes())
+
+    prefix = b""
+    if previous_chunk and overlap_seconds > 0:
+        with wave.open(previous_chunk, "rb") as previous:
+            overlap_frames = int(previous.getframerate() * overlap_seconds)
+            previous.setpos(max(0, previous.getnframes() - overlap_frames))
+            prefix = previous.readframes(overlap_frames)
+
+    with wave.open(output_path, "wb") as combined:
+        combined.setparams(params)
+        combined.writeframes(prefix + frames)
+
+
+def load_live_transcript(recordings_dir):
+    """Transcript produced during the meeting, or None if it is missing or incomplete"""
+    transcripts_dir = os.path.join(recordings_dir, "transcripts")
+    state_path = os.path.join(transcripts_dir, LIVE_STATE_FILE)
+    if not os.path.exists(state_path):
+        return None
+
+    with open(state_path) as f:
+        state = json.load(f)
+    if not state.get("complete") or state.get("failed_chunks"):
+        return None
+
+    with open(os.path.join(transcripts_dir, LIVE_TRANSCRIPT_FILE)) as f:
+        return f.read()
+
+
+class LiveTranscriber:
+    """Transcribes recorder chunks as they close and stitches them into one transcript"""
+
+    def __init__(self, recordings_dir, backend=None, overlap_seconds=LIVE_CHUNK_OVERLAP_SECONDS, poll_interval=2):
+        self.chunks_dir = os.path.join(recordings_dir, CHUNKS_DIR)
+        self.transcripts_dir = os.path.join(recordings_dir, "transcripts")
+        self.backend = backend or get_backend(live=True)
+        self.overlap_seconds = overlap_seconds
+        self.poll_interval = poll_interval
+
+        self.transcript = ""
+        self.next_chunk = 0
+        self.failed_chunks = []
+        self._stopping = threading.Event()
+        self._thread = None
+
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        os.makedirs(self.transcripts_dir, exist_ok=True)
+
+    def _chunk_path(self, index):
+        return os.path.join(self.chunks_dir, CHUNK_PATTERN % index)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="live-transcriber")
+        self._thread.daemon = True
+        self._thread.start()
+        print(f"Live transcription started ({self.backend.name}, {LIVE_CHUNK_SECONDS}s chunks)")
+
+    def finish(self, timeout=300):
+        """Transcribe the remaining chunks once the recorder has stopped writing"""
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._save_state(complete=not self._thread.is_alive() if self._thread else True)
+        return self.transcript
+
+    def _run(self):
+        while True:
+            stopping = self._stopping.is_set()
+
+            # A chunk is closed once ffmpeg has moved on to the next one, or
+            # once recording has stopped altogether
+            while os.path.exists(self._chunk_path(self.next_chunk)) and (
+                stopping or os.path.exists(self._chunk_path(self.next_chunk + 1))
+            ):
+                self._transcribe_chunk(self.next_chunk)
+                self.next_chunk += 1
+                self._save_state(complete=False)
+
+            if stopping:
+                return
+            self._stopping.wait(self.poll_interval)
+
+    def _transcribe_chunk(self, index):
+        chunk = self._chunk_path(index)
+        previous = self._chunk_path(index - 1) if index > 0 else None
+        combined = os.path.join(self.chunks_dir, f"overlap_{index:05d}.wav")
+
+        for attempt in range(2):
+            try:
+                _write_with_overlap(previous, chunk, combined, self.overlap_seconds)
+                text = self.backend.transcribe(combined)
+                self.transcript = stitch(self.transcript, text)
+                print(f"Live transcript: chunk {index} done ({len(text)} characters)")
+                return
+            except Exception as e:
+                print(f"Live transcription of chunk {index} failed (attempt {attempt + 1}): {e}")
+                print(traceback.format_exc())
+            finally:
+                if os.path.exists(combined):
+                    os.remove(combined)
+
+        self.failed_chunks.append(index)
+
+    def _save_state(self, complete):
+        with open(os.path.join(self.transcripts_dir, LIVE_TRANSCRIPT_FILE), "w") as f:
+            f.write(self.transcript)
+        with open(os.path.join(self.transcripts_dir, LIVE_STATE_FILE), "w") as f:
+            json.dump({
+                "chunks_transcribed": self.next_chunk,
+                "failed_chunks": self.failed_chunks,
+                "complete": complete,
+            }, f)
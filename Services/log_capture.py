@@ -0,0 +1,60 @@
+import os
+import logging
+import logging.handlers
+from collections import deque
+
+PROCESS_LOG_MAX_BYTES = int(os.getenv("PROCESS_LOG_MAX_MB", 10)) * 1024 * 1024
+PROCESS_LOG_BACKUPS = int(os.getenv("PROCESS_LOG_BACKUPS", 3))
+TAIL_LINES = 500
+
+
+class ProcessLogCapture:
+    """Writes a recorder's output to a rotating log file as lines arrive
+
+    Only the last few hundred lines are kept in memory, for the tail endpoint.
+    """
+
+    def __init__(self, log_path, on_line=None, max_bytes=PROCESS_LOG_MAX_BYTES,
+                 backups=PROCESS_LOG_BACKUPS, tail_lines=TAIL_LINES):
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        self.log_path = log_path
+        self.on_line = on_line
+        self._handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=max_bytes, backupCount=backups
+        )
+        self._handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        self._tail = deque(maxlen=tail_lines)
+
+    def write(self, label, line):
+        message = f"{label}: {line}"
+        self._tail.append(message)
+        self._handler.handle(logging.makeLogRecord({"msg": message, "levelno": logging.INFO}))
+        if self.on_line:
+            try:
+                self.on_line(label, line)
+            except Exception as e:
+                print(f"Log line handler failed: {e}")
+
+    def close(self):
+        self._handler.close()
+
+    def tail(self, lines=100):
+        return list(self._tail)[-lines:]
+
+
+def tail_file(path, lines=100, block_size=8192):
+    """Last lines of a file, read backwards from the end"""
+    if not os.path.exists(path):
+        return []
+
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        while position > 0 and data.count(b"\n") <= lines:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+
+    return data.decode("utf-8", errors="replace").splitlines()[-lines:]
@@ -0,0 +1,160 @@
+import os
+import json
+import subprocess
+
+# File names written into storage/<recording_id>/recordings
+VIDEO_FILE = "output.mp4"
+AUDIO_FILE = "audio.ogg"
+CHUNK_PATTERN = "chunk_%05d.wav"
+
+# What the recorder captures:
+#   video        - full 1920x1080@30fps screen recording with audio
+#   audio        - meeting audio only, straight into a speech codec
+#   audio_lowres - speech audio plus a 640px / 2fps video track for reference
+# Every mode writes AUDIO_FILE, so processing never has to decode the video again.
+CAPTURE_MODES = ("video", "audio", "audio_lowres")
+DEFAULT_CAPTURE_MODE = os.getenv("CAPTURE_MODE", "video")
+
+SCREEN_SIZE = "1920x1080"
+SPEECH_FILTER = "highpass=f=200,lowpass=f=3000"
+
+# 16 kHz mono Opus is all the transcription backend needs and a fraction of the size of AAC
+SPEECH_AUDIO_ARGS = ["-ac", "1", "-ar", "16000", "-c:a", "libopus", "-b:a", "24k", "-application", "voip"]
+
+
+def live_chunk_args(audio_input, chunks_dir, chunk_seconds):
+    """Extra ffmpeg output that cuts the audio into rolling WAV chunks for live transcription"""
+    return [
+        "-map", f"{audio_input}:a", "-af", SPEECH_FILTER,
+        "-ac", "1", "-ar", "16000", "-c:a", "pcm_s16le",
+        "-f", "segment", "-segment_time", str(chunk_seconds), "-reset_timestamps", "1",
+        os.path.join(chunks_dir, CHUNK_PATTERN),
+    ]
+
+
+def build_capture_command(mode, display, monitor, recordings_dir, live_chunks_dir=None, chunk_seconds=30):
+    """ffmpeg arguments that capture a meeting from a display and PulseAudio monitor"""
+    if mode not in CAPTURE_MODES:
+        raise ValueError(f"Unknown capture mode: {mode}")
+
+    video_path = os.path.join(recordings_dir, VIDEO_FILE)
+    audio_path = os.path.join(recordings_dir, AUDIO_FILE)
+
+    if mode == "audio":
+        cmd = [
+            "ffmpeg", "-y",
+            "-f", "pulse", "-i", monitor,
+            "-map", "0:a", "-af", SPEECH_FILTER, *SPEECH_AUDIO_ARGS,
+            "-f", "ogg", audio_path,
+        ]
+        if live_chunks_dir:
+            cmd += live_chunk_args(0, live_chunks_dir, chunk_seconds)
+        return cmd
+
+    if mode == "audio_lowres":
+        cmd = [
+            "ffmpeg", "-y",
+            "-video_size", SCREEN_SIZE, "-framerate", "2", "-f", "x11grab", "-i", display,
+            "-f", "pulse", "-i", monitor,
+            # Low-res reference video
+            "-map", "0:v", "-map", "1:a",
+            "-vf", "scale=640:-2", "-c:v", "libx264", "-preset", "ultrafast", "-crf", "32",
+            "-pix_fmt", "yuv420p", "-af", SPEECH_FILTER, "-c:a", "aac", "-b:a", "64k",
+            "-movflags", "+faststart", "-f", "mp4", video_path,
+            # Transcription-ready audio, written in the same pass
+            "-map", "1:a", "-af", SPEECH_FILTER, *SPEECH_AUDIO_ARGS,
+            "-f", "ogg", audio_path,
+        ]
+    else:
+        cmd = [
+            "ffmpeg", "-y",
+            "-video_size", SCREEN_SIZE, "-framerate", "30", "-f", "x11grab", "-i", display,
+            "-f", "pulse", "-i", monitor,
+            "-map", "0:v", "-map", "1:a", "-af", SPEECH_FILTER,
+            "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac", "-strict", "experimental",
+            "-movflags", "+faststart", "-f", "mp4", video_path,
+            # Transcription-ready audio sidecar, written in the same pass
+            "-map", "1:a", "-af", SPEECH_FILTER, *SPEECH_AUDIO_ARGS,
+            "-f", "ogg", audio_path,
+        ]
+
+    if live_chunks_dir:
+        cmd += live_chunk_args(1, live_chunks_dir, chunk_seconds)
+    return cmd
+
+
+def expected_outputs(mode, recordings_dir):
+    """Files a capture in this mode produces, with the stream types each must contain"""
+    outputs = [(os.path.join(recordings_dir, AUDIO_FILE), ("audio",))]
+    if mode != "audio":
+        outputs.append((os.path.join(recordings_dir, VIDEO_FILE), ("video", "audio")))
+    return outputs
+
+
+def probe_media(path, timeout=30):
+    """Read container duration and stream types with ffprobe, without decoding any frames"""
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error",
+            "-show_entries", "format=duration:stream=codec_type",
+            "-of", "json", path,
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        timeout=timeout
+    )
+    if result.returncode != 0:
+        # e.g. "moov atom not found" for an MP4 that was never finalised
+        raise ValueError(result.stderr.strip() or f"ffprobe exited with code {result.returncode}")
+
+    info = json.loads(result.stdout or "{}")
+    return {
+        "duration": float(info.get("format", {}).get("duration") or 0),
+        "streams": [stream.get("codec_type") for stream in info.get("streams", [])],
+    }
+
+
+def verify_media(path, required_streams=("audio",)):
+    """Check that a recording is a readable container with a duration and the expected streams"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        print(f"Recording missing or empty: {path}")
+        return False
+
+    try:
+        info = probe_media(path)
+    except (ValueError, subprocess.TimeoutExpired) as e:
+        print(f"Recording probe failed for {path}: {e}")
+        return False
+
+    missing = [stream for stream in required_streams if stream not in info["streams"]]
+    if info["duration"] <= 0 or missing:
+        print(f"Recording {path} is incomplete (duration {info['duration']}s, missing {missing})")
+        return False
+
+    return True
+
+
+def extract_audio(video_path, audio_path):
+    """Decode the audio track of a recorded video into audio_path"""
+    subprocess.run(
+        ["ffmpeg", "-y", "-i", video_path, "-q:a", "0", "-map", "a", audio_path],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+
+
+def find_video(recordings_dir):
+    """The recorded video file, if there is one"""
+    video_files = sorted(f for f in os.listdir(recordings_dir) if f.endswith(('.mp4', '.mkv', '.webm')))
+    return os.path.join(recordings_dir, video_files[0]) if video_files else None
+
+
+def find_transcription_audio(recordings_dir):
+    """Audio captured during recording, if the capture mode produced any"""
+    audio_path = os.path.join(recordings_dir, AUDIO_FILE)
+    if os.path.exists(audio_path) and os.path.getsize(audio_path) > 0:
+        return audio_path
+    return None
@@ -0,0 +1,171 @@
+import os
+import fcntl
+import subprocess
+import time
+
+# Lock files used to hand out display numbers and sink names across recorder processes
+SLOT_DIR = os.getenv("MEDIA_SLOT_DIR", "/tmp/metamate-slots")
+
+# First Xvfb display number handed out to recorders (entrypoint.sh keeps :99)
+BASE_DISPLAY = int(os.getenv("XVFB_BASE_DISPLAY", 100))
+MAX_SLOTS = int(os.getenv("MAX_MEDIA_SLOTS", 16))
+SCREEN_SIZE = "1920x1080x24"
+
+
+def _pactl(*args):
+    """Run pactl against the shared system-wide PulseAudio daemon"""
+    result = subprocess.run(
+        ["sudo", "pactl", *args],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+    return result.stdout.strip()
+
+
+def ensure_pulseaudio():
+    """Start the system-wide PulseAudio daemon unless another recorder already did"""
+    os.makedirs(SLOT_DIR, exist_ok=True)
+    with open(os.path.join(SLOT_DIR, "pulseaudio.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        running = subprocess.run(
+            ["sudo", "pactl", "info"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        ).returncode == 0
+        if running:
+            return
+
+        # Only clear stale state when no daemon is serving other recordings
+        subprocess.run("sudo rm -rf /var/run/pulse /var/lib/pulse /root/.config/pulse",
+                       shell=True, check=True)
+        subprocess.run(
+            "sudo pulseaudio -D --verbose --exit-idle-time=-1 --system --disallow-exit",
+            shell=True, check=True
+        )
+
+
+class MediaSlot:
+    """An Xvfb display and set of PulseAudio sinks owned by one recording"""
+
+    def __init__(self, index, lock_file):
+        self.index = index
+        self._lock_file = lock_file
+        self.display = f":{BASE_DISPLAY + index}"
+        self.meeting_sink = f"MeetingOutput_{index}"
+        self.mic_sink = f"MicOutput_{index}"
+        self.virtual_mic = f"VirtualMic_{index}"
+        self.monitor = f"{self.meeting_sink}.monitor"
+        self._xvfb = None
+        self._modules = []
+
+    @classmethod
+    def acquire(cls):
+        """Reserve the first free slot; the lock is dropped automatically if the process dies"""
+        os.makedirs(SLOT_DIR, exist_ok=True)
+        for index in range(MAX_SLOTS):
+            # Skip displays some other X server already owns
+            if os.path.exists(f"/tmp/.X{BASE_DISPLAY + index}-lock"):
+                continue
+
+            lock_file = open(os.path.join(SLOT_DIR, f"slot_{index}.lock"), "w")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                continue
+
+            lock_file.write(str(os.getpid()))
+            lock_file.flush()
+            print(f"Acquired media slot {index} (display {BASE_DISPLAY + index})")
+            return cls(index, lock_file)
+
+        raise RuntimeError(f"No free media slots (all {MAX_SLOTS} in use)")
+
+    @classmethod
+    def lent(cls, index):
+        """A slot another process has locked and set up, e.g. for a warm browser; release() is a no-op"""
+        return cls(index, None)
+
+    def start_display(self, timeout=10):
+        """Launch a private Xvfb server and wait for its socket"""
+        self._xvfb = subprocess.Popen(
+            ["Xvfb", self.display, "-screen", "0", SCREEN_SIZE, "-nolisten", "tcp"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+        socket_path = f"/tmp/.X11-unix/X{self.display.lstrip(':')}"
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if os.path.exists(socket_path):
+                return True
+            if self._xvfb.poll() is not None:
+                break
+            time.sleep(0.1)
+
+        print(f"Xvfb failed to start on {self.display}")
+        return False
+
+    def _unload_stale_modules(self):
+        """Drop modules left behind by a recorder that died while holding this slot"""
+        names = {self.meeting_sink, self.mic_sink, self.virtual_mic, self.monitor}
+        for line in _pactl("list", "short", "modules").splitlines():
+            fields = line.split("\t")
+            if len(fields) < 3:
+                continue
+            values = {arg.split("=", 1)[-1] for arg in fields[2].split()}
+            if values & names:
+                _pactl("unload-module", fields[0])
+
+    def setup_audio(self):
+        """Create this slot's null sinks, virtual mic and loopback"""
+        ensure_pulseaudio()
+        self._unload_stale_modules()
+
+        self._modules.append(_pactl(
+            "load-module", "module-null-sink", f"sink_name={self.meeting_sink}",
+            f"sink_properties=device.description=Virtual_Meeting_Output_{self.index}"
+        ))
+        self._modules.append(_pactl(
+            "load-module", "module-null-sink", f"sink_name={self.mic_sink}",
+            f"sink_properties=device.description=Virtual_Microphone_Output_{self.index}"
+        ))
+        self._modules.append(_pactl(
+            "load-module", "module-virtual-source", f"source_name={self.virtual_mic}"
+        ))
+        self._modules.append(_pactl(
+            "load-module", "module-loopback", "latency_msec=1",
+            f"source={self.monitor}", f"sink={self.mic_sink}"
+        ))
+
+    def env(self):
+        """Environment that routes a child's display and audio into this slot"""
+        return {
+            "DISPLAY": self.display,
+            "PULSE_SINK": self.meeting_sink,
+            "PULSE_SOURCE": self.monitor,
+        }
+
+    def release(self):
+        """Unload sinks, stop Xvfb and give the slot back"""
+        for module in reversed(self._modules):
+            try:
+                _pactl("unload-module", module)
+            except subprocess.CalledProcessError as e:
+                print(f"Failed to unload PulseAudio module {module}: {e}")
+        self._modules = []
+
+        if self._xvfb and self._xvfb.poll() is None:
+            self._xvfb.terminate()
+            try:
+                self._xvfb.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._xvfb.kill()
+        self._xvfb = None
+
+        if self._lock_file:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+            print(f"Released media slot {self.index}")
@@ -0,0 +1,195 @@
+import os
+import re
+import time
+import threading
+import subprocess
+
+# Text Meet shows once the call is over for us
+END_PHRASES = [
+    "rejoin",
+    "the meeting has ended",
+    "return to home screen",
+    "meeting has been ended by host"
+]
+
+# Continuous silence on the meeting audio treated as the meeting having ended (0 disables);
+# only counted once someone has been heard, so joining early into a quiet room does not end it
+SILENCE_TIMEOUT_SECONDS = int(os.getenv("MEETING_SILENCE_TIMEOUT_SECONDS", 300))
+SILENCE_THRESHOLD = os.getenv("MEETING_SILENCE_THRESHOLD", "-50dB")
+
+# How often the in-page end flag is read, and how often the full polling check runs
+# while the flag cannot be read
+FLAG_CHECK_INTERVAL = 2
+FALLBACK_CHECK_INTERVAL = 30
+
+# silencedetect reports where a silence began; one starting this close to the beginning
+# of the audio means nobody has spoken since the bot joined
+SILENCE_START_RE = re.compile(r"silence_start: (-?[\d.]+)")
+JOIN_SILENCE_MARGIN_SECONDS = 1
+
+# Installs a MutationObserver that flags the page as ended as soon as an end
+# phrase appears; body text is re-read at most every 500ms however busy the DOM is
+END_OBSERVER_JS = """
+if (!window.__metamateEndObserver) {
+    const phrases = arguments[0];
+    let scheduled = false;
+    window.__metamateMeetingEnded = false;
+    const check = () => {
+        scheduled = false;
+        const text = ((document.body && document.body.innerText) || "").toLowerCase();
+        if (phrases.some(phrase => text.includes(phrase))) {
+            window.__metamateMeetingEnded = true;
+        }
+    };
+    window.__metamateEndObserver = new MutationObserver(() => {
+        if (!scheduled) {
+            scheduled = true;
+            setTimeout(check, 500);
+        }
+    });
+    window.__metamateEndObserver.observe(document.body, {childList: true, subtree: true, characterData: true});
+    check();
+}
+"""
+
+# Null when the observer is gone, i.e. the page navigated and it needs reinstalling
+END_FLAG_JS = "return window.__metamateEndObserver ? window.__metamateMeetingEnded === true : null;"
+
+
+class MeetingEndDetector:
+    """Signals the end of a meeting from DOM, navigation and audio events, with polling as a fallback"""
+
+    def __init__(self, driver, monitor_source, silence_timeout=SILENCE_TIMEOUT_SECONDS):
+        self.driver = driver
+        self.monitor_source = monitor_source
+        self.silence_timeout = silence_timeout
+        self.ended = threading.Event()
+        self.reason = None
+        self._silence_process = None
+
+    def start(self):
+        self._install_observer()
+        self._subscribe_navigation()
+        if self.silence_timeout > 0:
+            self._start_silence_detector()
+
+    def _signal(self, reason):
+        if not self.ended.is_set():
+            self.reason = reason
+            self.ended.set()
+            print(f"Meeting end detected: {reason}")
+
+    def request_end(self, reason):
+        """End the wait from outside, e.g. when an operator stops the recording"""
+        self._signal(reason)
+
+    def _install_observer(self):
+        try:
+            self.driver.execute_script(END_OBSERVER_JS, END_PHRASES)
+        except Exception as e:
+            print(f"Failed to install meeting end observer: {e}")
+
+    def _subscribe_navigation(self):
+        """Leaving meet.google.com ends the meeting; CDP tells us without polling the URL"""
+        if not hasattr(self.driver, "add_cdp_listener"):
+            return
+
+        def on_navigated(message):
+            frame = message.get("params", {}).get("frame", {})
+            if frame.get("parentId"):
+                return
+            if "meet.google.com" not in frame.get("url", ""):
+                self._signal(f"navigated away to {frame.get('url')}")
+
+        try:
+            self.driver.add_cdp_listener("Page.frameNavigated", on_navigated)
+        except Exception as e:
+            print(f"CDP navigation events unavailable: {e}")
+
+    def _start_silence_detector(self):
+        """Watch the meeting audio with ffmpeg's silencedetect"""
+        cmd = [
+            "ffmpeg", "-nostats", "-f", "pulse", "-i", self.monitor_source,
+            "-af", f"silencedetect=noise={SILENCE_THRESHOLD}:d={self.silence_timeout}",
+            "-f", "null", "-",
+        ]
+        try:
+            self._silence_process = subprocess.Popen(
+                cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE, text=True
+            )
+        except OSError as e:
+            print(f"Failed to start silence detector: {e}")
+            return
+
+        thread = threading.Thread(target=self._watch_silence)
+        thread.daemon = True
+        thread.start()
+
+    def _watch_silence(self):
+        # silencedetect only reports silence_start once the silence has lasted silence_timeout
+        heard = False
+        for line in iter(self._silence_process.stderr.readline, ''):
+            if "silence_end" in line:
+                heard = True
+                continue
+            match = SILENCE_START_RE.search(line)
+            if not match:
+                continue
+            if heard or float(match.group(1)) > JOIN_SILENCE_MARGIN_SECONDS:
+                self._signal(f"no meeting audio for {self.silence_timeout}s")
+                return
+            print(f"Nobody heard in the first {self.silence_timeout}s, waiting for someone to speak")
+
+    def _page_reports_end(self):
+        """The observer's end flag, or None if it could not be read"""
+        try:
+            flag = self.driver.execute_script(END_FLAG_JS)
+        except Exception as e:
+            print(f"Meeting end flag check error: {e}")
+            return None
+
+        if flag is None:
+            self._install_observer()
+        return flag
+
+    def wait_for_end(self, deadline, fallback_check):
+        """Block until the meeting ends or the deadline passes; returns the reason
+
+        fallback_check (screenshot and page text) only runs once the observer's
+        flag has gone unread for FALLBACK_CHECK_INTERVAL, e.g. while the page hangs.
+        """
+        flag_read_at = time.time()
+        next_fallback = flag_read_at + FALLBACK_CHECK_INTERVAL
+
+        while not self.ended.is_set():
+            if time.time() >= deadline:
+                self._signal("maximum recording time reached")
+                break
+
+            # WebDriver calls stay on this thread; background watchers only set the event
+            if self.ended.wait(FLAG_CHECK_INTERVAL):
+                break
+            flag = self._page_reports_end()
+            if flag:
+                self._signal("end screen detected")
+                break
+
+            now = time.time()
+            if flag is not None:
+                flag_read_at = now
+            elif now - flag_read_at >= FALLBACK_CHECK_INTERVAL and now >= next_fallback:
+                if not fallback_check():
+                    self._signal("polling check")
+                    break
+                next_fallback = time.time() + FALLBACK_CHECK_INTERVAL
+
+        return self.reason
+
+    def stop(self):
+        if self._silence_process and self._silence_process.poll() is None:
+            self._silence_process.terminate()
+            try:
+                self._silence_process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._silence_process.kill()
@@ -0,0 +1,234 @@
+import os
+import heapq
+import asyncio
+import datetime
+import time
+import traceback
+
+import httpx
+
+# How often new and changed meeting records are pulled from the backend
+SYNC_INTERVAL_SECONDS = int(os.getenv("SCHEDULER_SYNC_SECONDS", 60))
+# How often the full list is re-read to notice deleted meetings (cheap when unchanged, via ETag)
+FULL_SYNC_INTERVAL_SECONDS = int(os.getenv("SCHEDULER_FULL_SYNC_SECONDS", 600))
+# Warm resources up this long before a recording is due to start
+PREWARM_SECONDS = int(os.getenv("SCHEDULER_PREWARM_SECONDS", 120))
+
+DUE = "due"
+PREWARM = "prewarm"
+
+
+def parse_time(value):
+    """Timestamp from the backend's ISO dates (which end in Z) as epoch seconds"""
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+class MeetingScheduler:
+    """Arms a timer per meeting instead of polling for meetings that are about to start
+
+    Meeting records are kept in sync with the backend incrementally (records
+    updated since the last cursor, plus a periodic full read guarded by an
+    ETag). Each meeting gets a heap entry at start time minus lead_seconds,
+    and another prewarm_seconds earlier. Entries of meetings that were moved
+    or deleted since they were armed are dropped when they come up. The
+    on_due and on_prewarm handlers are coroutines, each run as its own task.
+    on_due may return a time to be called again for the same meeting (when
+    another node holds it, just after that node's claim would lapse); the
+    meeting is re-armed for then unless it has ended, moved or been deleted.
+    """
+
+    def __init__(self, client, on_due, on_prewarm=None, lead_seconds=0,
+                 prewarm_seconds=PREWARM_SECONDS, sync_interval=SYNC_INTERVAL_SECONDS,
+                 full_sync_interval=FULL_SYNC_INTERVAL_SECONDS, records_path="/meeting-records"):
+        self.client = client
+        self.records_path = records_path
+        self.on_due = on_due
+        self.on_prewarm = on_prewarm
+        self.lead_seconds = lead_seconds
+        self.prewarm_seconds = prewarm_seconds
+        self.sync_interval = sync_interval
+        self.full_sync_interval = full_sync_interval
+
+        self._meetings = {}
+        self._heap = []
+        self._fired = set()
+        self._sequence = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._handlers = set()
+
+        self._cursor = None
+        self._etag = None
+        self._next_sync = 0
+        self._next_full_sync = 0
+
+    def start(self):
+        """Run in the background; must be called from the running event loop"""
+        self._task = asyncio.create_task(self._run(), name="meeting-scheduler")
+        print("Meeting scheduler started")
+
+    def _version(self, meeting):
+        return (meeting["google_meeting_link"], meeting["start_time"])
+
+    def _arm(self, task_id, meeting):
+        # Meetings still running when first seen are joined late; ones already over are ignored
+        if meeting.get("end_time") and parse_time(meeting["end_time"]) <= time.time():
+            return False
+
+        start = parse_time(meeting["start_time"])
+        due_at = start - self.lead_seconds
+        entries = [(due_at, DUE)]
+        if self.on_prewarm and self.prewarm_seconds > 0:
+            entries.append((due_at - self.prewarm_seconds, PREWARM))
+
+        version = self._version(meeting)
+        for when, kind in entries:
+            self._sequence += 1
+            heapq.heappush(self._heap, (when, self._sequence, kind, task_id, version))
+        return True
+
+    def _apply(self, meetings, full):
+        """Merge fetched records; a full read also forgets meetings the backend no longer has"""
+        seen = set()
+        for meeting in meetings:
+            task_id = meeting.get("taskId")
+            if not task_id:
+                continue
+            seen.add(task_id)
+
+            known = self._meetings.get(task_id)
+            if known and self._version(known) == self._version(meeting):
+                continue
+            # Still listed while its recording runs; claims and heartbeats bump updatedAt
+            if (DUE, task_id, self._version(meeting)) in self._fired:
+                continue
+            try:
+                armed = self._arm(task_id, meeting)
+            except (KeyError, ValueError) as e:
+                print(f"Skipping meeting {task_id} with bad start time: {e}")
+                continue
+            if not armed:
+                continue
+            self._meetings[task_id] = meeting
+            print(f"Armed recording of {meeting['google_meeting_link']} for {meeting['start_time']}")
+
+        if full:
+            for task_id in set(self._meetings) - seen:
+                print(f"Meeting {task_id} was removed, disarming")
+                del self._meetings[task_id]
+
+        self._wakeup.set()
+
+    async def sync(self, full=False):
+        """Pull new and changed meeting records from the backend"""
+        headers = {}
+        params = {}
+        if full:
+            if self._etag:
+                headers["If-None-Match"] = self._etag
+        elif self._cursor:
+            params["since"] = self._cursor
+
+        try:
+            # No retries here: the next sync is never more than sync_interval away
+            response = await self.client.get(self.records_path, params=params, headers=headers, retries=0)
+        except httpx.HTTPError as e:
+            print(f"Error fetching meetings: {e}")
+            return False
+
+        if response.status_code == 304:
+            return True
+        if response.status_code != 200:
+            print(f"Failed to fetch meetings: {response.status_code}")
+            return False
+
+        meetings = response.json()
+        if full:
+            self._etag = response.headers.get("ETag")
+        print(f"Fetched {len(meetings)} {'' if full else 'changed '}meeting record(s)")
+
+        # Records updated at the cursor itself are fetched again next time; _apply ignores repeats
+        updated = [meeting["updatedAt"] for meeting in meetings if meeting.get("updatedAt")]
+        if updated:
+            self._cursor = max([self._cursor] + updated if self._cursor else updated)
+
+        self._apply(meetings, full)
+        return True
+
+    def _pop_ready(self, now):
+        """Heap entries whose time has come and whose meeting has not changed since they were armed"""
+        ready = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, kind, task_id, version = heapq.heappop(self._heap)
+            meeting = self._meetings.get(task_id)
+            if not meeting or self._version(meeting) != version:
+                continue
+            if (kind, task_id, version) in self._fired:
+                continue
+            self._fired.add((kind, task_id, version))
+            if kind == DUE:
+                del self._meetings[task_id]
+            ready.append((kind, meeting))
+        return ready
+
+    def _fire(self, kind, meeting):
+        # Handlers may wait on the backend; the timer loop must not
+        task = asyncio.create_task(self._handle(kind, meeting))
+        self._handlers.add(task)
+        task.add_done_callback(self._handlers.discard)
+
+    async def _handle(self, kind, meeting):
+        handler = self.on_due if kind == DUE else self.on_prewarm
+        try:
+            retry_at = await handler(meeting)
+        except Exception as e:
+            print(f"Scheduler {kind} handler failed for {meeting.get('taskId')}: {e}")
+            print(traceback.format_exc())
+            return
+        if kind == DUE and retry_at:
+            self._rearm(meeting, retry_at)
+
+    def _rearm(self, meeting, retry_at):
+        """Fire the DUE handler for this meeting again at retry_at"""
+        task_id = meeting["taskId"]
+        if task_id in self._meetings:
+            # Synced again with a new time or link since it fired, and armed for that
+            return
+        if meeting.get("end_time") and retry_at >= parse_time(meeting["end_time"]):
+            print(f"Meeting {task_id} ends before it could be taken over, giving up")
+            return
+
+        version = self._version(meeting)
+        self._fired.discard((DUE, task_id, version))
+        self._meetings[task_id] = meeting
+        self._sequence += 1
+        heapq.heappush(self._heap, (retry_at, self._sequence, DUE, task_id, version))
+        print(f"Will try meeting {task_id} again in {max(0, retry_at - time.time()):.0f}s")
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            if now >= self._next_sync:
+                full = now >= self._next_full_sync
+                if await self.sync(full=full) and full:
+                    self._next_full_sync = now + self.full_sync_interval
+                self._next_sync = now + self.sync_interval
+
+            for kind, meeting in self._pop_ready(time.time()):
+                self._fire(kind, meeting)
+
+            # Sleep until the next timer or sync, whichever is sooner
+            next_timer = self._heap[0][0] if self._heap else float("inf")
+            timeout = min(next_timer, self._next_sync) - time.time()
+            self._wakeup.clear()
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
@@ -10,21 +10,54 @@ import sys
 import time
 import signal
 import traceback
+import threading
 from threading import Thread
-from time import sleep
 
 import undetected_chromedriver as uc
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, WebDriverException
 
+import tracing
+from tracing import Tracer
+from media_slots import MediaSlot
+from browser_pool import CHROME_ARGS, DEBUGGER_ADDRESS_ENV, SLOT_INDEX_ENV, profile_dir
+from diagnostics import ScreenshotStore
+from live_transcriber import LIVE_CHUNK_SECONDS, LiveTranscriber, live_transcription_enabled
+from meeting_monitor import END_PHRASES, MeetingEndDetector
+from page_waits import (
+    DENIED, JOIN_BUTTON_XPATH, STEP_TIMEOUT_SECONDS, LOBBY_TIMEOUT_SECONDS, STEP_TIMINGS_FILE, WAITING,
+    StepTimer, admission_decided, lobby_state, visible_element, wait_for, wait_quietly
+)
+from media import CAPTURE_MODES, DEFAULT_CAPTURE_MODE, build_capture_command, expected_outputs, verify_media
+
+# Returned by the admission wait when an operator stops the recording in the lobby
+STOPPED = "stopped"
+
 class MeetRecorder:
-    def __init__(self, meet_link, meet_id):
+    def __init__(self, meet_link, meet_id, capture_mode=DEFAULT_CAPTURE_MODE, on_event=None):
+        if capture_mode not in CAPTURE_MODES:
+            raise ValueError(f"Unknown capture mode: {capture_mode}")
+
         self.meet_link = meet_link
         self.meet_id = meet_id
+        self.capture_mode = capture_mode
         self.driver = None
         self.record_process = None
         self.recording_active = False
+        self.slot = None
+        self.live_transcriber = None
+        
+        # Progress reporting and control for a supervising process
+        self.on_event = on_event
+        self.phase = "starting"
+        self.end_reason = None
+        self._stopping = threading.Event()
+        self._stop_reason = None
+        self._detector = None
         
         # Setup directories
         self.base_dir = f"storage/{self.meet_id}"
@@ -33,77 +66,103 @@ class MeetRecorder:
         self.logs_dir = f"{self.base_dir}/logs"
         
         self._setup_directories()
+        self.timer = StepTimer(
+            os.path.join(self.logs_dir, STEP_TIMINGS_FILE),
+            on_step=lambda step: self._emit("step", **step)
+        )
+        
+    def _emit(self, event, **fields):
+        """Report progress to the supervisor, if there is one"""
+        if event != "step":
+            self.phase = event
+        if not self.on_event:
+            return
+        try:
+            self.on_event(dict(fields, event=event, job_id=self.meet_id, time=time.time()))
+        except Exception as e:
+            print(f"Progress event handler failed: {e}")
+    
+    def request_stop(self, reason="stop requested"):
+        """Stop the recording early; safe to call from another thread"""
+        self._stop_reason = reason
+        self._stopping.set()
+        if self._detector:
+            self._detector.request_end(reason)
+    
+    def _stop_requested(self):
+        if not self._stopping.is_set():
+            return False
+        print(f"Stopping before the recording started ({self._stop_reason})")
+        self.end_reason = self._stop_reason
+        self._emit(STOPPED, reason=self._stop_reason)
+        return True
+    
+    def status(self):
+        """Snapshot of what the recorder is doing, for the supervisor's status requests"""
+        return {
+            "job_id": self.meet_id,
+            "phase": self.phase,
+            "capture_mode": self.capture_mode,
+            "recording_active": self.recording_active,
+            "display": self.slot.display if self.slot else None,
+            "stopping": self._stopping.is_set(),
+            "steps": list(self.timer.steps),
+        }
         
     def _setup_directories(self):
         """Create necessary directories if they don't exist"""
-        os.makedirs(self.screenshots_dir, exist_ok=True)
         os.makedirs(self.recordings_dir, exist_ok=True)
         os.makedirs(self.logs_dir, exist_ok=True)
         
         # Clear previous screenshots
-        for f in os.listdir(self.screenshots_dir):
-            os.remove(os.path.join(self.screenshots_dir, f))
+        self.screenshots = ScreenshotStore(self.screenshots_dir)
+        self.screenshots.reset()
     
     def _setup_audio(self):
-        """Configure PulseAudio for virtual audio devices"""
-        try:
-            # Clean previous PulseAudio setup
-            subprocess.run("sudo rm -rf /var/run/pulse /var/lib/pulse /root/.config/pulse", 
-                          shell=True, check=True)
-
-            # Start PulseAudio in system mode
-            subprocess.run(
-                "sudo pulseaudio -D --verbose --exit-idle-time=-1 --system --disallow-exit",
-                shell=True, check=True
-            )
+        """Reserve a private Xvfb display and PulseAudio sinks for this recording"""
+        # A warm browser from the server's pool already owns a display and sinks
+        if os.getenv(DEBUGGER_ADDRESS_ENV) and os.getenv(SLOT_INDEX_ENV):
+            self.slot = MediaSlot.lent(int(os.getenv(SLOT_INDEX_ENV)))
+            print(f"Using warm browser media slot {self.slot.index}")
+            return True
 
-            # Create virtual sinks
-            subprocess.run(
-                'sudo pactl load-module module-null-sink sink_name=MeetingOutput sink_properties=device.description="Virtual_Meeting_Output"',
-                shell=True, check=True
-            )
-            subprocess.run(
-                'sudo pactl load-module module-null-sink sink_name=MicOutput sink_properties=device.description="Virtual_Microphone_Output"',
-                shell=True, check=True
-            )
-            subprocess.run(
-                "sudo pactl load-module module-virtual-source source_name=VirtualMic",
-                shell=True, check=True
-            )
+        try:
+            self.slot = MediaSlot.acquire()
+            if not self.slot.start_display():
+                return False
+            self.slot.setup_audio()
 
-            # Set default devices
-            subprocess.run("sudo pactl set-default-source MeetingOutput.monitor", shell=True, check=True)
-            subprocess.run("sudo pactl set-default-sink MeetingOutput", shell=True, check=True)
-            
-            # Create loopback for audio routing
-            subprocess.run(
-                "sudo pactl load-module module-loopback latency_msec=1 source=MeetingOutput.monitor sink=MicOutput",
-                shell=True, check=True
-            )
-            
+            # Chrome and ffmpeg are started from this process, so route them
+            # to this recording's display and sinks
+            os.environ.update(self.slot.env())
             return True
-        except subprocess.CalledProcessError as e:
+        except (RuntimeError, subprocess.CalledProcessError) as e:
             print(f"Audio setup failed: {e}")
             return False
+
+    def _release_media(self):
+        """Give the display and sinks back for other recordings"""
+        if self.slot:
+            self.slot.release()
+            self.slot = None
     
     def _init_browser(self):
-        """Initialize undetected Chrome browser"""
+        """Attach to a warm browser if one was leased, otherwise start undetected Chrome"""
+        debugger_address = os.getenv(DEBUGGER_ADDRESS_ENV)
+        if debugger_address:
+            return self._attach_browser(debugger_address)
+
         options = uc.ChromeOptions()
-        options.add_argument("--use-fake-ui-for-media-stream")
-        options.add_argument("--window-size=1920x1080")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-setuid-sandbox")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--disable-extensions")
-        options.add_argument("--disable-application-cache")
-        options.add_argument("--disable-dev-shm-usage")
-        
-        options.add_argument("--log-level=3")
+        for arg in CHROME_ARGS:
+            options.add_argument(arg)
         
         try:
+            # The profile is kept per slot, so the Google session outlives this recording
             self.driver = uc.Chrome(
                 options=options,
-                headless=False
+                headless=False,
+                enable_cdp_events=True,
+                user_data_dir=profile_dir(self.slot.index)
             )
             self.driver.set_window_size(1920, 1080)
             return True
@@ -111,46 +170,79 @@ class MeetRecorder:
             print(f"Browser initialization failed: {e}")
             return False
     
+    def _attach_browser(self, debugger_address):
+        """Drive an already running Chrome through the patched chromedriver
+
+        The same attachment uc.Chrome makes to the browser it starts itself.
+        """
+        try:
+            patcher = uc.Patcher()
+            patcher.auto()
+
+            options = webdriver.ChromeOptions()
+            options.debugger_address = debugger_address
+            # What enable_cdp_events asks for on the cold path
+            options.set_capability("goog:loggingPrefs", {"performance": "ALL", "browser": "ALL"})
+            self.driver = webdriver.Chrome(service=Service(patcher.executable_path), options=options)
+            print(f"Attached to warm browser at {debugger_address}")
+            return True
+        except Exception as e:
+            print(f"Attaching to warm browser failed: {e}")
+            return False
+
+    def _is_signed_in(self):
+        """A persistent profile usually still has a Google session from an earlier recording"""
+        try:
+            self.driver.get("https://myaccount.google.com")
+            return self.driver.current_url.startswith("https://myaccount.google.com")
+        except WebDriverException as e:
+            print(f"Session check failed: {e}")
+            return False
+
     async def _google_sign_in(self, email, password):
         """Sign in to Google account"""
+        with self.timer.step("session_check"):
+            signed_in = self._is_signed_in()
+        if signed_in:
+            print("Reusing existing Google session")
+            return True
+
         try:
             self.driver.get("https://accounts.google.com")
-            sleep(2)
             
             # Email step
-            email_field = self.driver.find_element(By.NAME, "identifier")
-            email_field.send_keys(email)
-            self._take_screenshot("email_entry.png")
-            self.driver.find_element(By.ID, "identifierNext").click()
-            sleep(5)
+            with self.timer.step("signin_email"):
+                email_field = wait_for(self.driver, visible_element(By.NAME, "identifier"), description="email field")
+                email_field.send_keys(email)
+                self._take_screenshot("email_entry")
+                self.driver.find_element(By.ID, "identifierNext").click()
             
             # Password step
-            password_field = self.driver.find_element(By.NAME, "Passwd")
-            password_field.send_keys(password)
-            self._take_screenshot("password_entry.png")
-            password_field.send_keys(Keys.RETURN)
-            sleep(5)
+            with self.timer.step("signin_password"):
+                password_field = wait_for(self.driver, visible_element(By.NAME, "Passwd"), description="password field")
+                password_field.send_keys(password)
+                self._take_screenshot("password_entry")
+                password_field.send_keys(Keys.RETURN)
             
-            self._take_screenshot("signed_in.png")
+            # Signed in once the password form has gone away
+            with self.timer.step("signin_complete"):
+                wait_for(self.driver, EC.staleness_of(password_field), description="sign-in to complete")
+            
+            self._take_screenshot("signed_in")
             return True
         except Exception as e:
             print(f"Google sign-in failed: {e}")
-            self._take_screenshot("signin_error.png")
+            self.screenshots.dump_failure(self.driver, "signin_error")
             return False
     
-    def _take_screenshot(self, filename):
-        """Take screenshot and save to screenshots directory"""
-        try:
-            path = os.path.join(self.screenshots_dir, filename)
-            self.driver.save_screenshot(path)
-        except Exception as e:
-            print(f"Failed to take screenshot: {e}")
+    def _take_screenshot(self, name):
+        """Take a downscaled screenshot of a step and save to screenshots directory"""
+        self.screenshots.capture(self.driver, name)
     
     def _is_meeting_active(self):
         """Check if meeting is still active"""
         try:
-            self._take_screenshot(f"meeting_check_{int(time.time())}.png")
-            
+            self.screenshots.capture_periodic(self.driver)
 
             current_url = self.driver.current_url
             if "meet.google.com" not in current_url:
@@ -158,14 +250,8 @@ class MeetRecorder:
                 
             # Check for meeting end indicators
             page_text = self.driver.find_element(By.TAG_NAME, "body").text.lower()
-            end_phrases = [
-                "rejoin", 
-                "the meeting has ended",
-                "return to home screen",
-                "meeting has been ended by host"
-            ]
             
-            if any(phrase in page_text for phrase in end_phrases):
+            if any(phrase in page_text for phrase in END_PHRASES):
                 return False
                 
             return True
@@ -176,27 +262,31 @@ class MeetRecorder:
     
     def _start_recording(self):
         """Start FFmpeg recording process"""
-        output_file = os.path.join(self.recordings_dir, "output.mp4")
         log_file = os.path.join(self.logs_dir, "ffmpeg.log")
         
-        cmd = (
-            f"ffmpeg -y -video_size 1920x1080 -framerate 30 -f x11grab -i :99 "
-            f"-f pulse -i MeetingOutput.monitor -af 'highpass=f=200,lowpass=f=3000' "
-            f"-c:v libx264 -pix_fmt yuv420p -c:a aac -strict experimental "
-            f"-movflags +faststart -f mp4 {output_file}"
+        if live_transcription_enabled():
+            self.live_transcriber = LiveTranscriber(self.recordings_dir)
+        
+        cmd = build_capture_command(
+            self.capture_mode, self.slot.display, self.slot.monitor, self.recordings_dir,
+            live_chunks_dir=self.live_transcriber.chunks_dir if self.live_transcriber else None,
+            chunk_seconds=LIVE_CHUNK_SECONDS
         )
+        print(f"Capture mode: {self.capture_mode}")
         
         try:
             with open(log_file, "wb") as f:
                 self.record_process = subprocess.Popen(
                     cmd,
-                    shell=True,
                     stdin=subprocess.PIPE,
                     stdout=f,
                     stderr=subprocess.STDOUT,
                     preexec_fn=os.setsid
                 )
             
+            if self.live_transcriber:
+                self.live_transcriber.start()
+            
             # Create recording flag file
             with open(os.path.join(self.recordings_dir, "recording_active.flag"), "w") as f:
                 f.write("1")
@@ -240,28 +330,15 @@ class MeetRecorder:
             return False
     
     def _verify_recording(self):
-        """Verify the recording file is valid"""
-        output_file = os.path.join(self.recordings_dir, "output.mp4")
-        if not os.path.exists(output_file):
-            return False
-            
-        try:
-            result = subprocess.run(
-                ["ffmpeg", "-v", "error", "-i", output_file, "-f", "null", "-"],
-                stderr=subprocess.PIPE,
-                timeout=30
-            )
-            return result.returncode == 0 and not result.stderr
-        except Exception as e:
-            print(f"Verification failed: {e}")
-            return False
+        """Verify the recorded files are complete containers, without decoding them"""
+        return all(
+            verify_media(path, required_streams)
+            for path, required_streams in expected_outputs(self.capture_mode, self.recordings_dir)
+        )
     
     async def _join_meeting(self):
         """Join the Google Meet session"""
         try:
-            self.driver.get(self.meet_link)
-            sleep(5)
-            
             # Grant permissions
             self.driver.execute_cdp_cmd(
                 "Browser.grantPermissions",
@@ -277,91 +354,110 @@ class MeetRecorder:
                 },
             )
             
-            self._take_screenshot("initial_page.png")
-            
-            # Try to dismiss any popups
-            try:
-                self.driver.find_element(
-                    By.XPATH,
-                    "//button[contains(., 'Dismiss') or contains(., 'Got it')]"
-                ).click()
-                sleep(2)
-            except:
-                pass
-
-            try:
-                mic_popup_cancel = self.driver.find_elements(
-                    By.CSS_SELECTOR, 
-                    "[data-mdc-dialog-action='cancel']"
+            with self.timer.step("page_load"):
+                self.driver.get(self.meet_link)
+                join_button = wait_quietly(
+                    self.driver, visible_element(By.XPATH, JOIN_BUTTON_XPATH), STEP_TIMEOUT_SECONDS
                 )
-                for button in mic_popup_cancel:
-                    if button.is_displayed():
-                        button.click()
-                        sleep(1)
-                        break
-            except:
-                pass
             
-            # Disable microphone
-            try:
-                mic_buttons = self.driver.find_elements(
-                    By.CSS_SELECTOR, 
-                    "[aria-label*='microphone'], [aria-label*='mic'], [data-is-muted]"
-                )
-                for button in mic_buttons:
-                    if button.is_displayed():
-                        button.click()
-                        sleep(1)
-                        break
-            except Exception as e:
-                print(f"Couldn't disable microphone: {e}")
-            
-            self._take_screenshot("after_mic_disable.png")
+            self._take_screenshot("initial_page")
             
-            # Enter name if required
-            try:
-                name_field = self.driver.find_element(By.CSS_SELECTOR, "input[type='text']")
-                name_field.send_keys("Meet Recorder")
-                sleep(1)
-            except:
-                pass
+            with self.timer.step("prejoin_setup"):
+                # Try to dismiss any popups
+                for selector in (
+                    (By.XPATH, "//button[contains(., 'Dismiss') or contains(., 'Got it')]"),
+                    (By.CSS_SELECTOR, "[data-mdc-dialog-action='cancel']"),
+                ):
+                    popup_button = visible_element(*selector)(self.driver)
+                    if popup_button:
+                        popup_button.click()
+                        wait_quietly(self.driver, EC.invisibility_of_element(popup_button))
                 
-            # Try to join meeting
-            max_attempts = 5
-            for attempt in range(max_attempts):
+                # Disable microphone
                 try:
-                    join_buttons = self.driver.find_elements(
-                        By.XPATH,
-                        "//button[contains(., 'Join') or contains(., 'Ask to join')]"
-                    )
-                    for button in join_buttons:
-                        if button.is_displayed():
-                            button.click()
-                            sleep(5)
-                            self._take_screenshot(f"join_attempt_{attempt}.png")
-                            return True
-                except:
-                    pass
+                    mic_button = visible_element(
+                        By.CSS_SELECTOR,
+                        "[aria-label*='microphone'], [aria-label*='mic'], [data-is-muted]"
+                    )(self.driver)
+                    if mic_button:
+                        mic_button.click()
+                        wait_quietly(self.driver, lambda d: mic_button.get_attribute("data-is-muted") == "true")
+                except Exception as e:
+                    print(f"Couldn't disable microphone: {e}")
+                
+                self._take_screenshot("after_mic_disable")
                 
-                sleep(5)
+                # Enter name if required
+                name_field = visible_element(By.CSS_SELECTOR, "input[type='text']")(self.driver)
+                if name_field:
+                    name_field.send_keys("Meet Recorder")
             
             # If we couldn't find join button, assume we're already in
+            if not join_button:
+                print("No join button found, assuming already in the meeting")
+                return True
+            
+            with self.timer.step("join_click"):
+                join_button = wait_for(
+                    self.driver, visible_element(By.XPATH, JOIN_BUTTON_XPATH), description="join button"
+                )
+                join_button.click()
+            
+            def or_stopped(condition):
+                return lambda driver: STOPPED if self._stopping.is_set() else condition(driver)
+            
+            # Either in the call straight away, or waiting in the lobby until a host decides;
+            # the long wait only applies once the lobby has actually been recognised
+            with self.timer.step("admission"):
+                state = wait_quietly(self.driver, or_stopped(lobby_state), STEP_TIMEOUT_SECONDS)
+                if state == WAITING:
+                    print("Waiting in the lobby to be admitted")
+                    state = wait_for(
+                        self.driver, or_stopped(admission_decided), LOBBY_TIMEOUT_SECONDS,
+                        description="admission to the call"
+                    )
+            
+            self._take_screenshot("joined")
+            if state is None:
+                print("Could not tell whether the bot was admitted, continuing")
+            if state == STOPPED:
+                return False
+            if state == DENIED:
+                print("Request to join the meeting was denied")
+                self.screenshots.dump_failure(self.driver, "join_denied")
+                return False
             return True
         except Exception as e:
             print(f"Meeting join failed: {e}")
-            self._take_screenshot("join_error.png")
+            self.screenshots.dump_failure(self.driver, "join_error")
             return False
     
     async def record(self):
         """Main recording workflow"""
         print(f"Starting recording for meeting {self.meet_id}")
+        try:
+            return await self._record()
+        finally:
+            self._release_media()
+
+    async def _record(self):
         
         # Setup audio
-        if not self._setup_audio():
+        with self.timer.step("media_setup"):
+            media_ready = self._setup_audio()
+        if not media_ready:
+            return False
+        self._emit("media_ready", display=self.slot.display)
+        if self._stop_requested():
             return False
             
         # Initialize browser
-        if not self._init_browser():
+        with self.timer.step("browser_start"):
+            browser_ready = self._init_browser()
+        if not browser_ready:
+            return False
+        self._emit("browser_ready")
+        if self._stop_requested():
             return False
             
         # Google sign in
@@ -372,11 +468,19 @@ class MeetRecorder:
             if not await self._google_sign_in(email, password):
                 print("Failed to sign in to Google account")
                 return False
+            self._emit("signed_in")
+            if self._stop_requested():
+                return False
         
         # Join meeting
         if not await self._join_meeting():
+            if self._stop_requested():
+                return False
             print("Failed to join meeting")
             return False
+        self._emit("joined")
+        if self._stop_requested():
+            return False
             
         # Start recording
         if not self._start_recording():
@@ -384,29 +488,50 @@ class MeetRecorder:
             return False
             
         print("Recording started successfully")
+        self._emit("recording_started", capture_mode=self.capture_mode)
         
-        # Monitor meeting status
+        # Wait for the meeting to end. The detector reacts to the end screen,
+        # navigation and prolonged silence as they happen; full polling is only a fallback.
+        detector = MeetingEndDetector(self.driver, self.slot.monitor)
+        self._detector = detector
         try:
-            check_interval = 30  # seconds
             max_wait_minutes = int(os.getenv("MAX_WAITING_TIME_IN_MINUTES", 60))
             end_time = time.time() + (max_wait_minutes * 60)
             
-            while time.time() < end_time and self._is_meeting_active():
-                print(f"Meeting active, next check in {check_interval} seconds")
-                sleep(check_interval)
+            detector.start()
+            # A stop that arrived while the recording was starting
+            if self._stopping.is_set():
+                detector.request_end(self._stop_reason)
+            with tracing.span("meeting", capture_mode=self.capture_mode):
+                reason = detector.wait_for_end(end_time, self._is_meeting_active)
+            self.end_reason = reason
+            print(f"Meeting finished ({reason})")
+            self._emit("meeting_ended", reason=reason)
         except KeyboardInterrupt:
             print("Received keyboard interrupt, stopping...")
         except Exception as e:
             print(f"Monitoring error: {e}")
+            self.screenshots.dump_failure(self.driver, "monitoring_error")
         finally:
+            detector.stop()
             print("Stopping recording...")
-            self._stop_recording()
+            with tracing.span("stop_recording"):
+                self._stop_recording()
+            self._emit("recording_stopped")
+            
+            # Only the last chunk is left to transcribe at this point
+            if self.live_transcriber:
+                with tracing.span("live_transcription_finish"):
+                    self.live_transcriber.finish()
             
             # Verify recording
-            if self._verify_recording():
+            with tracing.span("verify_recording"):
+                verified = self._verify_recording()
+            if verified:
                 print("Recording completed successfully")
             else:
                 print("Recording verification failed - file may be corrupted")
+            self._emit("verified", ok=verified)
             
             # Close browser
             try:
@@ -418,19 +543,29 @@ class MeetRecorder:
         return True
 
 
-async def main(meet_link, meet_id):
-    recorder = MeetRecorder(meet_link, meet_id)
-    await recorder.record()
+async def run_recorder(recorder):
+    """Record a meeting, continuing the server's trace for the job when it handed one down"""
+    tracer = Tracer.from_env()
+    if tracer:
+        tracing.activate(tracer)
+
+    with tracing.span("recorder", pid=os.getpid()):
+        return await recorder.record()
+
+
+async def main(meet_link, meet_id, capture_mode=DEFAULT_CAPTURE_MODE):
+    return await run_recorder(MeetRecorder(meet_link, meet_id, capture_mode))
 
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
-        print("Usage: python recorder.py <meet_link> <meet_id>")
+        print("Usage: python recorder.py <meet_link> <meet_id> [video|audio|audio_lowres]")
         sys.exit(1)
         
     meet_link = sys.argv[1]
     meet_id = sys.argv[2]
+    capture_mode = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_CAPTURE_MODE
     
     click.echo("Starting Google Meet recorder...")
-    asyncio.run(main(meet_link, meet_id))
+    asyncio.run(main(meet_link, meet_id, capture_mode))
     click.echo("Recording session completed.")
\ No newline at end of file
@@ -0,0 +1,193 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+# Buckets sized for steps that take from under a second (join steps) to an hour (recordings)
+DEFAULT_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + list(extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metric:
+    """Base for metrics rendered in the Prometheus text format"""
+
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value, None) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, value, extra in self.samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key, extra)} {value}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value set directly, or read from a callback each time metrics are scraped
+
+    The callback returns a number, or for labelled gauges a dict of label-value
+    tuples to numbers.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), collect=None):
+        super().__init__(name, help_text, labelnames)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if not self.collect:
+            return super().samples()
+        try:
+            values = self.collect()
+        except Exception as e:
+            print(f"Failed to collect {self.name}: {e}")
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [(self.name, key, value, None) for key, value in values.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            counts = [c + (1 if value <= bound else 0) for c, bound in zip(counts, self.buckets)]
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block took, whether or not it raised"""
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started_at, **labels)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    samples.append((f"{self.name}_bucket", key, bucket_count, [("le", bound)]))
+                samples.append((f"{self.name}_bucket", key, count, [("le", "+Inf")]))
+                samples.append((f"{self.name}_sum", key, round(total, 6), None))
+                samples.append((f"{self.name}_count", key, count, None))
+        return samples
+
+
+REGISTRY = []
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format"""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+def _read_proc_stat(pid):
+    """(name, parent pid, cpu seconds, rss bytes) for a process, from /proc"""
+    with open(f"/proc/{pid}/stat") as f:
+        stat = f.read()
+    # The name is in parentheses and may itself contain spaces
+    name = stat[stat.index("(") + 1:stat.rindex(")")]
+    fields = stat[stat.rindex(")") + 2:].split()
+    ppid = int(fields[1])
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    rss_bytes = int(fields[21]) * PAGE_SIZE
+    return name, ppid, cpu_seconds, rss_bytes
+
+
+def child_process_usage(root_pid=None, include_root=False):
+    """CPU seconds and RSS of every descendant of this process, summed by process name
+
+    Chrome, ffmpeg and Xvfb are grandchildren of the server (started by the
+    recorder or by the browser pool), so the whole tree under root_pid is walked.
+    With include_root, root_pid itself is counted too.
+    """
+    root_pid = root_pid or os.getpid()
+    processes = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            processes[int(entry)] = _read_proc_stat(entry)
+        except (OSError, ValueError, IndexError):
+            continue
+
+    children = {}
+    for pid, (_, ppid, _, _) in processes.items():
+        children.setdefault(ppid, []).append(pid)
+
+    usage = {}
+    pending = list(children.get(root_pid, []))
+    if include_root and root_pid in processes:
+        pending.append(root_pid)
+    while pending:
+        pid = pending.pop()
+        name, _, cpu_seconds, rss_bytes = processes[pid]
+        cpu_total, rss_total = usage.get(name, (0.0, 0))
+        usage[name] = (cpu_total + cpu_seconds, rss_total + rss_bytes)
+        pending.extend(children.get(pid, []))
+    return usage
+
+
+# Pipeline and recording timings
+STAGE_SECONDS = Histogram(
+    "metamate_stage_duration_seconds", "Duration of recording and post-recording pipeline stages", ["stage"]
+)
+JOIN_STEP_SECONDS = Histogram(
+    "metamate_join_step_duration_seconds", "Duration of each sign-in and meeting join step", ["step"]
+)
+OPERATION_SECONDS = Histogram(
+    "metamate_operation_duration_seconds", "Duration of transcription and LLM calls that missed the cache", ["operation"]
+)
+
+# Failures and retries
+STAGE_FAILURES = Counter("metamate_stage_failures_total", "Recording and pipeline stages that raised", ["stage"])
+JOB_RETRIES = Counter("metamate_job_retries_total", "Jobs put back on the queue", ["reason"])
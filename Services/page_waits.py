@@ -0,0 +1,124 @@
+import os
+import json
+import time
+from contextlib import contextmanager
+
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+from tracing import span
+
+# Longest any single sign-in or join step may take before it counts as failed
+STEP_TIMEOUT_SECONDS = int(os.getenv("JOIN_STEP_TIMEOUT_SECONDS", 20))
+# Longest the bot waits in the lobby for a host to admit it
+LOBBY_TIMEOUT_SECONDS = int(os.getenv("LOBBY_TIMEOUT_SECONDS", 600))
+POLL_FREQUENCY = 0.25
+
+STEP_TIMINGS_FILE = "join_timings.json"
+
+JOIN_BUTTON_XPATH = "//button[contains(., 'Join') or contains(., 'Ask to join')]"
+LEAVE_BUTTON_SELECTOR = "[aria-label*='Leave call']"
+
+# Lobby text Meet shows while waiting to be admitted, and once the request is refused
+WAITING_PHRASES = ["asking to be let in", "you'll join the call when someone lets you in"]
+DENIED_PHRASES = [
+    "you can't join this call",
+    "denied your request",
+    "no one responded to your request",
+]
+
+IN_CALL = "in_call"
+WAITING = "waiting"
+DENIED = "denied"
+
+
+def visible_element(by, selector):
+    """Condition: the first displayed element matching the selector"""
+    def condition(driver):
+        for element in driver.find_elements(by, selector):
+            try:
+                if element.is_displayed():
+                    return element
+            except StaleElementReferenceException:
+                continue
+        return False
+    return condition
+
+
+def lobby_state(driver):
+    """Where the bot is in the join flow: in the call, waiting in the lobby, denied, or unknown (None)
+
+    The leave button and lobby phrases only match Meet's English UI, so the
+    join button having gone without a waiting message also counts as in the call.
+    """
+    if visible_element(By.CSS_SELECTOR, LEAVE_BUTTON_SELECTOR)(driver):
+        return IN_CALL
+
+    text = driver.find_element(By.TAG_NAME, "body").text.lower()
+    if any(phrase in text for phrase in DENIED_PHRASES):
+        return DENIED
+    if any(phrase in text for phrase in WAITING_PHRASES):
+        return WAITING
+    if not visible_element(By.XPATH, JOIN_BUTTON_XPATH)(driver):
+        return IN_CALL
+    return None
+
+
+def admission_decided(driver):
+    """Condition: the host has let the bot in, or refused it"""
+    state = lobby_state(driver)
+    return state if state in (IN_CALL, DENIED) else False
+
+
+def wait_for(driver, condition, timeout=STEP_TIMEOUT_SECONDS, description="condition"):
+    """Poll a condition until it returns something truthy; raises TimeoutException"""
+    wait = WebDriverWait(
+        driver, timeout, poll_frequency=POLL_FREQUENCY,
+        ignored_exceptions=(StaleElementReferenceException,)
+    )
+    return wait.until(condition, f"Timed out after {timeout}s waiting for {description}")
+
+
+def wait_quietly(driver, condition, timeout=3):
+    """Like wait_for, but a timeout just returns None"""
+    try:
+        return wait_for(driver, condition, timeout)
+    except (TimeoutException, WebDriverException):
+        return None
+
+
+class StepTimer:
+    """Times each named step of joining a meeting and writes the results to a JSON file
+
+    on_step, if given, is called with each finished step as it is recorded.
+    """
+
+    def __init__(self, path, on_step=None):
+        self.path = path
+        self.on_step = on_step
+        self.steps = []
+
+    @contextmanager
+    def step(self, name):
+        started_at = time.monotonic()
+        status = "failed"
+        try:
+            with span(f"join.{name}"):
+                yield
+            status = "ok"
+        finally:
+            duration = round(time.monotonic() - started_at, 3)
+            entry = {"step": name, "status": status, "seconds": duration}
+            self.steps.append(entry)
+            print(f"Step '{name}' {status} in {duration}s")
+            self._save()
+            if self.on_step:
+                self.on_step(entry)
+
+    def _save(self):
+        try:
+            with open(self.path, "w") as f:
+                json.dump({"steps": self.steps}, f, indent=2)
+        except OSError as e:
+            print(f"Failed to write step timings: {e}")
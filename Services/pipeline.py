@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import tempfile
+import subprocess
+
+from audio_processor import default_cache, summarize_transcript, transcribe_recording
+from live_transcriber import LIVE_STATE_FILE, load_live_transcript
+from media import extract_audio, find_transcription_audio, find_video
+from metrics import STAGE_FAILURES, STAGE_SECONDS
+from tracing import span
+
+# Post-recording stages, in order. Each persists its output under
+# storage/<recording_id>/ and is recorded in manifest.json once it completes.
+# Results the backend could not take yet leave the deliver stage "queued"
+# until the outbox reports whether they were delivered.
+STAGES = ("audio", "transcribe", "summarize", "deliver")
+
+MANIFEST_FILE = "manifest.json"
+
+
+def reset_pipeline(recording_id, storage_root="storage"):
+    """Forget completed stages, e.g. before the same meeting is recorded again"""
+    stale_files = (
+        os.path.join(storage_root, recording_id, MANIFEST_FILE),
+        os.path.join(storage_root, recording_id, "recordings", "transcripts", LIVE_STATE_FILE),
+    )
+    for path in stale_files:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def load_manifest(recording_id, storage_root="storage"):
+    """A recording's pipeline manifest, or None if no stage has run yet"""
+    path = os.path.join(storage_root, recording_id, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+class StageError(Exception):
+    """A pipeline stage could not produce its output"""
+
+
+class Pipeline:
+    """Resumable post-recording pipeline for one meeting
+
+    is_queued, if given, tells whether an outbox entry is still waiting to be
+    delivered, so a resumed run does not send queued results a second time.
+    """
+
+    def __init__(self, recording_id, task_id, username, deliver, on_stage=None, storage_root="storage",
+                 is_queued=None):
+        self.recording_id = recording_id
+        self.task_id = task_id
+        self.username = username
+        self.deliver = deliver
+        self.on_stage = on_stage
+        self.is_queued = is_queued
+
+        self.base_dir = os.path.join(storage_root, recording_id)
+        self.recordings_dir = os.path.join(self.base_dir, "recordings")
+        self.transcripts_dir = os.path.join(self.recordings_dir, "transcripts")
+        self.manifest_path = os.path.join(self.base_dir, MANIFEST_FILE)
+
+        os.makedirs(self.transcripts_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+        self._cache = None
+
+    def _load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        return {
+            "recording_id": self.recording_id,
+            "task_id": self.task_id,
+            "username": self.username,
+            "stages": {},
+        }
+
+    def _save_manifest(self):
+        # Write then rename, so a crash never leaves a truncated manifest
+        fd, tmp_path = tempfile.mkstemp(dir=self.base_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _update_stage(self, stage, **fields):
+        entry = self.manifest["stages"].setdefault(stage, {})
+        entry.update(fields)
+        self._save_manifest()
+
+    def _is_complete(self, stage):
+        """A stage counts as done only if its output files are still on disk"""
+        entry = self.manifest["stages"].get(stage)
+        if not entry or entry.get("status") != "done":
+            return False
+        return all(os.path.exists(path) for path in entry.get("files", []))
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            self._cache = default_cache()
+        return self._cache
+
+    def completed_stages(self):
+        return [stage for stage in STAGES if self._is_complete(stage)]
+
+    def has_recording(self):
+        """Whether there is recorded media for the audio stage to work from"""
+        return self._is_complete("audio") or bool(
+            find_transcription_audio(self.recordings_dir) or find_video(self.recordings_dir)
+        )
+
+    def delivery_pending(self):
+        """Whether the results are waiting in the outbox"""
+        return self.manifest["stages"].get("deliver", {}).get("status") == "queued"
+
+    def settle_delivery(self, outbox_id, delivered, error=None):
+        """Finish a queued deliver stage once the outbox has settled its entry
+
+        Returns False if the stage is no longer waiting on that entry, e.g.
+        because the recording was processed again in the meantime.
+        """
+        entry = self.manifest["stages"].get("deliver", {})
+        if entry.get("status") != "queued" or entry.get("outbox_id") != outbox_id:
+            return False
+        self._update_stage("deliver", status="done" if delivered else "failed",
+                           finished_at=time.time(), error=error)
+        return True
+
+    def run(self):
+        """Run every stage that has not completed yet, in order"""
+        for stage in STAGES:
+            if self._is_complete(stage):
+                print(f"[{self.recording_id}] Stage '{stage}' already complete, skipping")
+                continue
+
+            if self.on_stage:
+                self.on_stage(stage)
+
+            print(f"[{self.recording_id}] Running stage '{stage}'")
+            started_at = time.time()
+            self._update_stage(stage, status="running", started_at=started_at, error=None)
+            try:
+                with span(f"stage.{stage}"):
+                    output = getattr(self, f"_run_{stage}")()
+            except Exception as e:
+                STAGE_FAILURES.inc(stage=stage)
+                self._update_stage(stage, status="failed", finished_at=time.time(), error=str(e))
+                raise
+
+            STAGE_SECONDS.observe(time.time() - started_at, stage=stage)
+
+            self._update_stage(
+                stage,
+                status=output.pop("status", "done"),
+                finished_at=time.time(),
+                duration=round(time.time() - started_at, 3),
+                **output
+            )
+
+        return self.results()
+
+    def results(self):
+        return {
+            "raw_transcript": self._read("raw_transcript.txt"),
+            "adjusted_transcript": self._read("adjusted_transcript.txt"),
+            "meeting_minutes_and_tasks": self._read("meeting_minutes_and_tasks.txt"),
+        }
+
+    def _read(self, name):
+        with open(os.path.join(self.transcripts_dir, name)) as f:
+            return f.read()
+
+    def _write(self, name, text):
+        path = os.path.join(self.transcripts_dir, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def _run_audio(self):
+        # The recorder writes transcription-ready audio during the meeting; only
+        # recordings without that sidecar need a separate extraction pass
+        audio_path = find_transcription_audio(self.recordings_dir)
+        if audio_path:
+            print(f"Using audio captured during recording: {audio_path}")
+            return {"files": [audio_path]}
+
+        video_path = find_video(self.recordings_dir)
+        if not video_path:
+            raise StageError(f"No recording found in {self.recordings_dir}")
+
+        audio_path = os.path.join(self.recordings_dir, "audio.mp3")
+        print(f"Converting video to audio: {video_path} -> {audio_path}")
+        try:
+            extract_audio(video_path, audio_path)
+        except subprocess.CalledProcessError as e:
+            print(f"ffmpeg stderr: {e.stderr}")
+            raise StageError("Audio conversion failed") from e
+        return {"files": [audio_path]}
+
+    def _run_transcribe(self):
+        # Use the transcript built while the meeting was running, if it is complete
+        raw_transcript = load_live_transcript(self.recordings_dir)
+        if raw_transcript is not None:
+            print(f"Using live transcript ({len(raw_transcript)} characters), skipping transcription.")
+        else:
+            audio_path = self.manifest["stages"]["audio"]["files"][0]
+            raw_transcript = transcribe_recording(audio_path, cache=self.cache)
+        return {"files": [self._write("raw_transcript.txt", raw_transcript)]}
+
+    def _run_summarize(self):
+        adjusted_transcript, meeting_minutes_and_tasks = summarize_transcript(
+            self._read("raw_transcript.txt"), cache=self.cache
+        )
+        return {"files": [
+            self._write("adjusted_transcript.txt", adjusted_transcript),
+            self._write("meeting_minutes_and_tasks.txt", meeting_minutes_and_tasks),
+        ]}
+
+    def _run_deliver(self):
+        outbox_id = self.manifest["stages"]["deliver"].get("outbox_id")
+        if outbox_id and self.is_queued and self.is_queued(outbox_id):
+            print(f"[{self.recording_id}] Results are still queued for delivery, not sending again")
+            return {"status": "queued", "files": []}
+
+        api_response = self.deliver(
+            results=self.results(),
+            username=self.username,
+            task_id=self.task_id,
+            recording_id=self.recording_id
+        )
+        if api_response.get("queued"):
+            # Persisted in the outbox, which keeps retrying in the background;
+            # the stage is finished when the outbox settles the entry
+            print(f"[{self.recording_id}] Backend unavailable, results queued for delivery")
+            return {"status": "queued", "files": [], "outbox_id": api_response["outbox_id"],
+                    "api_response": api_response}
+        if not api_response.get("success"):
+            raise StageError(f"Failed to deliver results to API: {api_response}")
+        return {"files": [], "outbox_id": None, "api_response": api_response}
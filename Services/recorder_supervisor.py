@@ -0,0 +1,267 @@
+import os
+import sys
+import json
+import asyncio
+import itertools
+
+# Recorder processes kept started, with their imports done, waiting for the next job
+RECORDER_SPARES = int(os.getenv("RECORDER_SPARES", 1))
+WORKER_READY_TIMEOUT_SECONDS = int(os.getenv("RECORDER_READY_TIMEOUT_SECONDS", 120))
+# Longest wait for a running recorder to answer a status request
+STATUS_TIMEOUT_SECONDS = 5
+# Buffer limit for a single line read from a worker's pipes
+STREAM_LIMIT = 1024 * 1024
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recorder_worker.py")
+
+
+class RecorderWorker:
+    """One recorder process (recorder_worker.py) and its JSON-lines control channel
+
+    Each worker records a single meeting and then exits, so nothing a
+    recording changed (environment, media slot, driver state) leaks into the
+    next one.
+    """
+
+    def __init__(self, process):
+        self.process = process
+        self.pid = process.pid
+        self.job_id = None
+        self.on_line = None
+        self.on_event = None
+        self.events = []
+
+        loop = asyncio.get_running_loop()
+        self._ready = loop.create_future()
+        # Nobody may be waiting when a spare dies before it is ready
+        self._ready.add_done_callback(lambda future: future.cancelled() or future.exception())
+        self._result = loop.create_future()
+        self._status_requests = {}
+        self._request_ids = itertools.count(1)
+        self._readers = [
+            asyncio.create_task(self._read_channel()),
+            asyncio.create_task(self._read_stderr()),
+        ]
+
+    @classmethod
+    async def spawn(cls):
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, WORKER_SCRIPT,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            env=dict(os.environ, PYTHONUNBUFFERED="1"), limit=STREAM_LIMIT,
+        )
+        return cls(process)
+
+    @property
+    def phase(self):
+        """Last milestone the recorder reported (media_ready, joined, recording_started, ...)"""
+        for event in reversed(self.events):
+            if event["event"] != "step":
+                return event["event"]
+        return None
+
+    def is_alive(self):
+        return self.process.returncode is None and not self._result.done()
+
+    async def wait_ready(self, timeout=WORKER_READY_TIMEOUT_SECONDS):
+        await asyncio.wait_for(asyncio.shield(self._ready), timeout)
+
+    def _send(self, message_type, **fields):
+        self.process.stdin.write((json.dumps(dict(fields, type=message_type)) + "\n").encode("utf-8"))
+
+    def start(self, job_id, meeting_link, capture_mode, env, on_line=None, on_event=None):
+        """Hand the worker its meeting; env is added to the worker's environment"""
+        self.job_id = job_id
+        self.on_line = on_line
+        self.on_event = on_event
+        self._send("start", job_id=job_id, meeting_link=meeting_link, capture_mode=capture_mode, env=env)
+
+    def stop(self, reason="stop requested"):
+        """Ask the recorder to wrap up; a meeting already being recorded is kept and processed"""
+        self._send("stop", reason=reason)
+
+    async def status(self, timeout=STATUS_TIMEOUT_SECONDS):
+        """Live snapshot from the recorder itself (phase, join steps, display, ...)"""
+        request_id = next(self._request_ids)
+        reply = asyncio.get_running_loop().create_future()
+        self._status_requests[request_id] = reply
+        try:
+            self._send("status", request_id=request_id)
+            return await asyncio.wait_for(reply, timeout)
+        finally:
+            self._status_requests.pop(request_id, None)
+
+    async def wait(self):
+        """The recorder's result: {"ok": ..., "phase": ..., "reason" or "error": ...}"""
+        return await asyncio.shield(self._result)
+
+    async def close(self, grace=0, timeout=10):
+        """Let the worker exit on its own for up to grace seconds, then terminate it"""
+        if self.process.returncode is None and grace:
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), grace)
+            except asyncio.TimeoutError:
+                pass
+        if self.process.returncode is None:
+            self.process.terminate()
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+        await asyncio.gather(*self._readers, return_exceptions=True)
+
+    def _log(self, label, line):
+        if self.on_line:
+            self.on_line(label, line)
+        else:
+            print(f"[recorder worker {self.pid}] {label}: {line}")
+
+    def _dispatch(self, message):
+        message_type = message.pop("type", None)
+        if message_type == "log":
+            self._log(message["stream"], message["line"])
+        elif message_type == "event":
+            self.events.append(message)
+            if self.on_event:
+                try:
+                    self.on_event(message)
+                except Exception as e:
+                    print(f"Recorder event handler failed: {e}")
+        elif message_type == "status":
+            reply = self._status_requests.get(message.pop("request_id", None))
+            if reply and not reply.done():
+                reply.set_result(message)
+        elif message_type == "ready":
+            if not self._ready.done():
+                self._ready.set_result(message)
+        elif message_type == "done":
+            if not self._result.done():
+                self._result.set_result(message)
+
+    async def _read_lines(self, stream):
+        while True:
+            try:
+                raw = await stream.readline()
+            except ValueError:
+                # Longer than STREAM_LIMIT; asyncio has already discarded it
+                raw = b"[line too long, dropped]\n"
+            if not raw:
+                return
+            yield raw.decode("utf-8", errors="replace").rstrip("\n")
+
+    async def _read_channel(self):
+        async for line in self._read_lines(self.process.stdout):
+            try:
+                self._dispatch(json.loads(line))
+            except (ValueError, KeyError, AttributeError):
+                self._log("STDOUT", line)
+
+        # The channel closes when the worker exits, whether or not it reported a result
+        returncode = await self.process.wait()
+        error = f"Recorder worker exited with code {returncode}"
+        if not self._ready.done():
+            self._ready.set_exception(RuntimeError(error))
+        if not self._result.done():
+            self._result.set_result({"ok": False, "phase": self.phase, "error": error})
+
+    async def _read_stderr(self):
+        async for line in self._read_lines(self.process.stderr):
+            self._log("STDERR", line)
+
+
+class RecorderSupervisor:
+    """Runs recordings in pre-started worker processes and keeps spares warm
+
+    Starting a recorder no longer pays for a fresh interpreter and the
+    selenium/undetected_chromedriver imports: a spare that has already done
+    that is handed the job. The server gets progress as structured events and
+    can stop a recording or ask for its status over the control channel.
+    """
+
+    def __init__(self, spares=RECORDER_SPARES):
+        self.spares = spares
+        self.active = {}
+        self._idle = []
+        self._warming = set()
+
+    def start(self):
+        """Warm the spares; must be called from the running event loop"""
+        self._replenish()
+        print(f"Recorder supervisor started with {self.spares} spare worker(s)")
+
+    def idle_count(self):
+        return len(self._idle)
+
+    def _replenish(self):
+        missing = self.spares - len(self._idle) - len(self._warming)
+        for _ in range(max(0, missing)):
+            task = asyncio.create_task(self._warm_one())
+            self._warming.add(task)
+            task.add_done_callback(self._warming.discard)
+
+    async def _warm_one(self):
+        worker = None
+        try:
+            worker = await RecorderWorker.spawn()
+            await worker.wait_ready()
+            self._idle.append(worker)
+            print(f"Recorder worker {worker.pid} ready")
+        except Exception as e:
+            print(f"Failed to start recorder worker: {e}")
+            if worker:
+                await worker.close()
+
+    async def _take(self):
+        """A ready worker: a warm spare if there is one, otherwise a freshly started one"""
+        while self._idle:
+            worker = self._idle.pop(0)
+            if worker.is_alive():
+                return worker
+            await worker.close()
+
+        print("No warm recorder worker, starting one")
+        worker = await RecorderWorker.spawn()
+        try:
+            await worker.wait_ready()
+        except BaseException:
+            await worker.close()
+            raise
+        return worker
+
+    async def record(self, job_id, meeting_link, capture_mode, env, on_line=None, on_event=None):
+        """Record a meeting in a worker process and return its result"""
+        worker = await self._take()
+        self._replenish()
+        self.active[job_id] = worker
+        try:
+            print(f"Recording {job_id} in worker {worker.pid}")
+            worker.start(job_id, meeting_link, capture_mode, env, on_line=on_line, on_event=on_event)
+            return await worker.wait()
+        finally:
+            self.active.pop(job_id, None)
+            await worker.close(grace=10)
+
+    def stop(self, job_id, reason="stop requested"):
+        """Ask a running recording to stop; False if it is not running here"""
+        worker = self.active.get(job_id)
+        if not worker or not worker.is_alive():
+            return False
+        worker.stop(reason)
+        return True
+
+    async def status(self, job_id):
+        """The recorder's own view of a running job, or None if it is not running here"""
+        worker = self.active.get(job_id)
+        if not worker:
+            return None
+        try:
+            return await worker.status()
+        except asyncio.TimeoutError:
+            return {"job_id": job_id, "phase": worker.phase, "responding": False}
+
+    async def close(self):
+        for worker in self._idle:
+            await worker.close()
+        self._idle = []
@@ -0,0 +1,101 @@
+# Recorder process kept warm by the server's RecorderSupervisor.
+#
+# It imports the recorder (selenium, undetected_chromedriver, ...) as soon as it
+# starts, reports ready and then waits for a single job. It talks to the
+# supervisor in JSON lines: commands arrive on stdin, and its own stdout carries
+# events, status replies and the lines it prints. Output that child processes
+# write straight to the file descriptors goes to stderr, which is logged too.
+# Nothing runs on import: processes it spawns may import it again as their main module.
+import os
+import sys
+import json
+import asyncio
+import threading
+
+_channel = None
+_channel_lock = threading.Lock()
+
+
+def open_channel():
+    """Keep the real stdout for the control channel, and send fd 1 to stderr"""
+    global _channel
+    _channel = os.fdopen(os.dup(1), "w", buffering=1)
+    os.dup2(2, 1)
+
+
+def send(message_type, **fields):
+    line = json.dumps(dict(fields, type=message_type), default=str)
+    with _channel_lock:
+        _channel.write(line + "\n")
+        _channel.flush()
+
+
+class ChannelWriter:
+    """sys.stdout replacement that sends each printed line over the control channel"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._buffer = ""
+
+    def write(self, text):
+        self._buffer += text
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            send("log", stream=self.stream, line=line)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def read_command():
+    line = sys.stdin.readline()
+    return json.loads(line) if line else None
+
+
+def listen(recorder):
+    """Answer stop and status commands while the recording runs"""
+    while True:
+        command = read_command()
+        if command is None:
+            # The supervisor went away; do not keep recording for nobody
+            recorder.request_stop("supervisor exited")
+            return
+        if command["type"] == "stop":
+            recorder.request_stop(command.get("reason", "stop requested"))
+        elif command["type"] == "status":
+            send("status", request_id=command.get("request_id"), **recorder.status())
+
+
+def main():
+    # Before anything can write to stdout
+    open_channel()
+    sys.stdout = ChannelWriter("STDOUT")
+
+    import metamate
+
+    send("ready", pid=os.getpid())
+    command = read_command()
+    if not command or command["type"] != "start":
+        return
+
+    os.environ.update(command["env"])
+    recorder = metamate.MeetRecorder(
+        command["meeting_link"], command["job_id"], command["capture_mode"],
+        on_event=lambda event: send("event", **event)
+    )
+
+    listener = threading.Thread(target=listen, args=(recorder,), name="control-channel")
+    listener.daemon = True
+    listener.start()
+
+    try:
+        ok = asyncio.run(metamate.run_recorder(recorder))
+        send("done", ok=bool(ok), phase=recorder.phase, reason=recorder.end_reason)
+    except BaseException as e:
+        send("done", ok=False, phase=recorder.phase, error=f"{type(e).__name__}: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+# Starts the Services server.
+#
+# server.py builds the job queue, backend client, pools and the rest of the
+# server's state when it is imported. Processes started with the spawn method
+# (the local transcription engine's workers) import the main module again, so
+# the main module is this file, which does nothing outside its main guard.
+import asyncio
+
+if __name__ == "__main__":
+    import server
+
+    asyncio.run(server.main())
@@ -1,323 +1,727 @@
-from flask import Flask, request, jsonify
-import subprocess
+from quart import Quart, request, jsonify
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
+import asyncio
 import os
-import threading
+import sys
 import traceback
 import time
-import datetime
-import requests
-import json
-import schedule
-from audio_processor import process_audio
+import httpx
+import hashlib
+from media import CAPTURE_MODES, DEFAULT_CAPTURE_MODE
+from pipeline import Pipeline, load_manifest, reset_pipeline
+from transcription import close_local_pools
+from log_capture import ProcessLogCapture, tail_file
+from browser_pool import BrowserPool
+from job_index import JobIndex
+from admission import AdmissionController
+from recorder_supervisor import RecorderSupervisor
+from meeting_scheduler import PREWARM_SECONDS, MeetingScheduler
+from claims import CLAIM_TTL_SECONDS, NODE_ID, ClaimKeeper, get_claims
+from backend_client import RETRY_STATUSES, BackendClient, Outbox
+import metrics
+import tracing
+from tracing import Tracer, load_trace
+from metrics import Gauge, JOB_RETRIES, JOIN_STEP_SECONDS, STAGE_FAILURES, STAGE_SECONDS, child_process_usage
+from job_queue import (
+    JobQueue, WorkerPool, new_job_id, ADHOC, SCHEDULED, JOB_STATES, RECORDING, TRANSCODING, TRANSCRIBING, SUMMARIZING,
+    POSTING, DONE, FAILED, POST_RECORDING_STATES, TERMINAL_STATES,
+)
 
-app = Flask(__name__)
+app = Quart(__name__)
+
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", 7000))
+
+# Upload transcripts once and post their digests instead of the full text
+DELIVERY_BY_REFERENCE = os.getenv("DELIVERY_BY_REFERENCE", "0") == "1"
 
 # Minutes before the meeting to start recording
-MINUTES_BEFORE_MEETING = 2
+MINUTES_BEFORE_MEETING = float(os.getenv("MINUTES_BEFORE_MEETING", 2))
+
+# Job state reported while each pipeline stage runs
+PIPELINE_JOB_STATES = {
+    "audio": TRANSCODING,
+    "transcribe": TRANSCRIBING,
+    "summarize": SUMMARIZING,
+    "deliver": POSTING,
+}
 
-def run_recording_process(meeting_link, recording_id, task_id, username):
-    """Run the recording process in a separate thread"""
-    # Set up command 
-    run_cmd = ["python3", "metamate.py", meeting_link, recording_id]
-    print(f"Running command: {' '.join(run_cmd)}")
+# Log captures of recorder processes that are still running, by recording ID
+active_logs = {}
 
-    process = subprocess.Popen(run_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+# Jobs whose meeting is now claimed by another node; their results are dropped
+lost_claims = set()
 
-    # Log output without blocking the response
-    stdout_logs = []
-    stderr_logs = []
+# Durable queue of recordings and the bounded pool of workers that runs them
+job_queue = JobQueue(os.path.join("storage", "jobs.db"))
+backend = BackendClient(os.getenv("SERVER_API"))
+# Results waiting for the backend are resent together through the batch endpoint
+outbox = Outbox(backend, batch_paths={"/update-meeting-info": "/update-meeting-info/batch"})
+claims = get_claims(backend)
+# Stage timings and recorder progress of the jobs running on this node
+job_index = JobIndex()
 
-    while True:
-        stdout_line = process.stdout.readline()
-        stderr_line = process.stderr.readline()
+def set_job_state(job_id, state, error=None):
+    """Record a job's progress in the queue and in the index of running jobs"""
+    job_queue.set_state(job_id, state, error=error)
+    job_index.set_state(job_id, state)
 
-        if stdout_line:
-            stdout_logs.append(stdout_line)
-            print(f"STDOUT: {stdout_line.strip()}")
+async def run_recording_process(meeting_link, recording_id, task_id, username, capture_mode=DEFAULT_CAPTURE_MODE,
+                                reservation=None):
+    """Record a job's meeting in a supervised recorder worker and process the result
 
-        if stderr_line:
-            stderr_logs.append(stderr_line)
-            print(f"STDERR: {stderr_line.strip()}")
+    reservation is the key of a browser warmed for this recording (its claim key).
+    """
+    # A fresh recording invalidates any stages completed for an earlier one
+    reset_pipeline(recording_id)
 
-        if stdout_line == '' and stderr_line == '' and process.poll() is not None:
-            break
+    def on_event(event):
+        # The recorder reports progress over its control channel instead of being scraped from logs
+        job_index.recorder_event(recording_id, event)
+        if event["event"] == "recording_started":
+            set_job_state(recording_id, RECORDING)
+        elif event["event"] == "step":
+            JOIN_STEP_SECONDS.observe(event["seconds"], step=event["step"])
+            if event["status"] != "ok":
+                STAGE_FAILURES.inc(stage=f"join_{event['step']}")
 
-    # Write logs to file for later inspection
+    # Logs are streamed to a rotating file as they arrive instead of being held in memory
     log_path = os.path.join("storage", recording_id, "process.log")
-    with open(log_path, 'w') as f:
-        f.write(''.join(stdout_logs))
-        f.write('\n--- ERRORS ---\n')
-        f.write(''.join(stderr_logs))
+    capture = ProcessLogCapture(log_path, on_line=lambda label, line: print(f"{label}: {line}"))
+    active_logs[recording_id] = capture
 
-    print(f"Recording process for {recording_id} completed with return code: {process.returncode}")
+    # Added to the recorder worker's environment
+    recorder_env = {}
 
-    if process.returncode == 0:
-        process_recorded_meeting(recording_id, task_id, username)
-    else:
-        print(f"Recording failed with return code {process.returncode}")
+    # Hand the recorder an already running, signed-in browser when one is warm
+    browser = await asyncio.to_thread(browser_pool.lease, reservation)
+    if browser:
+        print(f"Leasing warm browser on display {browser.slot.display} to {recording_id}")
+        recorder_env.update(browser.env())
 
-def send_to_api(results, username, task_id, api_url=os.getenv("SERVER_API") + "/update-meeting-info"):
-    """Send the results along with username and task_id to the specified API endpoint"""
+    result = None
+    started_at = time.time()
     try:
-        # Create payload with all required information
-        payload = {
-            "username": username,
-            "task_id": task_id,
-            "raw_transcript": results["raw_transcript"],
-            "adjusted_transcript": results["adjusted_transcript"],
-            "meeting_minutes_and_tasks": results["meeting_minutes_and_tasks"]
-        }
-        
-        print(f"Sending data to API: {api_url}")
-        response = requests.post(api_url, json=payload)
-        
-        if response.status_code == 200:
-            print("Successfully sent data to API")
-            return {"success": True, "response": response.json()}
-        else:
-            print(f"API request failed with status code: {response.status_code}")
-            return {"success": False, "status_code": response.status_code, "response": response.text}
-    
-    except Exception as e:
-        print(f"Error sending data to API: {str(e)}")
-        return {"success": False, "error": str(e)}
+        with tracing.span("recording", capture_mode=capture_mode, warm_browser=browser is not None):
+            # The recorder's own spans nest under this one
+            tracer = tracing.current_tracer()
+            if tracer:
+                recorder_env.update(tracer.env())
 
-def process_recorded_meeting(recording_id, task_id, username):
-    """Convert the video to audio and process it"""
-    storage_dir = os.path.join("storage", recording_id, "recordings")
-    
-    # Find the recorded video file
-    video_files = [f for f in os.listdir(storage_dir) if f.endswith(('.mp4', '.mkv', '.webm'))]
-    
-    if not video_files:
-        print(f"No video files found in {storage_dir}")
-        return
-    
-    video_path = os.path.join(storage_dir, video_files[0])
-    audio_path = os.path.join(storage_dir, "audio.mp3")
-    
-    # Convert video to audio using ffmpeg
-    print(f"Converting video to audio: {video_path} -> {audio_path}")
+            result = await recorder_supervisor.record(
+                recording_id, meeting_link, capture_mode, recorder_env,
+                on_line=capture.write, on_event=on_event,
+            )
+    finally:
+        capture.close()
+        active_logs.pop(recording_id, None)
+        if browser:
+            await asyncio.to_thread(
+                browser_pool.release, browser, healthy=result is not None and result["ok"]
+            )
+
+    print(f"Recorder for {recording_id} finished: {result}")
+    STAGE_SECONDS.observe(time.time() - started_at, stage="recording")
+
+    if recording_id in lost_claims:
+        # The node now holding the claim records and delivers the meeting
+        set_job_state(recording_id, FAILED, error="Claim on the meeting was lost to another node")
+    elif result["ok"]:
+        await process_recorded_meeting(recording_id, task_id, username)
+    else:
+        error = result.get("error") or f"Recorder gave up while {result.get('phase')}"
+        if result.get("reason"):
+            error += f" ({result['reason']})"
+        print(f"Recording failed: {error}")
+        STAGE_FAILURES.inc(stage="recording")
+        set_job_state(recording_id, FAILED, error=error)
+
+async def run_job(job):
+    """Worker entry point: record the meeting, or resume processing an interrupted job"""
+    job_index.begin(job)
+    if job["resume_stage"] not in POST_RECORDING_STATES:
+        # Before anything awaits, so the next worker's admission check already counts it
+        admission.note_started()
+    tracer = Tracer(job["job_id"], job["options"].get("trace_id"))
+    previous = tracing.activate(tracer)
+    # updated_at is when the job was last (re)queued
+    tracer.record("queue_wait", job["updated_at"], time.time())
     try:
-        result = subprocess.run(
-            ["ffmpeg", "-i", video_path, "-q:a", "0", "-map", "a", audio_path],
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        print("Audio conversion completed successfully")
-    except subprocess.CalledProcessError as e:
-        print(f"Error converting video to audio: {e}")
-        print(f"ffmpeg stderr: {e.stderr}")
+        with tracer.span("job", attempt=job["attempts"], source=job["source"], resume_stage=job["resume_stage"]):
+            await _run_job(job)
+    finally:
+        tracing.activate(previous)
+        job_index.finish(job["job_id"])
+        claim_key = job["options"].get("claim_key")
+        if job["job_id"] in lost_claims:
+            # The meeting record belongs to the node holding the claim now
+            lost_claims.discard(job["job_id"])
+            await asyncio.to_thread(browser_pool.unreserve, claim_key)
+        elif claim_key:
+            await finish_claimed_meeting(claim_key)
+
+async def _run_job(job):
+    if job["resume_stage"] in POST_RECORDING_STATES:
+        print(f"Resuming processing for {job['job_id']} (interrupted while {job['resume_stage']})")
+        await process_recorded_meeting(job["job_id"], job["task_id"], job["username"])
         return
-    
-    # Process the audio file
-    print(f"Processing audio file: {audio_path}")
+
+    claim_key = job["options"].get("claim_key")
+    if claim_key:
+        # The claim may have lapsed while the job waited, e.g. across a restart
+        claim = await claims.claim(claim_key, NODE_ID)
+        if not claim and not claim.unknown:
+            lost_claims.add(job["job_id"])
+            error = "Meeting record no longer exists" if claim.gone else "Meeting is claimed by another node"
+            print(f"Not recording {job['job_id']}: {error}")
+            set_job_state(job["job_id"], FAILED, error=error)
+            return
+        if claim.unknown:
+            print(f"Could not confirm the claim on {claim_key}, recording on the claim already held")
+
+    await run_recording_process(
+        job["meeting_link"], job["job_id"], job["task_id"], job["username"],
+        capture_mode=job["options"].get("capture_mode", DEFAULT_CAPTURE_MODE),
+        reservation=claim_key,
+    )
+
+recorder_supervisor = RecorderSupervisor()
+browser_pool = BrowserPool()
+# Recordings only start while the host has room for them; scheduled meetings go first
+admission = AdmissionController(job_queue, lambda: [worker.pid for worker in recorder_supervisor.active.values()])
+worker_pool = WorkerPool(job_queue, run_job, admit=lambda source: admission.check(source))
+
+# Gauges read when /metrics is scraped
+Gauge("metamate_active_recordings", "Recorder processes currently running", collect=lambda: len(active_logs))
+Gauge("metamate_queue_depth", "Jobs waiting for a recording worker", collect=lambda: job_queue.depth())
+Gauge("metamate_warm_browsers", "Idle warm browsers ready to be leased", collect=lambda: browser_pool.idle_count())
+Gauge("metamate_reserved_browsers", "Warm browsers held for scheduled meetings about to start",
+      collect=lambda: browser_pool.reserved_count())
+Gauge(
+    "metamate_warm_recorders", "Recorder worker processes started and waiting for a job",
+    collect=lambda: recorder_supervisor.idle_count()
+)
+Gauge(
+    "metamate_child_cpu_seconds", "CPU time used by child processes (ffmpeg, chrome, Xvfb, ...)", ["process"],
+    collect=lambda: {(name,): round(cpu, 2) for name, (cpu, _) in child_process_usage().items()}
+)
+Gauge(
+    "metamate_child_rss_bytes", "Resident memory of child processes (ffmpeg, chrome, Xvfb, ...)", ["process"],
+    collect=lambda: {(name,): rss for name, (_, rss) in child_process_usage().items()}
+)
+
+def link_dedupe_key(meeting_link):
+    return f"link:{meeting_link}"
+
+def scheduled_dedupe_key(task_id):
+    return f"task:{task_id}"
+
+def enqueue_recording(meeting_data, source=ADHOC, dedupe_key=None, claim_key=None):
+    """Queue a meeting for recording and wake a worker
+
+    Each recording gets a unique job id; a meeting link (or scheduled task, via
+    dedupe_key) that is already being recorded is not queued twice.
+    """
+    meeting_link = meeting_data['google_meeting_link']
+    options = {
+        "capture_mode": meeting_data.get('capture_mode', DEFAULT_CAPTURE_MODE),
+        "trace_id": tracing.new_id(),
+    }
+    if claim_key:
+        options["claim_key"] = claim_key
+
+    job, created = job_queue.enqueue(
+        new_job_id(meeting_link),
+        meeting_link,
+        meeting_data['taskId'],
+        meeting_data['username'],
+        source=source,
+        options=options,
+        dedupe_key=dedupe_key or link_dedupe_key(meeting_link),
+    )
+    if created:
+        worker_pool.notify()
+    else:
+        print(f"Meeting {meeting_link} is already {job['state']} as {job['job_id']}, not queueing again")
+    return job, created
+
+async def upload_transcript(text):
+    """Upload a transcript to the backend once and return the digest it is stored under"""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    if (await backend.request("HEAD", f"/transcripts/{digest}", retries=1)).status_code == 200:
+        return digest
+
+    response = await backend.put(f"/transcripts/{digest}", json={"text": text})
+    response.raise_for_status()
+    return digest
+
+async def send_to_api(results, username, task_id, recording_id=None, api_path="/update-meeting-info"):
+    """Send the results along with username and task_id to the backend
+
+    Large payloads are gzip-compressed by the backend client. With
+    DELIVERY_BY_REFERENCE the transcripts are uploaded once and only their
+    digests are posted. If the backend cannot be reached after retrying, the
+    payload is kept in the outbox and delivered later, batched with any other
+    pending results; the recording is finished once the outbox settles it.
+    """
+    # Create payload with all required information
+    payload = {
+        "username": username,
+        "task_id": task_id,
+        "raw_transcript": results["raw_transcript"],
+        "adjusted_transcript": results["adjusted_transcript"],
+        "meeting_minutes_and_tasks": results["meeting_minutes_and_tasks"]
+    }
+
+    if DELIVERY_BY_REFERENCE:
+        try:
+            for field in ("raw_transcript", "adjusted_transcript"):
+                payload[f"{field}_ref"] = await upload_transcript(payload[field])
+            for field in ("raw_transcript", "adjusted_transcript"):
+                del payload[field]
+        except httpx.HTTPError as e:
+            # Fall back to sending the transcripts inline
+            print(f"Transcript upload failed, sending inline: {e}")
+            payload.pop("raw_transcript_ref", None)
+            payload.pop("adjusted_transcript_ref", None)
+
     try:
-        # Change the working directory temporarily to the storage directory
-        original_dir = os.getcwd()
-        os.chdir(storage_dir)
-        
-        # Process the audio
-        results = process_audio(
-            recording_id=recording_id,
-            # audio_file_path=audio_path,
-            save_files=True,
-        )
+        print(f"Sending data to API: {backend.url(api_path)}")
+        response = await backend.post(api_path, json=payload)
+    except httpx.HTTPError as e:
+        print(f"Error sending data to API: {str(e)}")
+        return {"success": False, "error": str(e), "queued": True, "outbox_id": outbox.add("POST", api_path, payload, meta={"recording_id": recording_id})}
 
-        if results:
-           api_response = send_to_api(
-               results=results,
-               username=username,
-               task_id=task_id
-           )
-           # Add API response to results
-           results["api_response"] = api_response
-        
-        # Return to original directory
-        os.chdir(original_dir)
-        
+    if response.status_code == 200:
+        print("Successfully sent data to API")
+        return {"success": True, "response": response.json()}
+    if response.status_code in RETRY_STATUSES:
+        print(f"API still failing with status code {response.status_code}, delivering later")
+        return {"success": False, "status_code": response.status_code, "queued": True,
+                "outbox_id": outbox.add("POST", api_path, payload, meta={"recording_id": recording_id})}
+
+    print(f"API request failed with status code: {response.status_code}")
+    return {"success": False, "status_code": response.status_code, "response": response.text}
+
+async def process_recorded_meeting(recording_id, task_id, username):
+    """Run the post-recording pipeline, resuming from the last completed stage
+
+    The stages block on ffmpeg, transcription and LLM calls, so the pipeline
+    runs in a worker thread; its delivery step hops back onto the event loop
+    to use the shared async backend client.
+    """
+    loop = asyncio.get_running_loop()
+
+    def deliver(**kwargs):
+        return asyncio.run_coroutine_threadsafe(send_to_api(**kwargs), loop).result()
+
+    pipeline = Pipeline(
+        recording_id,
+        task_id,
+        username,
+        deliver=deliver,
+        on_stage=lambda stage: set_job_state(recording_id, PIPELINE_JOB_STATES[stage]),
+        is_queued=outbox.has,
+    )
+    try:
+        results = await asyncio.to_thread(pipeline.run)
+        if pipeline.delivery_pending():
+            # Stays in posting until the outbox settles the delivery
+            print(f"Audio processing completed, results for {recording_id} are waiting in the outbox")
+            return results
+        set_job_state(recording_id, DONE)
         print("Audio processing completed successfully")
         return results
     except Exception as e:
-        print(f"Error processing audio: {e}")
-        # Return to original directory in case of error
-        os.chdir(original_dir)
+        print(f"Error processing recording {recording_id}: {e}")
+        print(traceback.format_exc())
+        set_job_state(recording_id, FAILED, error=str(e))
         return None
 
+def delivery_settled(entry, delivered, status_code):
+    """Outbox callback: finish the job whose results were queued for delivery"""
+    recording_id = entry.get("meta", {}).get("recording_id")
+    job = job_queue.get(recording_id) if recording_id else None
+    if not job:
+        return
+    error = None if delivered else f"Backend rejected the results with status code {status_code}"
+    pipeline = Pipeline(recording_id, job["task_id"], job["username"], deliver=send_to_api)
+    if not pipeline.settle_delivery(entry["id"], delivered, error=error):
+        return
+    if delivered:
+        print(f"Queued results for {recording_id} were delivered")
+        set_job_state(recording_id, DONE)
+    else:
+        print(f"Queued results for {recording_id} were rejected: {error}")
+        set_job_state(recording_id, FAILED, error=error)
+
+outbox.on_settled = delivery_settled
+
 @app.route('/record_meeting', methods=['POST'])
-def record_meeting():
+async def record_meeting():
     # Get meeting details from request
-    data = request.json
+    data = await request.get_json(silent=True)
     
     if not data or 'google_meeting_link' not in data:
         return jsonify({"error": "Meeting link is required"}), 400
-    
-    # Generate a unique ID for this recording
-    recording_id = data['google_meeting_link'].split('/')[-1]
-    print(f"Recording ID (meeting ID): {recording_id}")
-
-    # Get the current working directory
-    current_dir = os.getcwd()
-    print(f"Current working directory: {current_dir}")
 
-    # Set base storage path under the current directory
-    base_meeting_dir = os.path.join(current_dir, "storage", recording_id)
-    recordings_dir = os.path.join(base_meeting_dir, "recordings")
-    screenshots_dir = os.path.join(base_meeting_dir, "screenshots")
+    if data.get('capture_mode', DEFAULT_CAPTURE_MODE) not in CAPTURE_MODES:
+        return jsonify({"error": f"capture_mode must be one of: {', '.join(CAPTURE_MODES)}"}), 400
+    
+    # A meeting already being recorded is answered below without needing more room
+    if not job_queue.in_flight(link_dedupe_key(data['google_meeting_link'])):
+        decision = admission.check(ADHOC, request=True)
+        if not decision:
+            print(f"Refusing recording of {data['google_meeting_link']}: {decision.reason}")
+            return jsonify({
+                "error": "Services is at capacity, try again later",
+                "reason": decision.reason,
+                "retry_after": decision.retry_after,
+            }), 429, {"Retry-After": str(decision.retry_after)}
 
-    print(f"Creating directories at:\n - {recordings_dir}\n - {screenshots_dir}")
+    # Hand the recording to the worker pool
+    job, created = enqueue_recording(data, source=ADHOC)
+    print(f"Recording ID: {job['job_id']}")
 
-    try:
-        # Create the necessary directories
-        os.makedirs(recordings_dir, exist_ok=True)
-        os.makedirs(screenshots_dir, exist_ok=True)
-        print("Directories created (or already existed).")
-    except Exception as e:
-        print(f"Error while creating directories: {str(e)}")
-        print(traceback.format_exc())
-        return jsonify({"error": f"Failed to create directories: {str(e)}"}), 500
+    # Immediately return a response
+    return jsonify({
+        "recording_id": job["job_id"],
+        "status": job["state"],
+        "message": "Meeting recording has been queued" if created else f"Meeting recording is already {job['state']}"
+    })
 
-    # Verify they were created
-    if not os.path.isdir(recordings_dir):
-        return jsonify({"error": "Failed to verify recordings directory."}), 500
-    if not os.path.isdir(screenshots_dir):
-        return jsonify({"error": "Failed to verify screenshots directory."}), 500
+@app.route('/recordings/<recording_id>/retry', methods=['POST'])
+async def retry_recording(recording_id):
+    """Re-run a failed job, resuming after the last completed stage
 
-    print("Directory setup complete.")
+    A job that failed before anything was recorded goes back through the
+    recorder instead of the post-recording pipeline.
+    """
+    job = job_queue.get(recording_id)
+    if not job:
+        return jsonify({"error": "Recording not found"}), 404
+    if job["state"] not in TERMINAL_STATES:
+        return jsonify({"error": f"Recording is still {job['state']}"}), 409
 
-    # Start the recording process in a separate thread
-    recording_thread = threading.Thread(
-        target=run_recording_process,
-        args=(data['google_meeting_link'], recording_id, data['taskId'], data['username'])
-    )
-    recording_thread.daemon = True  # Allows the thread to exit when the main program exits
-    recording_thread.start()
+    pipeline = Pipeline(recording_id, job["task_id"], job["username"], deliver=send_to_api)
+    record_again = not pipeline.has_recording()
+    job_queue.requeue(recording_id, resume_stage=None if record_again else TRANSCODING)
+    JOB_RETRIES.inc(reason="manual")
+    worker_pool.notify()
 
-    # Immediately return a response
     return jsonify({
         "recording_id": recording_id,
-        "status": "started",
-        "message": "Meeting recording has been started"
+        "status": "queued",
+        "record_again": record_again,
+        "completed_stages": pipeline.completed_stages()
     })
 
-def fetch_upcoming_meetings():
-    """Fetch upcoming meetings from the API"""
+def count_arg(name, default, maximum):
+    """A positive integer query argument capped at maximum, or None if it is not one"""
+    raw = request.args.get(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        return None
+    return min(value, maximum) if value > 0 else None
+
+@app.route('/recordings/<recording_id>/logs', methods=['GET'])
+async def recording_logs(recording_id):
+    """Last lines of a recorder's process log"""
+    lines = count_arg('lines', 100, 1000)
+    if lines is None:
+        return jsonify({"error": "lines must be a positive integer"}), 400
+
+    capture = active_logs.get(recording_id)
+    if capture:
+        return jsonify({"recording_id": recording_id, "active": True, "lines": capture.tail(lines)})
+
+    log_path = os.path.join("storage", recording_id, "process.log")
+    if not os.path.exists(log_path):
+        return jsonify({"error": "No logs for this recording"}), 404
+
+    return jsonify({"recording_id": recording_id, "active": False, "lines": tail_file(log_path, lines)})
+
+@app.route('/recordings/<recording_id>/trace', methods=['GET'])
+async def recording_trace(recording_id):
+    """Latency waterfall for a recording: its spans with offsets from the start of the job"""
+    job = job_queue.get(recording_id)
+    if not job:
+        return jsonify({"error": "Recording not found"}), 404
+
+    trace_id = request.args.get('trace_id', job["options"].get("trace_id"))
+    spans = load_trace(recording_id, trace_id)
+    origin = spans[0]["start"] if spans else 0
+    for span in spans:
+        span["offset"] = round(span["start"] - origin, 3)
+
+    return jsonify({"recording_id": recording_id, "trace_id": trace_id, "spans": spans})
+
+def job_artifacts(job_id):
+    """Files a job has produced so far under storage/<job_id>"""
+    base_dir = os.path.join("storage", job_id)
+    artifacts = []
+    for root, _, files in os.walk(base_dir):
+        for name in sorted(files):
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            artifacts.append({"path": os.path.relpath(path, base_dir), "bytes": size})
+    return artifacts
+
+def job_resources(job_id):
+    """CPU seconds and memory of a running recorder's process tree, by process name"""
+    worker = recorder_supervisor.active.get(job_id)
+    if not worker:
+        return None
+    usage = child_process_usage(worker.pid, include_root=True)
+    return {
+        "processes": {name: {"cpu_seconds": round(cpu, 2), "rss_bytes": rss} for name, (cpu, rss) in usage.items()},
+        "cpu_seconds": round(sum(cpu for cpu, _ in usage.values()), 2),
+        "rss_bytes": sum(rss for _, rss in usage.values()),
+    }
+
+def job_summary(job):
+    return {
+        "job_id": job["job_id"],
+        "state": job["state"],
+        "meeting_link": job["meeting_link"],
+        "task_id": job["task_id"],
+        "source": job["source"],
+        "attempts": job["attempts"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+@app.route('/jobs', methods=['GET'])
+async def list_jobs():
+    """Jobs running on this node, from memory; ?state=queued,failed,... reads the job database instead"""
+    states = [state for state in request.args.get('state', '').split(',') if state]
+    if not states:
+        return jsonify({"node": NODE_ID, "queued": job_queue.depth(), "jobs": job_index.list()})
+
+    unknown = [state for state in states if state not in JOB_STATES]
+    if unknown:
+        return jsonify({"error": f"Unknown state(s): {', '.join(unknown)}"}), 400
+
+    limit = count_arg('limit', 100, 1000)
+    if limit is None:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    jobs = job_queue.list_jobs(states)[-limit:]
+    return jsonify({"node": NODE_ID, "jobs": [job_summary(job) for job in jobs]})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+async def job_status(job_id):
+    """Stage, timings, resource use and artifacts of one job"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    status = job_summary(job)
+    running = job_index.get(job_id)
+    if running:
+        status.update(
+            active=True,
+            running_seconds=running["running_seconds"],
+            stages=running["stages"],
+            recorder=running["recorder"],
+        )
+        # Ask the recorder itself while it is running; its own view is the most current
+        live = await recorder_supervisor.status(job_id)
+        if live:
+            status["recorder"] = dict(running["recorder"], live=live)
+        status["resources"] = await asyncio.to_thread(job_resources, job_id)
+    else:
+        status["active"] = False
+
+    manifest = load_manifest(job_id)
+    status["pipeline"] = manifest["stages"] if manifest else {}
+    status["artifacts"] = await asyncio.to_thread(job_artifacts, job_id)
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/stop', methods=['POST'])
+async def stop_job(job_id):
+    """Cancel a queued job, or end a recording early (what was recorded is still processed)"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    data = await request.get_json(silent=True) or {}
+    reason = data.get('reason', 'stopped by operator')
+
+    if job_queue.cancel(job_id, error=f"Cancelled: {reason}"):
+        if job["options"].get("claim_key"):
+            await finish_claimed_meeting(job["options"]["claim_key"])
+        return jsonify({"job_id": job_id, "status": "cancelled"})
+
+    if recorder_supervisor.stop(job_id, reason):
+        return jsonify({"job_id": job_id, "status": "stopping"}), 202
+
+    job = job_queue.get(job_id)
+    return jsonify({"error": f"Job is {job['state']}; only queued jobs and running recordings can be stopped"}), 409
+
+@app.route('/metrics', methods=['GET'])
+async def metrics_endpoint():
+    """Timings, failure counts and resource usage in the Prometheus text format"""
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+async def start_scheduled_meeting(meeting):
+    """Scheduler callback: claim the meeting record and queue its recording
+
+    The claim is atomic across every Services node, so only one of them records
+    the meeting. It is heartbeated while the job is queued or running and the
+    record is deleted once the job finishes. Nodes that lost the claim return
+    the time it lapses, and the scheduler tries them again then, so if the
+    holder dies before the meeting ends another node takes it over.
+    """
+    task_id = meeting["taskId"]
+    claim = await claims.claim(task_id, NODE_ID)
+    if not claim:
+        await asyncio.to_thread(browser_pool.unreserve, task_id)
+        if claim.gone:
+            print(f"Meeting {task_id} no longer exists, skipping")
+        else:
+            print(f"Meeting {task_id} is claimed by another node, will check again once the claim lapses")
+        return claim.retry_at()
+
+    print(f"Starting recording for meeting: {meeting['google_meeting_link']}")
+
+    # Prepare data for record_meeting endpoint
+    meeting_data = {
+        "google_meeting_link": meeting["google_meeting_link"],
+        "taskId": task_id,
+        "username": meeting["username"]
+    }
+
+    # Queue the recording for the worker pool; a browser warmed for it waits for its lease,
+    # unless no job is left to take it
+    if not start_recording_for_meeting(meeting_data) and not job_queue.in_flight(scheduled_dedupe_key(task_id)):
+        await asyncio.to_thread(browser_pool.unreserve, task_id)
+
+async def finish_claimed_meeting(task_id):
+    """Delete a scheduled meeting's record once its job is over, and drop the claim"""
     try:
-        response = requests.get(os.getenv("SERVER_API") + "/meeting-records")
-        if response.status_code == 200:
-            meetings = response.json()
-            print(f"Successfully fetched {len(meetings)} meetings")
-            return meetings
+        delete_response = await backend.delete(f"/delete-meeting-record/{task_id}")
+
+        if delete_response.status_code == 200:
+            print(f"Successfully deleted meeting record with taskId: {task_id}")
         else:
-            print(f"Failed to fetch meetings: {response.status_code}")
-            return []
+            print(f"Failed to delete meeting record: {delete_response.status_code}, {delete_response.text}")
     except Exception as e:
-        print(f"Error fetching meetings: {str(e)}")
-        return []
+        print(f"Error deleting meeting record: {str(e)}")
 
-def check_upcoming_meetings():
-    """Check for upcoming meetings and schedule recordings"""
-    meetings = fetch_upcoming_meetings()
-    now = datetime.datetime.now(datetime.timezone.utc)
-    
-    for meeting in meetings:
-        try:
-            # Parse meeting start time
-            start_time = datetime.datetime.fromisoformat(meeting["start_time"])
-            
-            # Calculate the time to start recording (minutes before meeting starts)
-            record_time = start_time
-            
-            # Check if it's time to start recording
-            time_until_recording = (record_time - now).total_seconds()
-
-            print(time_until_recording);
-            
-            if 0 <= time_until_recording <= 120:  # If within 2 minute of scheduled recording time
-                print(f"Starting recording for meeting: {meeting['google_meeting_link']}")
-                
-                # Prepare data for record_meeting endpoint
-                meeting_data = {
-                    "google_meeting_link": meeting["google_meeting_link"],
-                    "taskId": meeting["taskId"],
-                    "username": meeting["username"]
-                }
-                
-                try:
-                    # Delete the meeting record to prevent re-processing
-                    delete_url = f"{os.getenv('SERVER_API')}/delete-meeting-record/{meeting['taskId']}"
-                    delete_response = requests.delete(delete_url)
-                    
-                    if delete_response.status_code == 200:
-                        print(f"Successfully deleted meeting record with taskId: {meeting['taskId']}")
-                    else:
-                        print(f"Failed to delete meeting record: {delete_response.status_code}, {delete_response.text}")
-                
-                except Exception as e:
-                    print(f"Error deleting meeting record: {str(e)}")
-                    # Continue with starting the recording even if deletion fails
-                
-                # Call the record_meeting function directly (not via HTTP)
-                threading.Thread(
-                    target=start_recording_for_meeting,
-                    args=(meeting_data,)
-                ).start()
-                
-        except Exception as e:
-            print(f"Error processing meeting {meeting.get('_id', 'unknown')}: {str(e)}")
+    await claims.release(task_id, NODE_ID)
+    # Jobs that ended before leasing a browser leave their reservation behind
+    await asyncio.to_thread(browser_pool.unreserve, task_id)
+
+async def claim_lost(task_id):
+    """ClaimKeeper callback: stop this node's job for a meeting another node has claimed
+
+    A queued job is cancelled and a running recording is stopped and failed, so
+    the meeting is recorded and delivered once. Jobs already processing a
+    finished recording carry on, but leave the meeting record to the new holder.
+    """
+    in_flight = [state for state in JOB_STATES if state not in TERMINAL_STATES]
+    for job in job_queue.list_jobs(in_flight):
+        if job["options"].get("claim_key") != task_id:
+            continue
+        job_id = job["job_id"]
+        if job_queue.cancel(job_id, error="Cancelled: claim on the meeting was lost to another node"):
+            await asyncio.to_thread(browser_pool.unreserve, task_id)
+            continue
+        if job_id not in job_index:
+            # Only waiting on the outbox; its claim was already given up
+            continue
+        lost_claims.add(job_id)
+        # Asked again on every heartbeat, in case the recorder had not started yet
+        if recorder_supervisor.stop(job_id, "claim lost to another node"):
+            print(f"Stopping {job_id}: its meeting is now claimed by another node")
+
+def claimed_job_keys():
+    """Claims held by jobs this node has not finished
+
+    Jobs only waiting on the outbox have already given up their claim.
+    """
+    in_flight = [state for state in JOB_STATES if state not in TERMINAL_STATES]
+    return [
+        job["options"]["claim_key"] for job in job_queue.list_jobs(in_flight)
+        if job["options"].get("claim_key") and (job["state"] != POSTING or job["job_id"] in job_index)
+    ]
+
+async def prewarm_for_meeting(meeting):
+    """Scheduler callback: have a browser warm by the time the meeting's recording starts
+
+    The meeting is claimed now, long enough to last until it is due, so only
+    the node that will record it warms a browser; the due handler renews the claim.
+    """
+    task_id = meeting["taskId"]
+    if not await claims.claim(task_id, NODE_ID, ttl=PREWARM_SECONDS + CLAIM_TTL_SECONDS):
+        print(f"Meeting {task_id} is claimed by another node, not pre-warming")
+        return
+    print(f"Pre-warming a browser for meeting: {meeting['google_meeting_link']}")
+    await asyncio.to_thread(browser_pool.prewarm, task_id)
 
 def start_recording_for_meeting(meeting_data):
-    """Start recording for a specific meeting"""
+    """Queue recording for a specific scheduled meeting; True if a new job was queued"""
     try:
-        # Generate a unique ID for this recording
-        recording_id = meeting_data['google_meeting_link'].split('/')[-1]
-        
-        # Set up directories
-        current_dir = os.getcwd()
-        base_meeting_dir = os.path.join(current_dir, "storage", recording_id)
-        recordings_dir = os.path.join(base_meeting_dir, "recordings")
-        screenshots_dir = os.path.join(base_meeting_dir, "screenshots")
-        
-        os.makedirs(recordings_dir, exist_ok=True)
-        os.makedirs(screenshots_dir, exist_ok=True)
-        
-        # Start the recording process in a separate thread
-        run_recording_process(
-            meeting_data['google_meeting_link'], 
-            recording_id, 
-            meeting_data['taskId'], 
-            meeting_data['username']
+        # Hand the recording to the worker pool
+        job, created = enqueue_recording(
+            meeting_data,
+            source=SCHEDULED,
+            dedupe_key=scheduled_dedupe_key(meeting_data['taskId']),
+            claim_key=meeting_data['taskId'],
         )
         
-        print(f"Recording process completed for meeting: {meeting_data['google_meeting_link']}")
+        print(f"Recording {job['job_id']} queued for meeting: {meeting_data['google_meeting_link']}")
+        return created
     except Exception as e:
         print(f"Error starting recording: {str(e)}")
         print(traceback.format_exc())
+        return False
 
 def setup_scheduler():
-    """Set up scheduler to periodically check for upcoming meetings"""
-    # Check every minute for upcoming meetings
-    schedule.every(1).minutes.do(check_upcoming_meetings)
-    
-    # Run scheduler in a separate thread
-    def run_scheduler():
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
-    
-    scheduler_thread = threading.Thread(target=run_scheduler)
-    scheduler_thread.daemon = True
-    scheduler_thread.start()
-    print("Meeting scheduler started")
+    """Set up the scheduler that starts recordings for meetings from the backend"""
+    scheduler = MeetingScheduler(
+        backend,
+        on_due=start_scheduled_meeting,
+        on_prewarm=prewarm_for_meeting,
+        lead_seconds=MINUTES_BEFORE_MEETING * 60,
+    )
+    scheduler.start()
+    return scheduler
 
-if __name__ == '__main__':
-    # Start the scheduler
+async def main():
+    """Run the API, the recording workers and every background loop on one event loop"""
+    # Resume jobs that were in flight when the server last stopped
+    JOB_RETRIES.inc(job_queue.requeue_interrupted(), reason="interrupted")
+    admission.start()
+    recorder_supervisor.start()
+    worker_pool.start()
+    browser_pool.start()
+    ClaimKeeper(claims, claimed_job_keys, on_lost=claim_lost).start()
+    outbox.start()
+
+    # Start the scheduler; it syncs meetings from the backend straight away
     setup_scheduler()
-    
-    # Initial check for upcoming meetings
-    check_upcoming_meetings()
-    
-    # Start the Flask app
-    app.run(host='0.0.0.0', port=7000)
\ No newline at end of file
+
+    config = Config()
+    config.bind = [f"{SERVER_HOST}:{SERVER_PORT}"]
+    try:
+        await serve(app, config)
+    finally:
+        await recorder_supervisor.close()
+        await asyncio.to_thread(close_local_pools)
+        await backend.close()
+
+if __name__ == '__main__':
+    # Processes spawned later would import this file again as their main module,
+    # rebuilding all of the state above; run_server.py is a main module without any
+    os.execv(sys.executable, [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_server.py")])
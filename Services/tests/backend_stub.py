@@ -0,0 +1,82 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class BackendStub:
+    """Local stand-in for the backend API, served over real HTTP from a thread
+
+    Routes map (method, path) to a function taking the request dict and
+    returning (status, body) or (status, body, headers); the body is sent as
+    JSON. Every request is recorded in requests, with its raw body and, for
+    JSON requests, the decoded body.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def route(self, method, path, handler):
+        self.routes[(method, path)] = handler
+
+    def calls(self, method, path):
+        return [request for request in self.requests if (request["method"], request["path"]) == (method, path)]
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                parsed = urlparse(self.path)
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if self.headers.get("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+                request = {
+                    "method": self.command,
+                    "path": parsed.path,
+                    "query": {key: values[0] for key, values in parse_qs(parsed.query).items()},
+                    "headers": dict(self.headers),
+                    "body": body,
+                    "json": json.loads(body) if body and "json" in (self.headers.get("Content-Type") or "") else None,
+                }
+                stub.requests.append(request)
+
+                handler = stub.routes.get((self.command, parsed.path))
+                status, payload, headers = 404, {"message": "no route"}, {}
+                if handler:
+                    result = handler(request)
+                    status, payload = result[0], result[1]
+                    headers = result[2] if len(result) > 2 else {}
+
+                data = b"" if payload is None else json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(data)
+
+            do_GET = do_HEAD = do_POST = do_PUT = do_DELETE = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
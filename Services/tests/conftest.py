@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# Services modules import each other by bare name, as they do when run from Services/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend_stub import BackendStub  # noqa: E402
+
+
+@pytest.fixture
+def backend_stub():
+    stub = BackendStub()
+    stub.start()
+    yield stub
+    stub.stop()
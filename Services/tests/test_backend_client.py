@@ -0,0 +1,157 @@
+import asyncio
+import os
+
+from backend_client import BackendClient, Outbox
+
+
+def with_client(backend_stub, scenario, **options):
+    """Run scenario(client) against the stub with a fresh client"""
+    async def run():
+        client = BackendClient(backend_stub.url, **options)
+        try:
+            return await scenario(client)
+        finally:
+            await client.close()
+    return asyncio.run(run())
+
+
+def test_client_retries_overloaded_responses(backend_stub):
+    answers = iter([(503, {}, {"Retry-After": "0"}), (200, {"ok": True})])
+    backend_stub.route("POST", "/update", lambda request: next(answers))
+
+    async def scenario(client):
+        return await client.post("/update", json={"text": "hello"})
+
+    response = with_client(backend_stub, scenario)
+    assert response.status_code == 200 and response.json() == {"ok": True}
+    assert len(backend_stub.calls("POST", "/update")) == 2
+
+
+def test_client_gives_up_after_its_retries(backend_stub):
+    backend_stub.route("POST", "/update", lambda request: (503, {}, {"Retry-After": "0"}))
+
+    async def scenario(client):
+        return await client.post("/update", json={})
+
+    assert with_client(backend_stub, scenario, max_retries=2).status_code == 503
+    assert len(backend_stub.calls("POST", "/update")) == 3
+
+
+def test_outbox_keeps_requests_until_the_backend_takes_them(backend_stub, tmp_path):
+    status = {"code": 503}
+    backend_stub.route("POST", "/update", lambda request: (status["code"], {}))
+
+    async def scenario(client):
+        outbox = Outbox(client, directory=str(tmp_path / "outbox"))
+        for n in range(3):
+            outbox.add("POST", "/update", {"n": n})
+
+        assert await outbox.flush() == 0
+        # The backend is struggling, so the rest were not tried
+        assert len(backend_stub.calls("POST", "/update")) == 1
+        assert len(outbox.pending()) == 3
+
+        status["code"] = 200
+        assert await outbox.flush() == 3
+        return outbox.pending()
+
+    assert with_client(backend_stub, scenario, max_retries=0) == []
+    assert sorted(call["json"]["n"] for call in backend_stub.calls("POST", "/update")[1:]) == [0, 1, 2]
+
+
+def test_outbox_moves_rejected_requests_to_dead(backend_stub, tmp_path):
+    backend_stub.route("POST", "/update", lambda request: (400, {"message": "bad"}))
+
+    async def scenario(client):
+        outbox = Outbox(client, directory=str(tmp_path / "outbox"))
+        outbox.add("POST", "/update", {})
+        assert await outbox.flush() == 0
+        return outbox.pending(), os.listdir(outbox.dead_directory)
+
+    pending, dead = with_client(backend_stub, scenario)
+    assert pending == [] and len(dead) == 1
+
+
+def batch_results(statuses):
+    """Batch endpoint answering each update with the status given for its payload's n"""
+    return lambda request: (200, {"results": [{"status": statuses[u["n"]]} for u in request["json"]["updates"]]})
+
+
+def make_outbox(client, tmp_path):
+    return Outbox(client, directory=str(tmp_path / "outbox"), batch_paths={"/update": "/update/batch"},
+                  batch_size=2)
+
+
+def test_client_compresses_large_bodies_only(backend_stub):
+    backend_stub.route("POST", "/update", lambda request: (200, {}))
+
+    async def scenario(client):
+        await client.post("/update", json={"text": "x" * 100})
+        await client.post("/update", json={"text": "x"})
+
+    with_client(backend_stub, scenario, compress_min_bytes=50)
+    large, small = backend_stub.calls("POST", "/update")
+    assert large["headers"]["Content-Encoding"] == "gzip" and large["json"] == {"text": "x" * 100}
+    assert "Content-Encoding" not in small["headers"] and small["json"] == {"text": "x"}
+
+
+def test_outbox_batches_entries_and_settles_each_by_its_status(backend_stub, tmp_path):
+    statuses = {1: 200, 2: 400, 3: 503}
+    backend_stub.route("POST", "/update/batch", batch_results(statuses))
+    backend_stub.route("POST", "/update", lambda request: (statuses[request["json"]["n"]], {}))
+    backend_stub.route("POST", "/other", lambda request: (200, {}))
+
+    async def scenario(client):
+        outbox = make_outbox(client, tmp_path)
+        for n in (1, 2, 3):
+            outbox.add("POST", "/update", {"n": n})
+        outbox.add("POST", "/other", {"n": 4})
+        return outbox, await outbox.flush()
+
+    outbox, delivered = with_client(backend_stub, scenario)
+    assert delivered == 2
+    # Two entries go through the batch endpoint; the one left over is sent on its own
+    assert [len(call["json"]["updates"]) for call in backend_stub.calls("POST", "/update/batch")] == [2]
+    assert len(backend_stub.calls("POST", "/update")) == 1
+
+    # Rejected entries are buried, overloaded ones wait for the next flush
+    assert len(os.listdir(outbox.dead_directory)) == 1
+    [pending] = outbox.pending()
+    entry = outbox._load(pending)
+    assert entry["payload"] == {"n": 3} and entry["attempts"] == 1
+
+
+def test_outbox_stops_batching_while_the_backend_is_down(backend_stub, tmp_path):
+    statuses = {"batch": 503}
+    backend_stub.route("POST", "/update/batch",
+                       lambda request: (statuses["batch"], {"results": [{"status": 200}] * 2}))
+
+    async def scenario(client):
+        outbox = make_outbox(client, tmp_path)
+        for n in range(4):
+            outbox.add("POST", "/update", {"n": n})
+
+        assert await outbox.flush() == 0
+        # The first batch failed, so the second was not tried
+        assert len(backend_stub.calls("POST", "/update/batch")) == 1
+        assert len(outbox.pending()) == 4
+
+        statuses["batch"] = 200
+        assert await outbox.flush() == 4
+        return outbox.pending()
+
+    assert with_client(backend_stub, scenario) == []
+
+
+def test_outbox_falls_back_to_single_requests_without_a_batch_endpoint(backend_stub, tmp_path):
+    backend_stub.route("POST", "/update", lambda request: (200, {}))
+
+    async def scenario(client):
+        outbox = make_outbox(client, tmp_path)
+        for n in range(2):
+            outbox.add("POST", "/update", {"n": n})
+        return await outbox.flush(), outbox.pending()
+
+    assert with_client(backend_stub, scenario) == (2, [])
+    assert len(backend_stub.calls("POST", "/update/batch")) == 1
+    assert sorted(call["json"]["n"] for call in backend_stub.calls("POST", "/update")) == [0, 1]
@@ -0,0 +1,130 @@
+import json
+import time
+
+import pytest
+
+import browser_pool
+from browser_pool import BrowserPool
+
+
+class FakeSlot:
+    def __init__(self, index):
+        self.index = index
+        self.display = f":{100 + index}"
+
+
+class FakeBrowser:
+    launched = []
+
+    def __init__(self, slot):
+        self.slot = slot
+        self.closed = False
+
+    def launch(self):
+        FakeBrowser.launched.append(self)
+
+    def is_alive(self):
+        return not self.closed
+
+    def reset(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    slots = iter(range(100))
+    FakeBrowser.launched = []
+    monkeypatch.setattr(browser_pool, "WarmBrowser", FakeBrowser)
+    monkeypatch.setattr(browser_pool.MediaSlot, "acquire", classmethod(lambda cls: FakeSlot(next(slots))))
+    return BrowserPool(size=1)
+
+
+def settle(pool, idle, timeout=2):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if pool.idle_count() == idle and pool._launching == 0:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"pool has {pool.idle_count()} idle browsers, expected {idle}")
+
+
+def test_reservation_is_only_used_by_its_own_recording(pool):
+    pool.start()
+    settle(pool, 1)
+    pool.prewarm("task-1")
+    settle(pool, 2)
+
+    # An ad-hoc recording leaves the reservation in place, so a replacement is launched
+    adhoc = pool.lease()
+    assert adhoc and pool.reserved_count() == 1
+    settle(pool, 2)
+
+    scheduled = pool.lease("task-1")
+    assert scheduled and pool.reserved_count() == 0
+    settle(pool, 1)
+
+    # Back to size once both are returned: the extra browser is shut down
+    pool.release(adhoc)
+    pool.release(scheduled)
+    assert pool.idle_count() == 1 and scheduled.closed
+
+
+def test_unreserved_and_expired_reservations_do_not_grow_the_pool(pool):
+    pool.start()
+    settle(pool, 1)
+    for task_id in ("task-1", "task-2"):
+        pool.prewarm(task_id)
+    settle(pool, 3)
+
+    pool.unreserve("task-1")
+    settle(pool, 2)
+    pool.unreserve("unknown")
+    settle(pool, 2)
+
+    pool.prewarm("task-3", timeout=0)
+    pool.lease()
+    # task-3 lapsed at once and task-2 is still held: one for size, one for task-2
+    settle(pool, 2)
+    assert pool.reserved_count() == 1
+    assert sum(not browser.closed for browser in FakeBrowser.launched) == 3
+
+
+class LaunchSlot(FakeSlot):
+    def start_display(self):
+        return True
+
+    def setup_audio(self):
+        pass
+
+    def env(self):
+        return {"DISPLAY": self.display}
+
+
+class FakeProcess:
+    def poll(self):
+        return None
+
+
+def test_warm_browser_launches_like_undetected_chromedriver(monkeypatch, tmp_path):
+    monkeypatch.setattr(browser_pool, "PROFILE_ROOT", str(tmp_path))
+    monkeypatch.setattr(browser_pool, "chrome_binary", lambda: "chrome")
+    monkeypatch.setattr(browser_pool.requests, "get", lambda url, timeout: None)
+    commands = []
+    monkeypatch.setattr(browser_pool.subprocess, "Popen",
+                        lambda cmd, **kwargs: commands.append(cmd) or FakeProcess())
+
+    # A profile left behind by a browser that was killed
+    preferences = tmp_path / "profile_0" / "Default" / "Preferences"
+    preferences.parent.mkdir(parents=True)
+    preferences.write_text(json.dumps({"profile": {"exit_type": "Crashed", "name": "Person 1"}}))
+
+    browser_pool.WarmBrowser(LaunchSlot(0)).launch()
+
+    cmd = commands[0]
+    for arg in browser_pool.CHROME_ARGS + browser_pool.UNDETECTED_ARGS:
+        assert arg in cmd
+    assert f"--remote-debugging-port={browser_pool.BASE_DEBUG_PORT}" in cmd
+    assert json.loads(preferences.read_text())["profile"] == {"exit_type": None, "name": "Person 1"}
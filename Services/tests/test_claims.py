@@ -0,0 +1,140 @@
+import asyncio
+import datetime
+import time
+
+import claims
+from backend_client import BackendClient
+from claims import BackendClaims, LocalClaims
+from meeting_scheduler import MeetingScheduler
+
+
+def iso(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def test_local_claim_is_exclusive_until_it_lapses(tmp_path):
+    async def scenario():
+        store = LocalClaims(str(tmp_path / "claims.db"))
+        assert await store.claim("task-1", "node-a", ttl=0.3)
+
+        lost = await store.claim("task-1", "node-b", ttl=60)
+        assert not lost
+        assert lost.expires_at is not None and lost.expires_at <= time.time() + 0.3
+        assert lost.retry_at() > lost.expires_at
+
+        # The holder can claim again and renew; others cannot renew or release it
+        assert await store.claim("task-1", "node-a", ttl=0.3)
+        assert not await store.renew("task-1", "node-b")
+        assert not await store.release("task-1", "node-b")
+
+        await asyncio.sleep(0.4)
+        assert await store.claim("task-1", "node-b", ttl=60)
+        assert not await store.renew("task-1", "node-a")
+        assert await store.release("task-1", "node-b")
+        assert await store.claim("task-1", "node-a")
+
+    asyncio.run(scenario())
+
+
+def test_backend_claim_reports_holder_expiry_and_missing_records(backend_stub):
+    expires_at = time.time() + 90
+    backend_stub.route("POST", "/meeting-records/held/claim",
+                       lambda request: (409, {"claimedBy": "node-a", "claimExpiresAt": iso(expires_at)}))
+    backend_stub.route("POST", "/meeting-records/free/claim", lambda request: (200, {"claimed": True}))
+
+    async def scenario():
+        client = BackendClient(backend_stub.url, max_retries=0)
+        store = BackendClaims(client)
+        try:
+            assert await store.claim("free", "node-b")
+            held = await store.claim("held", "node-b")
+            assert not held and abs(held.expires_at - expires_at) < 0.01
+            gone = await store.claim("deleted", "node-b")
+            assert not gone and gone.gone and gone.retry_at() is None
+        finally:
+            await client.close()
+
+    asyncio.run(scenario())
+    body = backend_stub.calls("POST", "/meeting-records/free/claim")[0]["json"]
+    assert body == {"owner": "node-b", "ttl_seconds": claims.CLAIM_TTL_SECONDS}
+
+
+def test_scheduler_takes_over_a_meeting_whose_claim_lapses(tmp_path, backend_stub, monkeypatch):
+    monkeypatch.setattr(claims, "CLAIM_RETRY_MARGIN_SECONDS", 0.05)
+    now = time.time()
+    meeting = {
+        "taskId": "task-1",
+        "google_meeting_link": "https://meet.google.com/abc-defg-hij",
+        "start_time": iso(now),
+        "end_time": iso(now + 3600),
+        "username": "someone",
+    }
+    backend_stub.route("GET", "/meeting-records", lambda request: (200, [meeting]))
+
+    async def scenario():
+        store = LocalClaims(str(tmp_path / "claims.db"))
+        # Another node claimed the meeting and then died without heartbeating
+        assert await store.claim("task-1", "node-a", ttl=0.3)
+
+        attempts = []
+        recorded = asyncio.Event()
+
+        async def on_due(due_meeting):
+            claim = await store.claim(due_meeting["taskId"], "node-b")
+            attempts.append(bool(claim))
+            if not claim:
+                return claim.retry_at()
+            recorded.set()
+
+        client = BackendClient(backend_stub.url, max_retries=0)
+        scheduler = MeetingScheduler(client, on_due=on_due)
+        scheduler.start()
+        try:
+            await asyncio.wait_for(recorded.wait(), 5)
+        finally:
+            scheduler._task.cancel()
+            await client.close()
+        return attempts
+
+    assert asyncio.run(scenario()) == [False, True]
+
+
+def test_scheduler_stops_retrying_once_the_meeting_has_ended():
+    async def scenario():
+        scheduler = MeetingScheduler(None, on_due=None)
+        meeting = {"taskId": "task-1", "google_meeting_link": "link",
+                   "start_time": iso(time.time() - 60), "end_time": iso(time.time() + 30)}
+        scheduler._rearm(meeting, time.time() + 60)
+        assert scheduler._heap == [] and "task-1" not in scheduler._meetings
+
+        scheduler._rearm(meeting, time.time() + 10)
+        assert "task-1" in scheduler._meetings and len(scheduler._heap) == 1
+
+    asyncio.run(scenario())
+
+
+def test_keeper_reports_refused_claims_and_ones_left_unrenewed_too_long(backend_stub):
+    statuses = {"refused": 409, "unreachable": 503, "kept": 200}
+    for key, status in statuses.items():
+        backend_stub.route("POST", f"/meeting-records/{key}/heartbeat",
+                           lambda request, status=status: (status, {}, {"Retry-After": "0"}))
+
+    async def scenario():
+        client = BackendClient(backend_stub.url, max_retries=0)
+        lost = []
+
+        async def on_lost(key):
+            lost.append(key)
+
+        keeper = claims.ClaimKeeper(BackendClaims(client), list, owner="node-a", ttl=0.3, on_lost=on_lost)
+        try:
+            await keeper.heartbeat(list(statuses))
+            # A backend that cannot answer is given until the claim would have lapsed
+            assert lost == ["refused"]
+            await asyncio.sleep(0.4)
+            await keeper.heartbeat(list(statuses))
+        finally:
+            await client.close()
+        return lost
+
+    assert asyncio.run(scenario()) == ["refused", "refused", "unreachable"]
@@ -0,0 +1,44 @@
+import io
+import os
+
+from PIL import Image
+
+import diagnostics
+from diagnostics import ScreenshotStore
+
+
+class FakeDriver:
+    page_source = "<html>lobby</html>"
+
+    def get_screenshot_as_png(self):
+        output = io.BytesIO()
+        Image.new("RGB", (1920, 1080), "white").save(output, format="PNG")
+        return output.getvalue()
+
+
+def test_periodic_captures_stay_within_the_ring(tmp_path):
+    store = ScreenshotStore(str(tmp_path), ring_size=3, max_width=480)
+    driver = FakeDriver()
+    paths = [store.capture_periodic(driver) for _ in range(7)]
+
+    assert [os.path.basename(path) for path in paths[:4]] == [
+        "periodic_00.jpg", "periodic_01.jpg", "periodic_02.jpg", "periodic_00.jpg"
+    ]
+    assert sorted(os.listdir(tmp_path)) == ["periodic_00.jpg", "periodic_01.jpg", "periodic_02.jpg"]
+    with Image.open(paths[-1]) as image:
+        assert (image.format, image.size) == ("JPEG", (480, 270))
+
+
+def test_failure_dumps_are_full_size_and_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(diagnostics, "MAX_FAILURE_DUMPS", 2)
+    store = ScreenshotStore(str(tmp_path))
+    paths = [store.dump_failure(FakeDriver(), f"join_{n}") for n in range(3)]
+
+    assert paths[2] is None
+    with Image.open(paths[0]) as image:
+        assert (image.format, image.size) == ("PNG", (1920, 1080))
+    assert sum(name.endswith(".html") for name in os.listdir(tmp_path)) == 2
+
+    store.reset()
+    assert os.listdir(tmp_path) == []
+    assert store.dump_failure(FakeDriver(), "again") is not None
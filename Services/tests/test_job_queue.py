@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+from job_queue import (
+    ADHOC, DONE, FAILED, JOINING, QUEUED, RECORDING, SCHEDULED, SUMMARIZING, TRANSCODING, TRANSCRIBING,
+    JobQueue, WorkerPool
+)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.db"))
+
+
+def add(queue, job_id, source=ADHOC, dedupe_key=None):
+    job, created = queue.enqueue(job_id, f"https://meet.google.com/{job_id}", "task", "user",
+                                 source=source, dedupe_key=dedupe_key)
+    assert created
+    return job
+
+
+def test_resumed_post_transcription_jobs_skip_admission(queue):
+    add(queue, "new-recording")
+    add(queue, "resume-transcribe")
+    queue.requeue("resume-transcribe", resume_stage=TRANSCRIBING)
+
+    asked = []
+    pool = WorkerPool(queue, handler=None, size=1, admit=lambda source: asked.append(source) or False)
+
+    job = pool._claim()
+    assert job["job_id"] == "resume-transcribe" and job["state"] == JOINING
+    assert asked == []
+
+    # Nothing left that can start without room for a recorder
+    assert pool._claim() is None
+    assert asked == [ADHOC, SCHEDULED]
+
+
+def test_resume_from_transcoding_still_waits_for_admission(queue):
+    add(queue, "resume-transcode")
+    queue.requeue("resume-transcode", resume_stage=TRANSCODING)
+    pool = WorkerPool(queue, handler=None, size=1, admit=lambda source: False)
+    assert pool._claim() is None
+
+    queue.requeue("resume-transcode", resume_stage=SUMMARIZING)
+    assert pool._claim()["job_id"] == "resume-transcode"
+
+
+def test_worker_pool_defers_jobs_while_admission_refuses(queue):
+    add(queue, "adhoc-1")
+    add(queue, "scheduled-1", source=SCHEDULED)
+    room = {"adhoc": False, "scheduled": False}
+    handled = []
+
+    async def handler(job):
+        handled.append(job["job_id"])
+        queue.set_state(job["job_id"], FAILED)
+
+    async def scenario():
+        pool = WorkerPool(queue, handler, size=1, poll_interval=0.05, admit=lambda source: room[source])
+        pool.start()
+        await asyncio.sleep(0.2)
+        assert handled == []
+
+        room["scheduled"] = True
+        pool.notify()
+        await asyncio.sleep(0.2)
+        assert handled == ["scheduled-1"]
+
+        room["adhoc"] = True
+        pool.notify()
+        await asyncio.sleep(0.2)
+        for task in pool._tasks:
+            task.cancel()
+
+    asyncio.run(scenario())
+    assert handled == ["scheduled-1", "adhoc-1"]
+
+
+def test_claims_scheduled_jobs_first_then_oldest(queue):
+    add(queue, "adhoc-1")
+    add(queue, "scheduled-1", source=SCHEDULED)
+    add(queue, "adhoc-2")
+    add(queue, "scheduled-2", source=SCHEDULED)
+
+    claimed = [queue.claim_next()["job_id"] for _ in range(4)]
+    assert claimed == ["scheduled-1", "scheduled-2", "adhoc-1", "adhoc-2"]
+    assert queue.claim_next() is None
+
+    job = queue.get("adhoc-1")
+    assert job["state"] == JOINING and job["attempts"] == 1
+
+
+def test_claim_next_can_be_limited_to_a_source(queue):
+    add(queue, "scheduled-1", source=SCHEDULED)
+    add(queue, "adhoc-1")
+    assert queue.claim_next(source=ADHOC)["job_id"] == "adhoc-1"
+    assert queue.claim_next(source=ADHOC) is None
+
+
+def test_same_work_is_not_queued_twice_while_in_flight(queue):
+    add(queue, "first", dedupe_key="task-1")
+    job, created = queue.enqueue("second", "https://meet.google.com/second", "task", "user", dedupe_key="task-1")
+    assert not created and job["job_id"] == "first"
+
+    queue.set_state("first", DONE)
+    add(queue, "second", dedupe_key="task-1")
+    assert queue.in_flight("task-1")["job_id"] == "second"
+
+
+def test_requeue_resumes_from_the_given_stage(queue):
+    add(queue, "job-1")
+    queue.claim_next()
+    queue.set_state("job-1", FAILED, error="ffmpeg crashed")
+
+    queue.requeue("job-1", resume_stage=TRANSCODING)
+    job = queue.get("job-1")
+    assert (job["state"], job["resume_stage"], job["error"]) == (QUEUED, TRANSCODING, None)
+
+    job = queue.claim_next()
+    assert job["job_id"] == "job-1" and job["attempts"] == 2
+
+
+def test_requeue_interrupted_remembers_where_each_job_stopped(queue):
+    for job_id, state in (("recording", RECORDING), ("summarizing", SUMMARIZING), ("done", DONE)):
+        add(queue, job_id)
+        queue.set_state(job_id, state)
+    add(queue, "waiting")
+
+    assert queue.requeue_interrupted() == 2
+    states = {job["job_id"]: (job["state"], job["resume_stage"]) for job in queue.list_jobs()}
+    assert states == {
+        "recording": (QUEUED, RECORDING),
+        "summarizing": (QUEUED, SUMMARIZING),
+        "done": (DONE, None),
+        "waiting": (QUEUED, None),
+    }
+    assert queue.depth() == 3
+
+
+def test_cancel_only_affects_jobs_no_worker_has_taken(queue):
+    add(queue, "taken")
+    add(queue, "waiting")
+    queue.claim_next()
+
+    assert not queue.cancel("taken")
+    assert queue.cancel("waiting", error="meeting cancelled")
+    job = queue.get("waiting")
+    assert (job["state"], job["error"]) == (FAILED, "meeting cancelled")
+    assert queue.claim_next() is None
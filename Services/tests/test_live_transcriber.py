@@ -0,0 +1,120 @@
+import array
+import io
+import json
+import os
+import time
+import wave
+
+from live_transcriber import (
+    CHUNKS_DIR, LIVE_STATE_FILE, LiveTranscriber, _write_with_overlap, load_live_transcript
+)
+from media import CHUNK_PATTERN
+from transcription import HTTPBackend
+
+RATE = 100
+CHUNK_SECONDS = 4
+
+
+def write_chunk(path, first_second, seconds=CHUNK_SECONDS):
+    """A WAV whose every sample in second n holds the value n, so seconds can be told apart"""
+    samples = array.array("h", [n for n in range(first_second, first_second + seconds) for _ in range(RATE)])
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(RATE)
+        f.writeframes(samples.tobytes())
+
+
+def seconds_heard(data):
+    """The second numbers in a WAV, one per second of audio"""
+    with wave.open(io.BytesIO(data), "rb") as f:
+        samples = array.array("h", f.readframes(f.getnframes()))
+    return [samples[i] for i in range(0, len(samples), RATE)]
+
+
+def stt_server(backend_stub, fail_seconds=()):
+    """Stand-in STT service answering one word per second of audio it receives"""
+    def transcribe(request):
+        heard = seconds_heard(request["body"])
+        if fail_seconds and set(heard) & set(fail_seconds):
+            return 500, {"message": "engine failed"}
+        return 200, {"transcript": " ".join(f"w{n}" for n in heard)}
+    backend_stub.route("POST", "/transcribe", transcribe)
+    return HTTPBackend(url=backend_stub.url + "/transcribe", timeout=10)
+
+
+def chunk_path(recordings_dir, index):
+    return recordings_dir / CHUNKS_DIR / (CHUNK_PATTERN % index)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.02)
+
+
+def test_overlap_is_taken_from_the_end_of_the_previous_chunk(tmp_path):
+    write_chunk(tmp_path / "a.wav", 0)
+    write_chunk(tmp_path / "b.wav", 4)
+
+    _write_with_overlap(str(tmp_path / "a.wav"), str(tmp_path / "b.wav"), str(tmp_path / "out.wav"), 2)
+    assert seconds_heard((tmp_path / "out.wav").read_bytes()) == [2, 3, 4, 5, 6, 7]
+
+    _write_with_overlap(None, str(tmp_path / "a.wav"), str(tmp_path / "first.wav"), 2)
+    assert seconds_heard((tmp_path / "first.wav").read_bytes()) == [0, 1, 2, 3]
+
+
+def test_chunks_are_transcribed_as_they_close_and_stitched(tmp_path, backend_stub):
+    recordings_dir = tmp_path / "recordings"
+    live = LiveTranscriber(str(recordings_dir), backend=stt_server(backend_stub), overlap_seconds=1,
+                           poll_interval=0.05)
+    live.start()
+
+    # ffmpeg is still writing chunk 0 until chunk 1 appears
+    write_chunk(chunk_path(recordings_dir, 0), 0)
+    time.sleep(0.2)
+    assert live.next_chunk == 0 and backend_stub.requests == []
+
+    write_chunk(chunk_path(recordings_dir, 1), 4)
+    wait_until(lambda: live.next_chunk == 1)
+    assert live.transcript == "w0 w1 w2 w3"
+    assert load_live_transcript(str(recordings_dir)) is None
+
+    # The last chunk closes when recording stops
+    write_chunk(chunk_path(recordings_dir, 2), 8, seconds=2)
+    transcript = live.finish(timeout=5)
+
+    assert transcript == " ".join(f"w{n}" for n in range(10))
+    assert load_live_transcript(str(recordings_dir)) == transcript
+    # Each chunk after the first was sent with the previous chunk's last second
+    assert [seconds_heard(request["body"])[0] for request in backend_stub.requests] == [0, 3, 7]
+    assert not [name for name in os.listdir(recordings_dir / CHUNKS_DIR) if name.startswith("overlap_")]
+
+
+def test_failed_chunks_leave_the_live_transcript_unused(tmp_path, backend_stub):
+    recordings_dir = tmp_path / "recordings"
+    live = LiveTranscriber(str(recordings_dir), backend=stt_server(backend_stub, fail_seconds=(5,)),
+                           overlap_seconds=0)
+    write_chunk(chunk_path(recordings_dir, 0), 0)
+    write_chunk(chunk_path(recordings_dir, 1), 4)
+    live.start()
+    live.finish(timeout=5)
+
+    with open(recordings_dir / "transcripts" / LIVE_STATE_FILE) as f:
+        state = json.load(f)
+    assert state == {"chunks_transcribed": 2, "failed_chunks": [1], "complete": True}
+    # Chunk 1 was tried twice before being given up
+    assert len(backend_stub.requests) == 3
+    assert load_live_transcript(str(recordings_dir)) is None
+
+
+def test_http_backend_posts_the_audio_file(tmp_path, backend_stub):
+    write_chunk(tmp_path / "meeting.wav", 0, seconds=2)
+    backend = stt_server(backend_stub)
+
+    assert backend.transcribe(str(tmp_path / "meeting.wav")) == "w0 w1"
+    [request] = backend_stub.requests
+    assert request["headers"]["Content-Type"] in ("audio/x-wav", "audio/wav")
+    assert backend.cache_id == f"http:{backend_stub.url}/transcribe"
@@ -0,0 +1,109 @@
+import json
+import subprocess
+
+import pytest
+
+import media
+from media import AUDIO_FILE, CAPTURE_MODES, VIDEO_FILE, build_capture_command, expected_outputs, verify_media
+
+
+def outputs(cmd):
+    """(format, path) of each ffmpeg output, in order; the path is the last argument before the next -map"""
+    found = []
+    for i, arg in enumerate(cmd):
+        if arg == "-f" and cmd[i + 1] not in ("pulse", "x11grab"):
+            end = cmd.index("-map", i) if "-map" in cmd[i:] else len(cmd)
+            found.append((cmd[i + 1], cmd[end - 1]))
+    return found
+
+
+def option(cmd, name):
+    return [cmd[i + 1] for i, arg in enumerate(cmd) if arg == name]
+
+
+def test_audio_mode_captures_only_the_monitor(tmp_path):
+    cmd = build_capture_command("audio", ":100", "MeetingOutput_0.monitor", str(tmp_path))
+    assert "x11grab" not in cmd and "libx264" not in cmd
+    assert option(cmd, "-i") == ["MeetingOutput_0.monitor"]
+    assert outputs(cmd) == [("ogg", str(tmp_path / AUDIO_FILE))]
+    assert option(cmd, "-c:a") == ["libopus"] and option(cmd, "-ar") == ["16000"]
+
+
+@pytest.mark.parametrize("mode, framerate, video_codec_args", [
+    ("video", "30", []),
+    ("audio_lowres", "2", ["scale=640:-2"]),
+])
+def test_video_modes_write_the_video_and_an_audio_sidecar_in_one_pass(tmp_path, mode, framerate, video_codec_args):
+    cmd = build_capture_command(mode, ":100", "MeetingOutput_0.monitor", str(tmp_path))
+    assert option(cmd, "-i") == [":100", "MeetingOutput_0.monitor"]
+    assert option(cmd, "-framerate") == [framerate]
+    assert option(cmd, "-vf") == video_codec_args
+    assert outputs(cmd) == [("mp4", str(tmp_path / VIDEO_FILE)), ("ogg", str(tmp_path / AUDIO_FILE))]
+    # The sidecar takes the audio input only
+    assert option(cmd, "-map") == ["0:v", "1:a", "1:a"]
+
+
+@pytest.mark.parametrize("mode, audio_input", [("audio", "0:a"), ("video", "1:a"), ("audio_lowres", "1:a")])
+def test_live_chunks_are_cut_from_the_audio_input(tmp_path, mode, audio_input):
+    cmd = build_capture_command(mode, ":100", "monitor", str(tmp_path), live_chunks_dir=str(tmp_path / "chunks"),
+                                chunk_seconds=15)
+    assert option(cmd, "-map")[-1] == audio_input
+    assert option(cmd, "-segment_time") == ["15"]
+    assert outputs(cmd)[-1] == ("segment", str(tmp_path / "chunks" / "chunk_%05d.wav"))
+
+
+def test_unknown_modes_are_rejected(tmp_path):
+    assert "hologram" not in CAPTURE_MODES
+    with pytest.raises(ValueError):
+        build_capture_command("hologram", ":100", "monitor", str(tmp_path))
+
+
+def test_each_mode_expects_an_audio_file_and_video_modes_a_video_too(tmp_path):
+    assert expected_outputs("audio", str(tmp_path)) == [(str(tmp_path / AUDIO_FILE), ("audio",))]
+    for mode in ("video", "audio_lowres"):
+        assert expected_outputs(mode, str(tmp_path)) == [
+            (str(tmp_path / AUDIO_FILE), ("audio",)), (str(tmp_path / VIDEO_FILE), ("video", "audio")),
+        ]
+
+
+def fake_ffprobe(monkeypatch, returncode=0, duration="12.5", streams=("video", "audio"), stderr=""):
+    """Answer ffprobe without running it; returns the commands it was asked"""
+    asked = []
+
+    def run(cmd, **kwargs):
+        asked.append(cmd)
+        info = {"format": {"duration": duration}, "streams": [{"codec_type": kind} for kind in streams]}
+        return subprocess.CompletedProcess(cmd, returncode, stdout=json.dumps(info), stderr=stderr)
+
+    monkeypatch.setattr(media.subprocess, "run", run)
+    return asked
+
+
+def test_verify_media_accepts_a_finished_recording(tmp_path, monkeypatch):
+    path = tmp_path / VIDEO_FILE
+    path.write_bytes(b"mp4")
+    asked = fake_ffprobe(monkeypatch)
+    assert verify_media(str(path), ("video", "audio"))
+    # Only the container is read, no frames are decoded
+    assert asked[0][0] == "ffprobe" and "format=duration:stream=codec_type" in asked[0]
+
+
+@pytest.mark.parametrize("probe", [
+    {"returncode": 1, "stderr": "moov atom not found"},
+    {"duration": "0"},
+    {"duration": None},
+    {"streams": ("audio",)},
+])
+def test_verify_media_rejects_unfinished_or_incomplete_recordings(tmp_path, monkeypatch, probe):
+    path = tmp_path / VIDEO_FILE
+    path.write_bytes(b"mp4")
+    fake_ffprobe(monkeypatch, **probe)
+    assert not verify_media(str(path), ("video", "audio"))
+
+
+def test_verify_media_does_not_probe_missing_or_empty_files(tmp_path, monkeypatch):
+    asked = fake_ffprobe(monkeypatch)
+    (tmp_path / AUDIO_FILE).write_bytes(b"")
+    assert not verify_media(str(tmp_path / AUDIO_FILE))
+    assert not verify_media(str(tmp_path / "missing.ogg"))
+    assert asked == []
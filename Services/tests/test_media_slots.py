@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+import media_slots
+from media_slots import MediaSlot
+
+
+@pytest.fixture
+def slots(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_slots, "SLOT_DIR", str(tmp_path / "slots"))
+    # Display numbers no X server on this host uses
+    monkeypatch.setattr(media_slots, "BASE_DISPLAY", 58000)
+    monkeypatch.setattr(media_slots, "MAX_SLOTS", 3)
+    return media_slots
+
+
+def test_each_recording_gets_its_own_display_and_sinks(slots):
+    first, second = MediaSlot.acquire(), MediaSlot.acquire()
+    try:
+        assert (first.index, second.index) == (0, 1)
+        assert second.env() == {"DISPLAY": ":58001", "PULSE_SINK": "MeetingOutput_1",
+                                "PULSE_SOURCE": "MeetingOutput_1.monitor"}
+        assert (second.mic_sink, second.virtual_mic) == ("MicOutput_1", "VirtualMic_1")
+    finally:
+        first.release()
+
+    # A released slot is handed out again; held ones are not
+    third = MediaSlot.acquire()
+    assert third.index == 0
+    third.release()
+    second.release()
+
+
+def test_displays_owned_by_another_x_server_are_skipped(slots):
+    x_lock = "/tmp/.X58000-lock"
+    open(x_lock, "w").close()
+    try:
+        slot = MediaSlot.acquire()
+        assert slot.display == ":58001"
+        slot.release()
+    finally:
+        os.remove(x_lock)
+
+
+def test_acquire_fails_when_every_slot_is_taken(slots):
+    held = [MediaSlot.acquire() for _ in range(3)]
+    with pytest.raises(RuntimeError, match="all 3 in use"):
+        MediaSlot.acquire()
+    for slot in held:
+        slot.release()
+
+
+def test_setup_unloads_modules_left_by_a_dead_recorder_and_release_undoes_it(slots, monkeypatch):
+    calls = []
+    modules = iter(["31", "32", "33", "34"])
+
+    def pactl(*args):
+        calls.append(args)
+        if args[:2] == ("list", "short"):
+            return ("7\tmodule-null-sink\tsink_name=MeetingOutput_1\n"
+                    "8\tmodule-null-sink\tsink_name=MeetingOutput_10\n"
+                    "9\tmodule-loopback\tlatency_msec=1 source=MeetingOutput_1.monitor sink=MicOutput_1")
+        if args[0] == "load-module":
+            return next(modules)
+        return ""
+
+    monkeypatch.setattr(media_slots, "_pactl", pactl)
+    monkeypatch.setattr(media_slots, "ensure_pulseaudio", lambda: None)
+    slot = MediaSlot.lent(1)
+    slot.setup_audio()
+    assert [args[1] for args in calls if args[0] == "unload-module"] == ["7", "9"]
+    assert [args[1] for args in calls if args[0] == "load-module"] == [
+        "module-null-sink", "module-null-sink", "module-virtual-source", "module-loopback"
+    ]
+
+    calls.clear()
+    slot.release()
+    assert calls == [("unload-module", module) for module in ("34", "33", "32", "31")]
@@ -0,0 +1,69 @@
+import io
+import time
+
+import meeting_monitor
+from meeting_monitor import END_FLAG_JS, MeetingEndDetector
+
+
+class FakeDriver:
+    """Answers the end flag script from a list of results, repeating the last one"""
+
+    def __init__(self, flags):
+        self.flags = list(flags)
+        self.scripts = []
+
+    def execute_script(self, script, *args):
+        self.scripts.append(script)
+        if script != END_FLAG_JS:
+            return None
+        flag = self.flags.pop(0) if len(self.flags) > 1 else self.flags[0]
+        if isinstance(flag, Exception):
+            raise flag
+        return flag
+
+
+def wait(monkeypatch, driver, seconds=0.5):
+    monkeypatch.setattr(meeting_monitor, "FLAG_CHECK_INTERVAL", 0.01)
+    monkeypatch.setattr(meeting_monitor, "FALLBACK_CHECK_INTERVAL", 0.05)
+    detector = MeetingEndDetector(driver, "monitor", silence_timeout=0)
+    checks = []
+
+    def fallback_check():
+        checks.append(time.time())
+        return True
+
+    reason = detector.wait_for_end(time.time() + seconds, fallback_check)
+    return reason, checks
+
+
+def test_fallback_is_skipped_while_the_observer_answers(monkeypatch):
+    reason, checks = wait(monkeypatch, FakeDriver([False]))
+    assert reason == "maximum recording time reached" and checks == []
+
+    reason, checks = wait(monkeypatch, FakeDriver([False, False, True]))
+    assert reason == "end screen detected" and checks == []
+
+
+def test_fallback_runs_while_the_flag_cannot_be_read(monkeypatch):
+    reason, checks = wait(monkeypatch, FakeDriver([RuntimeError("page hung")]))
+    assert reason == "maximum recording time reached"
+    assert 3 <= len(checks) <= 10
+
+
+def watch(lines, timeout=300):
+    detector = MeetingEndDetector(None, "monitor", silence_timeout=timeout)
+    detector._silence_process = type("Process", (), {"stderr": io.StringIO("".join(lines))})()
+    detector._watch_silence()
+    return detector.reason
+
+
+def test_silence_ends_the_meeting_only_once_someone_was_heard():
+    # Silent since the bot joined: keep waiting
+    assert watch(["[silencedetect @ 0x1] silence_start: 0\n"]) is None
+    assert watch(["[silencedetect @ 0x1] silence_start: -0.0213\n"]) is None
+
+    # The room went quiet after people had spoken
+    assert watch(["[silencedetect @ 0x1] silence_start: 0\n",
+                  "[silencedetect @ 0x1] silence_end: 412.5 | silence_duration: 412.5\n",
+                  "[silencedetect @ 0x1] silence_start: 1800.2\n"]) == "no meeting audio for 300s"
+    assert watch(["[silencedetect @ 0x1] silence_start: 950.4\n"]) == "no meeting audio for 300s"
@@ -0,0 +1,114 @@
+import asyncio
+import datetime
+import time
+
+from backend_client import BackendClient
+from meeting_scheduler import DUE, PREWARM, MeetingScheduler
+
+FAR_FUTURE = time.time() + 10 * 24 * 3600
+
+
+def iso(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def meeting(task_id, start, updated_at="2026-01-01T00:00:00Z"):
+    return {
+        "taskId": task_id,
+        "google_meeting_link": f"https://meet.google.com/{task_id}",
+        "start_time": iso(start),
+        "end_time": iso(start + 3600),
+        "updatedAt": updated_at,
+    }
+
+
+class Records:
+    """Meeting records served by the stub, with an ETag that changes with them"""
+
+    def __init__(self, backend_stub, meetings):
+        self.meetings = meetings
+        self.version = 0
+        backend_stub.route("GET", "/meeting-records", self.respond)
+
+    def set(self, meetings):
+        self.meetings = meetings
+        self.version += 1
+
+    def respond(self, request):
+        etag = f'"v{self.version}"'
+        if request["headers"].get("If-None-Match") == etag:
+            return 304, None
+        since = request["query"].get("since")
+        return 200, [m for m in self.meetings if not since or m["updatedAt"] >= since], {"ETag": etag}
+
+
+def run_scheduler(backend_stub, scenario, **options):
+    async def run():
+        client = BackendClient(backend_stub.url, max_retries=0)
+        scheduler = MeetingScheduler(client, on_due=None, on_prewarm=lambda meeting: None,
+                                     prewarm_seconds=120, lead_seconds=60, **options)
+        try:
+            return await scenario(scheduler)
+        finally:
+            await client.close()
+    return asyncio.run(run())
+
+
+def fired(scheduler, now=FAR_FUTURE):
+    return [(kind, meeting["taskId"]) for kind, meeting in scheduler._pop_ready(now)]
+
+
+def test_meetings_are_armed_for_prewarm_and_start(backend_stub):
+    start = int(time.time()) + 3600
+    Records(backend_stub, [meeting("task-1", start), meeting("over", time.time() - 7200)])
+
+    async def scenario(scheduler):
+        assert await scheduler.sync(full=True)
+        assert sorted(when for when, *_ in scheduler._heap) == [start - 180, start - 60]
+        assert fired(scheduler, now=start - 100) == [(PREWARM, "task-1")]
+        assert fired(scheduler) == [(DUE, "task-1")]
+        # Fired once only, even if synced again
+        assert await scheduler.sync(full=True)
+        return fired(scheduler)
+
+    assert run_scheduler(backend_stub, scenario) == []
+
+
+def test_moved_meetings_fire_at_their_new_time_only(backend_stub):
+    start = int(time.time()) + 3600
+    records = Records(backend_stub, [meeting("task-1", start)])
+
+    async def scenario(scheduler):
+        await scheduler.sync(full=True)
+        moved = meeting("task-1", start + 1800, updated_at="2026-01-02T00:00:00Z")
+        records.set([moved])
+        await scheduler.sync()
+
+        # The entries armed for the old time are dropped when they come up
+        assert fired(scheduler, now=start) == []
+        assert fired(scheduler) == [(PREWARM, "task-1"), (DUE, "task-1")]
+
+    run_scheduler(backend_stub, scenario)
+    # The incremental sync asked only for records changed since the last one seen
+    assert backend_stub.requests[-1]["query"] == {"since": "2026-01-01T00:00:00Z"}
+
+
+def test_deleted_meetings_are_disarmed_by_the_next_full_sync(backend_stub):
+    start = int(time.time()) + 3600
+    records = Records(backend_stub, [meeting("task-1", start), meeting("task-2", start)])
+
+    async def scenario(scheduler):
+        await scheduler.sync(full=True)
+        # Unchanged records are not read again
+        assert await scheduler.sync(full=True)
+        assert len(scheduler._meetings) == 2
+
+        records.set([meeting("task-2", start)])
+        await scheduler.sync()
+        assert "task-1" in scheduler._meetings
+        await scheduler.sync(full=True)
+        assert list(scheduler._meetings) == ["task-2"]
+        return fired(scheduler)
+
+    assert run_scheduler(backend_stub, scenario) == [(PREWARM, "task-2"), (DUE, "task-2")]
+    assert backend_stub.requests[1]["headers"]["If-None-Match"] == '"v0"'
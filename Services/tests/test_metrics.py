@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+import metrics
+from metrics import Counter, Gauge, Histogram
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """A registry of its own, so the test's metrics are not served by the app"""
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    return metrics.REGISTRY
+
+
+def test_render_uses_the_prometheus_text_format(registry):
+    failures = Counter("test_failures_total", "Stages that raised", ["stage"])
+    failures.inc(stage="transcribe")
+    failures.inc(2, stage="transcribe")
+    failures.inc(stage='say "hi"\\now')
+    Gauge("test_queue_depth", "Jobs waiting", collect=lambda: 3)
+    Gauge("test_rss_bytes", "Memory", ["process"], collect=lambda: {("ffmpeg",): 10, ("Xvfb",): 20})
+
+    assert metrics.render() == "\n".join([
+        "# HELP test_failures_total Stages that raised",
+        "# TYPE test_failures_total counter",
+        'test_failures_total{stage="transcribe"} 3',
+        'test_failures_total{stage="say \\"hi\\"\\\\now"} 1',
+        "# HELP test_queue_depth Jobs waiting",
+        "# TYPE test_queue_depth gauge",
+        "test_queue_depth 3",
+        "# HELP test_rss_bytes Memory",
+        "# TYPE test_rss_bytes gauge",
+        'test_rss_bytes{process="ffmpeg"} 10',
+        'test_rss_bytes{process="Xvfb"} 20',
+    ]) + "\n"
+
+
+def test_histograms_render_cumulative_buckets_sum_and_count(registry):
+    seconds = Histogram("test_stage_seconds", "Stage durations", ["stage"], buckets=(10, 1, 5))
+    for value in (0.5, 3, 7, 30):
+        seconds.observe(value, stage="audio")
+
+    lines = seconds.render().splitlines()
+    assert lines[1] == "# TYPE test_stage_seconds histogram"
+    assert lines[2:] == [
+        'test_stage_seconds_bucket{stage="audio",le="1"} 1',
+        'test_stage_seconds_bucket{stage="audio",le="5"} 2',
+        'test_stage_seconds_bucket{stage="audio",le="10"} 3',
+        'test_stage_seconds_bucket{stage="audio",le="+Inf"} 4',
+        'test_stage_seconds_sum{stage="audio"} 40.5',
+        'test_stage_seconds_count{stage="audio"} 4',
+    ]
+
+
+def test_timed_blocks_are_observed_even_when_they_raise(registry):
+    seconds = Histogram("test_operation_seconds", "Operations", ["operation"])
+    with pytest.raises(RuntimeError):
+        with seconds.time(operation="minutes"):
+            raise RuntimeError("quota")
+    assert 'test_operation_seconds_count{operation="minutes"} 1' in seconds.render()
+
+
+def test_labels_must_match_and_failing_collectors_render_nothing(registry):
+    counter = Counter("test_retries_total", "Retries", ["reason"])
+    with pytest.raises(ValueError):
+        counter.inc(stage="audio")
+
+    def broken():
+        raise OSError("no /proc")
+
+    Gauge("test_broken", "Broken", collect=broken)
+    assert metrics.render().endswith("# TYPE test_broken gauge\n")
+
+
+def test_child_process_usage_includes_this_process_when_asked():
+    with open(f"/proc/{os.getpid()}/comm") as f:
+        name = f.read().strip()
+
+    cpu_seconds, rss_bytes = metrics.child_process_usage(os.getpid(), include_root=True)[name]
+    assert cpu_seconds > 0 and rss_bytes > 0
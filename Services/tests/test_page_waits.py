@@ -0,0 +1,48 @@
+from selenium.webdriver.common.by import By
+
+from page_waits import (
+    DENIED, IN_CALL, JOIN_BUTTON_XPATH, LEAVE_BUTTON_SELECTOR, WAITING, admission_decided, lobby_state
+)
+
+
+class FakeElement:
+    def __init__(self, text=""):
+        self.text = text
+
+    def is_displayed(self):
+        return True
+
+
+class FakeDriver:
+    """A page with the given body text, showing the join and/or leave buttons"""
+
+    def __init__(self, text="", join_button=False, leave_button=False):
+        self.text = text
+        self.visible = set()
+        if join_button:
+            self.visible.add((By.XPATH, JOIN_BUTTON_XPATH))
+        if leave_button:
+            self.visible.add((By.CSS_SELECTOR, LEAVE_BUTTON_SELECTOR))
+
+    def find_elements(self, by, selector):
+        return [FakeElement()] if (by, selector) in self.visible else []
+
+    def find_element(self, by, selector):
+        return FakeElement(self.text)
+
+
+def test_recognised_english_states():
+    assert lobby_state(FakeDriver(leave_button=True)) == IN_CALL
+    assert lobby_state(FakeDriver("Asking to be let in...")) == WAITING
+    assert lobby_state(FakeDriver("Someone in the call denied your request to join")) == DENIED
+
+
+def test_join_button_gone_without_lobby_message_counts_as_in_call():
+    # e.g. a Meet UI in another language, where neither phrases nor the leave label match
+    assert lobby_state(FakeDriver("Anrufen beitreten")) == IN_CALL
+    assert admission_decided(FakeDriver("")) == IN_CALL
+
+
+def test_unknown_while_join_button_is_still_shown():
+    assert lobby_state(FakeDriver("Ready to join?", join_button=True)) is None
+    assert admission_decided(FakeDriver("Asking to be let in", join_button=True)) is False
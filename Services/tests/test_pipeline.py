@@ -0,0 +1,77 @@
+import asyncio
+import os
+
+from backend_client import BackendClient, Outbox
+from pipeline import Pipeline
+
+RESULTS = ("raw_transcript.txt", "adjusted_transcript.txt", "meeting_minutes_and_tasks.txt")
+
+
+def processed_pipeline(tmp_path, deliver, is_queued=None):
+    """A pipeline whose recording has been transcribed and summarized, leaving only delivery"""
+    pipeline = Pipeline("rec-1", "task-1", "user", deliver=deliver, storage_root=str(tmp_path),
+                        is_queued=is_queued)
+    for stage, names in (("audio", ()), ("transcribe", RESULTS[:1]), ("summarize", RESULTS[1:])):
+        files = [pipeline._write(name, name) for name in names]
+        pipeline._update_stage(stage, status="done", files=files)
+    return pipeline
+
+
+def test_queued_delivery_is_done_only_once_the_outbox_delivers_it(tmp_path):
+    queued = {"entry-1"}
+    sent = []
+
+    def deliver(**kwargs):
+        sent.append(kwargs)
+        return {"success": False, "queued": True, "outbox_id": "entry-1"}
+
+    pipeline = processed_pipeline(tmp_path, deliver, is_queued=queued.__contains__)
+    pipeline.run()
+    assert sent[0]["recording_id"] == "rec-1"
+    assert pipeline.delivery_pending() and "deliver" not in pipeline.completed_stages()
+
+    # Resuming while the entry is still in the outbox does not send the results again
+    resumed = processed_pipeline(tmp_path, deliver, is_queued=queued.__contains__)
+    resumed.run()
+    assert len(sent) == 1 and resumed.delivery_pending()
+
+    assert not resumed.settle_delivery("entry-2", True)
+    assert resumed.settle_delivery("entry-1", True)
+    assert resumed.completed_stages() == ["audio", "transcribe", "summarize", "deliver"]
+
+
+def test_rejected_delivery_fails_the_stage(tmp_path):
+    pipeline = processed_pipeline(tmp_path, lambda **kwargs: {"queued": True, "outbox_id": "entry-1"})
+    pipeline.run()
+    assert pipeline.settle_delivery("entry-1", False, error="rejected")
+    entry = pipeline.manifest["stages"]["deliver"]
+    assert entry["status"] == "failed" and entry["error"] == "rejected"
+
+
+def test_has_recording(tmp_path):
+    pipeline = Pipeline("rec-1", "task-1", "user", deliver=None, storage_root=str(tmp_path))
+    assert not pipeline.has_recording()
+    with open(os.path.join(pipeline.recordings_dir, "meeting.mp4"), "wb") as f:
+        f.write(b"video")
+    assert pipeline.has_recording()
+
+
+def test_outbox_reports_each_settled_entry(tmp_path, backend_stub):
+    backend_stub.route("POST", "/accepted", lambda request: (200, {}))
+    backend_stub.route("POST", "/rejected", lambda request: (400, {"message": "bad"}))
+    settled = []
+
+    async def scenario():
+        client = BackendClient(backend_stub.url, max_retries=0)
+        outbox = Outbox(client, directory=str(tmp_path / "outbox"),
+                        on_settled=lambda entry, delivered, status: settled.append(
+                            (entry["meta"]["recording_id"], delivered, status)))
+        accepted = outbox.add("POST", "/accepted", {}, meta={"recording_id": "rec-1"})
+        outbox.add("POST", "/rejected", {}, meta={"recording_id": "rec-2"})
+        assert outbox.has(accepted)
+        await outbox.flush()
+        assert not outbox.has(accepted) and outbox.pending() == []
+        await client.close()
+
+    asyncio.run(scenario())
+    assert sorted(settled) == [("rec-1", True, 200), ("rec-2", False, 400)]
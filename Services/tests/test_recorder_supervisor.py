@@ -0,0 +1,115 @@
+import asyncio
+import shutil
+import textwrap
+
+import pytest
+
+import recorder_supervisor
+from recorder_supervisor import RecorderSupervisor
+
+# Stands in for metamate in the worker process, so no browser is started
+FAKE_RECORDER = textwrap.dedent('''
+    import asyncio
+    import os
+    import threading
+
+    class MeetRecorder:
+        def __init__(self, meeting_link, job_id, capture_mode, on_event=None):
+            self.meeting_link = meeting_link
+            self.job_id = job_id
+            self.on_event = on_event
+            self.phase = "starting"
+            self.end_reason = None
+            self._stop = threading.Event()
+
+        def request_stop(self, reason):
+            self.end_reason = reason
+            self._stop.set()
+
+        def status(self):
+            return {"job_id": self.job_id, "phase": self.phase, "display": os.environ.get("DISPLAY")}
+
+    async def run_recorder(recorder):
+        print(f"Joining {recorder.meeting_link}")
+        # Child processes write straight to fd 1, which the worker points at stderr
+        os.system("echo from a child process")
+        recorder.phase = "recording"
+        recorder.on_event({"event": "recording_started"})
+        if recorder.meeting_link == "crash":
+            raise RuntimeError("chrome died")
+        if recorder.meeting_link == "exit":
+            os._exit(3)
+        await asyncio.to_thread(recorder._stop.wait, 10)
+        return True
+''')
+
+
+@pytest.fixture
+def worker_script(tmp_path, monkeypatch):
+    """recorder_worker.py run next to the stand-in recorder"""
+    shutil.copy(recorder_supervisor.WORKER_SCRIPT, tmp_path / "recorder_worker.py")
+    (tmp_path / "metamate.py").write_text(FAKE_RECORDER)
+    monkeypatch.setattr(recorder_supervisor, "WORKER_SCRIPT", str(tmp_path / "recorder_worker.py"))
+
+
+def record(meeting_link, during=None):
+    """Record in a supervised worker; during(supervisor) runs once recording has started"""
+    lines, events = [], []
+
+    async def scenario():
+        supervisor = RecorderSupervisor(spares=1)
+        supervisor.start()
+        started = asyncio.Event()
+
+        def on_event(event):
+            events.append(event)
+            started.set()
+
+        recording = asyncio.create_task(supervisor.record(
+            "job-1", meeting_link, "audio", {"DISPLAY": ":101"},
+            on_line=lambda label, line: lines.append((label, line)), on_event=on_event,
+        ))
+        await asyncio.wait_for(started.wait(), 30)
+        extra = await during(supervisor) if during else None
+        result = await asyncio.wait_for(recording, 30)
+        while supervisor._warming:
+            await asyncio.sleep(0.05)
+        spares = supervisor.idle_count()
+        await supervisor.close()
+        return result, extra, spares
+
+    result, extra, spares = asyncio.run(scenario())
+    return result, extra, spares, lines, events
+
+
+def test_worker_reports_progress_answers_status_and_stops_on_request(worker_script):
+    async def during(supervisor):
+        status = await supervisor.status("job-1")
+        assert supervisor.stop("job-1", "operator")
+        return status
+
+    result, status, spares, lines, events = record("https://meet.google.com/abc", during)
+    assert result == {"ok": True, "phase": "recording", "reason": "operator"}
+    # The job's env reached the worker before the recording started
+    assert status == {"job_id": "job-1", "phase": "recording", "display": ":101"}
+    assert events == [{"event": "recording_started"}]
+    assert ("STDOUT", "Joining https://meet.google.com/abc") in lines
+    assert ("STDERR", "from a child process") in lines
+    # A spare was warmed to replace the worker that took the job
+    assert spares == 1
+
+
+def test_recorder_errors_are_reported_as_the_result(worker_script):
+    result = record("crash")[0]
+    assert result == {"ok": False, "phase": "recording", "error": "RuntimeError: chrome died"}
+
+
+def test_a_worker_that_dies_without_a_result_still_reports_one(worker_script):
+    result = record("exit")[0]
+    assert result == {"ok": False, "phase": "recording_started", "error": "Recorder worker exited with code 3"}
+
+
+def test_stop_and_status_for_jobs_not_running_here():
+    supervisor = RecorderSupervisor(spares=0)
+    assert not supervisor.stop("job-1")
+    assert asyncio.run(supervisor.status("job-1")) is None
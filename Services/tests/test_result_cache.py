@@ -0,0 +1,67 @@
+import hashlib
+import os
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from audio_processor import summarize_transcript
+from result_cache import ResultCache, file_digest, text_digest
+
+
+def test_digests_cover_content_and_keep_parts_apart(tmp_path):
+    (tmp_path / "audio.ogg").write_bytes(b"opus" * 1000)
+    assert file_digest(str(tmp_path / "audio.ogg"), block_size=7) == hashlib.sha256(b"opus" * 1000).hexdigest()
+
+    assert text_digest("ab", "c") != text_digest("a", "bc")
+    assert text_digest("minutes", 0.5) == text_digest("minutes", "0.5")
+    assert text_digest("cleanup", "text") != text_digest("minutes", "text")
+
+
+def test_results_are_computed_once(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    computed = []
+
+    def compute():
+        computed.append(1)
+        return ["cleaned", "minutes"]
+
+    key = text_digest("parallel", "transcript")
+    assert cache.get_or_compute(key, compute) == ["cleaned", "minutes"]
+    assert cache.get_or_compute(key, compute) == ["cleaned", "minutes"]
+    assert len(computed) == 1
+    assert ResultCache(str(tmp_path / "cache")).get(key) == ["cleaned", "minutes"]
+    assert cache.get(text_digest("other")) is None
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=300)
+    keys = [text_digest(n) for n in range(3)]
+    for age, key in zip((300, 200, 100), keys):
+        cache.put(key, "x" * 90)
+        os.utime(cache._path(key), (0, os.path.getmtime(cache._path(key)) - age))
+
+    # Reading the oldest entry makes it the most recently used
+    assert cache.get(keys[0]) == "x" * 90
+    cache.put(text_digest("new"), "y" * 90)
+
+    # Three entries fit; the fourth pushes out only the one left unused longest
+    assert cache.get(keys[1]) is None
+    assert all(cache.get(key) is not None for key in (keys[0], keys[2], text_digest("new")))
+
+
+def test_summaries_are_reused_for_the_same_transcript_and_mode(tmp_path):
+    calls = []
+
+    def respond(prompt):
+        calls.append(prompt)
+        return AIMessage(content=f"reply {len(calls)}")
+
+    llm = RunnableLambda(respond)
+    cache = ResultCache(str(tmp_path / "cache"))
+    first = summarize_transcript("Alice: hello.", llm=llm, summary_mode="single", cache=cache)
+    assert summarize_transcript("Alice: hello.", llm=llm, summary_mode="single", cache=cache) == first
+    assert len(calls) == 2
+
+    summarize_transcript("Alice: hello.", llm=llm, summary_mode="parallel", cache=cache)
+    summarize_transcript("Alice: goodbye.", llm=llm, summary_mode="single", cache=cache)
+    assert len(calls) == 6
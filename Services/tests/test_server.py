@@ -0,0 +1,323 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from admission import Decision
+from backend_client import BackendClient, Outbox
+from claims import LocalClaims
+from job_index import JobIndex
+from job_queue import FAILED, QUEUED, SCHEDULED, JobQueue
+
+
+class FakeBrowserPool:
+    """Records reservations instead of launching Chrome"""
+
+    def __init__(self):
+        self.reserved = set()
+
+    def prewarm(self, key, timeout=None):
+        self.reserved.add(key)
+
+    def unreserve(self, key):
+        self.reserved.discard(key)
+
+    def idle_count(self):
+        return 0
+
+    def reserved_count(self):
+        return len(self.reserved)
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch, backend_stub):
+    """server.py run from a scratch directory with its own queue, claims and outbox, talking to the stub"""
+    monkeypatch.chdir(tmp_path)
+    import server
+
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    for owner, name in ((server, "job_queue"), (server.worker_pool, "queue"), (server.admission, "job_queue")):
+        monkeypatch.setattr(owner, name, queue)
+    backend = BackendClient(backend_stub.url, max_retries=0)
+    monkeypatch.setattr(server, "backend", backend)
+    monkeypatch.setattr(server, "outbox", Outbox(backend, directory=str(tmp_path / "outbox"),
+                                                 on_settled=server.delivery_settled))
+    monkeypatch.setattr(server, "claims", LocalClaims(str(tmp_path / "claims.db")))
+    monkeypatch.setattr(server, "job_index", JobIndex())
+    monkeypatch.setattr(server, "browser_pool", FakeBrowserPool())
+    return server
+
+
+def scheduled_meeting(task_id="task-1"):
+    return {"taskId": task_id, "google_meeting_link": f"https://meet.google.com/{task_id}", "username": "someone"}
+
+
+def test_scheduled_meeting_is_claimed_and_queued_for_its_warm_browser(server):
+    async def scenario():
+        await server.prewarm_for_meeting(scheduled_meeting())
+        assert server.browser_pool.reserved == {"task-1"}
+        return await server.start_scheduled_meeting(scheduled_meeting())
+
+    assert asyncio.run(scenario()) is None
+    [job] = server.job_queue.list_jobs()
+    assert (job["state"], job["source"], job["options"]["claim_key"]) == (QUEUED, SCHEDULED, "task-1")
+    # The reservation waits for the job to lease it
+    assert server.browser_pool.reserved == {"task-1"}
+
+    # Firing again while the job is queued neither queues it twice nor drops the reservation
+    asyncio.run(server.start_scheduled_meeting(scheduled_meeting()))
+    assert len(server.job_queue.list_jobs()) == 1
+    assert server.browser_pool.reserved == {"task-1"}
+
+
+def test_scheduled_meeting_held_elsewhere_gives_up_its_reservation(server):
+    async def scenario():
+        await server.claims.claim("task-1", "another-node", ttl=60)
+        server.browser_pool.prewarm("task-1")
+        return await server.start_scheduled_meeting(scheduled_meeting())
+
+    retry_at = asyncio.run(scenario())
+    assert retry_at is not None
+    assert server.job_queue.list_jobs() == [] and server.browser_pool.reserved == set()
+
+
+def test_reservation_is_dropped_when_the_recording_cannot_be_queued(server, monkeypatch):
+    def broken_enqueue(*args, **kwargs):
+        raise RuntimeError("queue unavailable")
+
+    monkeypatch.setattr(server, "enqueue_recording", broken_enqueue)
+    server.browser_pool.prewarm("task-1")
+    asyncio.run(server.start_scheduled_meeting(scheduled_meeting()))
+    assert server.browser_pool.reserved == set()
+
+
+def call(server, method, path, **kwargs):
+    """Send one request through Quart's test client; returns (status, JSON or text body, headers)"""
+    async def scenario():
+        response = await getattr(server.app.test_client(), method)(path, **kwargs)
+        if response.mimetype == "application/json":
+            body = await response.get_json()
+        else:
+            body = await response.get_data(as_text=True)
+        return response.status_code, body, response.headers
+    return asyncio.run(scenario())
+
+
+MEET_LINK = "https://meet.google.com/abc-defg-hij"
+
+
+def test_record_meeting_queues_each_link_once(server):
+    status, body, _ = call(server, "post", "/record_meeting",
+                           json={"google_meeting_link": MEET_LINK, "taskId": "task-1", "username": "someone"})
+    assert status == 200 and body["status"] == QUEUED
+    assert body["message"] == "Meeting recording has been queued"
+
+    status, again, _ = call(server, "post", "/record_meeting",
+                            json={"google_meeting_link": MEET_LINK, "taskId": "task-1", "username": "someone"})
+    assert status == 200 and again["recording_id"] == body["recording_id"]
+    assert again["message"] == "Meeting recording is already queued"
+    assert server.job_queue.get(body["recording_id"])["options"]["capture_mode"] == "video"
+
+
+def test_record_meeting_rejects_bad_requests(server):
+    assert call(server, "post", "/record_meeting", json={})[0] == 400
+    status, body, _ = call(server, "post", "/record_meeting",
+                           json={"google_meeting_link": MEET_LINK, "capture_mode": "hologram"})
+    assert status == 400 and "capture_mode" in body["error"]
+    assert server.job_queue.list_jobs() == []
+
+
+def test_record_meeting_answers_429_when_the_host_is_full(server, monkeypatch):
+    monkeypatch.setattr(server.admission, "check",
+                        lambda priority, request=False: Decision(False, "memory: not enough", 30))
+    status, body, headers = call(server, "post", "/record_meeting",
+                                 json={"google_meeting_link": MEET_LINK, "taskId": "task-1", "username": "someone"})
+    assert status == 429 and headers["Retry-After"] == "30"
+    assert body["reason"] == "memory: not enough"
+    assert server.job_queue.list_jobs() == []
+
+
+def test_jobs_lists_running_jobs_or_jobs_by_state(server):
+    def enqueue(task_id):
+        job, _ = server.enqueue_recording({"google_meeting_link": f"{MEET_LINK}-{task_id}", "taskId": task_id,
+                                           "username": "someone"})
+        return job["job_id"]
+
+    running, failed, queued = enqueue("task-1"), enqueue("task-2"), enqueue("task-3")
+    server.job_index.begin(server.job_queue.claim_next())
+    server.job_queue.claim_next()
+    server.job_queue.set_state(failed, FAILED, error="no audio")
+
+    status, body, _ = call(server, "get", "/jobs")
+    assert status == 200 and body["queued"] == 1
+    assert [job["job_id"] for job in body["jobs"]] == [running]
+
+    _, body, _ = call(server, "get", "/jobs?state=queued,failed")
+    assert [job["job_id"] for job in body["jobs"]] == [failed, queued]
+    _, body, _ = call(server, "get", "/jobs?state=queued,failed&limit=1")
+    assert [job["job_id"] for job in body["jobs"]] == [queued]
+    _, body, _ = call(server, "get", "/jobs?state=failed")
+    assert body["jobs"][0]["error"] == "no audio"
+
+    assert call(server, "get", "/jobs?state=paused")[0] == 400
+    assert call(server, "get", "/jobs?state=failed&limit=abc")[0] == 400
+
+
+def test_job_status_reports_pipeline_and_artifacts(server, tmp_path):
+    assert call(server, "get", "/jobs/unknown")[0] == 404
+
+    job, _ = server.enqueue_recording({"google_meeting_link": MEET_LINK, "taskId": "task-1", "username": "someone"})
+    recordings_dir = tmp_path / "storage" / job["job_id"] / "recordings"
+    recordings_dir.mkdir(parents=True)
+    (recordings_dir / "audio.ogg").write_bytes(b"x" * 10)
+
+    status, body, _ = call(server, "get", f"/jobs/{job['job_id']}")
+    assert status == 200
+    assert (body["state"], body["active"], body["pipeline"]) == (QUEUED, False, {})
+    assert body["artifacts"] == [{"path": "recordings/audio.ogg", "bytes": 10}]
+
+
+def test_metrics_are_served_as_prometheus_text(server):
+    server.enqueue_recording({"google_meeting_link": MEET_LINK, "taskId": "task-1", "username": "someone"})
+    status, body, headers = call(server, "get", "/metrics")
+    assert status == 200 and headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE metamate_queue_depth gauge" in body
+    assert "\nmetamate_queue_depth 1\n" in body
+
+
+def test_recording_logs_validate_the_line_count(server, tmp_path):
+    log_dir = tmp_path / "storage" / "rec-1"
+    log_dir.mkdir(parents=True)
+    (log_dir / "process.log").write_text("".join(f"line {n}\n" for n in range(5)))
+
+    status, body, _ = call(server, "get", "/recordings/rec-1/logs?lines=2")
+    assert status == 200 and body["lines"] == ["line 3", "line 4"]
+    assert len(call(server, "get", "/recordings/rec-1/logs")[1]["lines"]) == 5
+    for lines in ("abc", "0", "-3"):
+        assert call(server, "get", f"/recordings/rec-1/logs?lines={lines}")[0] == 400
+
+
+def queue_scheduled_job(server, task_id="task-1"):
+    assert server.start_recording_for_meeting(dict(scheduled_meeting(task_id), taskId=task_id))
+    return server.job_queue.claim_next()
+
+
+def test_scheduled_job_is_claimed_again_before_it_records(server, backend_stub, monkeypatch):
+    recorded = []
+
+    async def fake_recording(*args, **kwargs):
+        recorded.append(kwargs["reservation"])
+
+    monkeypatch.setattr(server, "run_recording_process", fake_recording)
+    job = queue_scheduled_job(server)
+    asyncio.run(server.run_job(job))
+    assert recorded == ["task-1"]
+    # The finished job deletes its meeting record and gives up the claim
+    assert len(backend_stub.calls("DELETE", "/delete-meeting-record/task-1")) == 1
+    assert asyncio.run(server.claims.claim("task-1", "another-node"))
+
+
+def test_scheduled_job_claimed_elsewhere_while_it_waited_is_not_recorded(server, backend_stub, monkeypatch):
+    monkeypatch.setattr(server, "run_recording_process", None)
+    monkeypatch.setattr(server, "lost_claims", set())
+    job = queue_scheduled_job(server)
+    server.browser_pool.prewarm("task-1")
+    # e.g. the node restarted after the claim lapsed and another node took the meeting
+    asyncio.run(server.claims.claim("task-1", "another-node"))
+
+    asyncio.run(server.run_job(job))
+    job = server.job_queue.get(job["job_id"])
+    assert (job["state"], job["error"]) == (FAILED, "Meeting is claimed by another node")
+    assert backend_stub.calls("DELETE", "/delete-meeting-record/task-1") == []
+    assert server.browser_pool.reserved == set() and server.lost_claims == set()
+    assert not asyncio.run(server.claims.claim("task-1", server.NODE_ID))
+
+
+class FakeSupervisor:
+    def __init__(self):
+        self.stopped = []
+
+    def stop(self, job_id, reason):
+        self.stopped.append((job_id, reason))
+        return True
+
+
+def test_lost_claim_cancels_queued_jobs_and_stops_recordings(server, monkeypatch):
+    monkeypatch.setattr(server, "recorder_supervisor", FakeSupervisor())
+    monkeypatch.setattr(server, "lost_claims", set())
+    recording = queue_scheduled_job(server, "task-1")
+    server.job_index.begin(recording)
+    queued, _ = server.enqueue_recording(dict(scheduled_meeting("task-2")), source=SCHEDULED,
+                                         dedupe_key=server.scheduled_dedupe_key("task-2"), claim_key="task-2")
+
+    asyncio.run(server.claim_lost("task-1"))
+    asyncio.run(server.claim_lost("task-2"))
+    assert server.recorder_supervisor.stopped == [(recording["job_id"], "claim lost to another node")]
+    assert server.lost_claims == {recording["job_id"]}
+    cancelled = server.job_queue.get(queued["job_id"])
+    assert cancelled["state"] == FAILED and "claim on the meeting was lost" in cancelled["error"]
+
+
+RESULTS = {
+    "raw_transcript": "Alice: hello everyone. " * 50,
+    "adjusted_transcript": "Alice: Hello, everyone.",
+    "meeting_minutes_and_tasks": "- Say hello",
+}
+
+
+def deliver(server, monkeypatch, **backend_options):
+    """send_to_api with a backend client of its own, on one event loop"""
+    async def scenario():
+        backend = BackendClient(server.backend.base_url, max_retries=0, **backend_options)
+        monkeypatch.setattr(server, "backend", backend)
+        try:
+            return await server.send_to_api(RESULTS, "someone", "task-1", recording_id="rec-1")
+        finally:
+            await backend.close()
+    return asyncio.run(scenario())
+
+
+def digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def test_delivery_by_reference_uploads_each_transcript_once(server, backend_stub, monkeypatch):
+    monkeypatch.setattr(server, "DELIVERY_BY_REFERENCE", True)
+    raw, adjusted = digest(RESULTS["raw_transcript"]), digest(RESULTS["adjusted_transcript"])
+    # The backend already has the raw transcript from an earlier attempt
+    backend_stub.route("HEAD", f"/transcripts/{raw}", lambda request: (200, None))
+    backend_stub.route("PUT", f"/transcripts/{adjusted}", lambda request: (200, {}))
+    backend_stub.route("POST", "/update-meeting-info", lambda request: (200, {"ok": True}))
+
+    assert deliver(server, monkeypatch, compress_min_bytes=400)["success"]
+    assert backend_stub.calls("PUT", f"/transcripts/{raw}") == []
+    [upload] = backend_stub.calls("PUT", f"/transcripts/{adjusted}")
+    assert upload["json"] == {"text": RESULTS["adjusted_transcript"]}
+
+    [post] = backend_stub.calls("POST", "/update-meeting-info")
+    assert post["json"] == {"username": "someone", "task_id": "task-1", "raw_transcript_ref": raw,
+                            "adjusted_transcript_ref": adjusted,
+                            "meeting_minutes_and_tasks": RESULTS["meeting_minutes_and_tasks"]}
+    # Without the transcripts inline, the post is small enough to go uncompressed
+    assert "Content-Encoding" not in post["headers"] and "Content-Encoding" not in upload["headers"]
+
+
+def test_transcripts_are_sent_inline_and_compressed_when_the_upload_fails(server, backend_stub, monkeypatch):
+    monkeypatch.setattr(server, "DELIVERY_BY_REFERENCE", True)
+    backend_stub.route("PUT", f"/transcripts/{digest(RESULTS['raw_transcript'])}",
+                       lambda request: (400, {"message": "too large"}))
+    backend_stub.route("POST", "/update-meeting-info", lambda request: (200, {"ok": True}))
+
+    assert deliver(server, monkeypatch, compress_min_bytes=400)["success"]
+    [post] = backend_stub.calls("POST", "/update-meeting-info")
+    assert post["headers"]["Content-Encoding"] == "gzip"
+    assert post["json"] == dict(RESULTS, username="someone", task_id="task-1")
+
+
+def test_delivery_waits_in_the_outbox_while_the_backend_is_overloaded(server, backend_stub, monkeypatch):
+    backend_stub.route("POST", "/update-meeting-info", lambda request: (503, {}))
+    result = deliver(server, monkeypatch)
+    assert result["queued"] and server.outbox.has(result["outbox_id"])
+    entry = server.outbox._load(result["outbox_id"])
+    assert entry["payload"]["raw_transcript"] == RESULTS["raw_transcript"]
+    assert entry["meta"] == {"recording_id": "rec-1"}
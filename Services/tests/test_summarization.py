@@ -0,0 +1,82 @@
+import threading
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from audio_processor import (
+    CLEANUP_PROMPT, _pack, build_minutes_chain, map_reduce_summarize, split_transcript, summarize_transcript
+)
+
+
+def fake_llm(calls):
+    """Chat model stand-in that answers each kind of prompt with a recognisable reply"""
+    def respond(prompt):
+        text = prompt.to_string() if hasattr(prompt, "to_string") else prompt
+        calls.append(text)
+        if text.startswith("You are cleaning up part"):
+            part = text.split("part ", 1)[1].split(" ", 1)[0]
+            return AIMessage(content=f"cleaned {part}")
+        if text.startswith("You are reading part"):
+            return AIMessage(content="notes")
+        if text.startswith("Write a brief, high-level summary"):
+            return AIMessage(content="- the summary")
+        if text.startswith("Merge the following notes"):
+            return AIMessage(content="merged notes")
+        return AIMessage(content="minutes and tasks")
+    return RunnableLambda(respond)
+
+
+def test_map_reduce_returns_one_summary_after_the_cleaned_chunks():
+    calls = []
+    llm = fake_llm(calls)
+    transcript = "\n".join(f"Speaker {i}: " + "word " * 20 for i in range(6))
+
+    adjusted, minutes = map_reduce_summarize(transcript, llm, build_minutes_chain(llm), chunk_chars=300)
+
+    assert minutes == "minutes and tasks"
+    assert adjusted == (
+        "Cleaned Transcript\n\ncleaned 1\n\ncleaned 2\n\ncleaned 3\n\nMinimal Summary\n\n- the summary"
+    )
+    assert sum(call.startswith("Write a brief, high-level summary") for call in calls) == 1
+    assert not any("Minimal Summary" in call for call in calls)
+
+
+def test_split_transcript_packs_whole_speaker_turns():
+    turns = ["Alice: hello everyone.", "Bob: hi.", "", "Carol: shall we start?"]
+    assert split_transcript("\n".join(turns), 40) == ["Alice: hello everyone.\nBob: hi.", "Carol: shall we start?"]
+
+
+def test_split_transcript_breaks_long_turns_at_sentences_then_words():
+    turn = "Alice: First point. Second point here! " + "word " * 20
+    chunks = split_transcript(turn, 30)
+
+    assert all(len(chunk) <= 30 for chunk in chunks)
+    assert chunks[:2] == ["Alice: First point.", "Second point here!"]
+    # Run-on text is cut between words, never inside one
+    assert " ".join(chunks).split() == turn.split()
+
+
+def test_pack_is_greedy_and_keeps_oversized_units_whole():
+    assert _pack(["aa", "bb", "cc"], 5) == ["aa\nbb", "cc"]
+    assert _pack(["a" * 8, "b"], 5) == ["a" * 8, "b"]
+    assert _pack(["x", "y"], 3, separator=" ") == ["x y"]
+    assert _pack([], 5) == []
+
+
+def test_parallel_mode_cleans_and_drafts_minutes_at_the_same_time():
+    prompts = []
+    # Each call waits for the other, so running them one after the other would time out
+    both_started = threading.Barrier(2, timeout=5)
+
+    def respond(prompt):
+        text = prompt.to_string() if hasattr(prompt, "to_string") else prompt
+        prompts.append(text)
+        both_started.wait()
+        return AIMessage(content="cleaned" if text.startswith(CLEANUP_PROMPT) else "minutes")
+
+    adjusted, minutes = summarize_transcript("Alice: hello. Bob: bye.", llm=RunnableLambda(respond),
+                                             summary_mode="parallel", cache=None)
+    assert (adjusted, minutes) == ("cleaned", "minutes")
+    # The minutes are drafted from the raw transcript rather than the cleaned one
+    [minutes_prompt] = [text for text in prompts if not text.startswith(CLEANUP_PROMPT)]
+    assert "Alice: hello. Bob: bye." in minutes_prompt
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+
+import pytest
+
+import tracing
+from tracing import PARENT_SPAN_ENV, Tracer, load_trace
+
+
+def spans_by_name(tmp_path, job_id="job-1"):
+    return {span["name"]: span for span in load_trace(job_id, storage_root=str(tmp_path))}
+
+
+def test_spans_nest_and_record_errors(tmp_path):
+    tracer = Tracer("job-1", storage_root=str(tmp_path))
+    with tracer.span("job") as job_span:
+        with tracer.span("recording", capture_mode="audio") as recording_span:
+            assert tracer.env()[PARENT_SPAN_ENV] == recording_span
+        with pytest.raises(ValueError):
+            with tracer.span("transcribe"):
+                raise ValueError("no audio")
+        assert tracer.current_span_id == job_span
+    assert tracer.current_span_id is None
+
+    spans = spans_by_name(tmp_path)
+    assert spans["job"]["parent_id"] is None
+    assert spans["recording"]["parent_id"] == spans["transcribe"]["parent_id"] == job_span
+    assert spans["recording"]["attributes"] == {"capture_mode": "audio"}
+    assert (spans["transcribe"]["status"], spans["transcribe"]["error"]) == ("error", "no audio")
+    assert spans["job"]["start"] <= spans["recording"]["start"] <= spans["recording"]["end"] <= spans["job"]["end"]
+
+
+def test_spans_in_concurrent_threads_keep_their_own_parents(tmp_path):
+    tracer = Tracer("job-1", parent_span_id="server-span", storage_root=str(tmp_path))
+    both_open = threading.Barrier(2)
+    outer = {}
+
+    def work(name):
+        with tracer.span(name) as span_id:
+            outer[name] = span_id
+            # Both outer spans are open before either opens its inner one
+            both_open.wait(timeout=5)
+            with tracer.span(f"{name}.inner"):
+                pass
+
+    threads = [threading.Thread(target=work, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    spans = spans_by_name(tmp_path)
+    for name in ("a", "b"):
+        assert spans[name]["parent_id"] == "server-span"
+        assert spans[f"{name}.inner"]["parent_id"] == outer[name]
+
+
+def test_tasks_and_worker_threads_nest_under_the_span_they_were_started_in(tmp_path):
+    tracer = Tracer("job-1", storage_root=str(tmp_path))
+
+    def blocking(name):
+        with tracing.span(name):
+            pass
+
+    async def step(name):
+        with tracing.span(name):
+            await asyncio.sleep(0.01)
+            await asyncio.to_thread(blocking, f"{name}.thread")
+
+    async def scenario():
+        previous = tracing.activate(tracer)
+        try:
+            with tracing.span("job"):
+                await asyncio.gather(step("a"), step("b"))
+        finally:
+            tracing.activate(previous)
+
+    asyncio.run(scenario())
+    assert tracing.current_tracer() is None
+    spans = spans_by_name(tmp_path)
+    assert spans["a"]["parent_id"] == spans["b"]["parent_id"] == spans["job"]["span_id"]
+    for name in ("a", "b"):
+        assert spans[f"{name}.thread"]["parent_id"] == spans[name]["span_id"]
@@ -0,0 +1,88 @@
+import os
+import subprocess
+import sys
+
+import transcription
+from transcription import LocalWhisperBackend, get_backend
+
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeSegment:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Transcribes a span of a 250-second recording as one word per second"""
+
+    def transcribe(self, audio, **options):
+        start, seconds = audio
+        end = min(int(start + seconds), 250)
+        return iter([FakeSegment(" ".join(f"w{i}" for i in range(int(start), end)))]), None
+
+
+def test_single_worker_decodes_in_process_and_stitches_the_overlap(monkeypatch):
+    monkeypatch.setattr(transcription, "probe_media", lambda path: {"duration": 250})
+    monkeypatch.setattr(transcription, "_decode_span", lambda path, start, seconds: (start, seconds))
+    monkeypatch.setattr(transcription, "_local_model", lambda *key: FakeModel())
+    monkeypatch.setattr(transcription, "_local_pools", {})
+
+    backend = LocalWhisperBackend(workers=1, chunk_seconds=100, overlap_seconds=3)
+    assert backend._spans(250) == [(0.0, 100.0), (97.0, 103.0), (197.0, 103.0)]
+
+    words = backend.transcribe("meeting.wav").split()
+    assert words == [f"w{i}" for i in range(250)]
+    assert transcription._local_pools == {}
+
+
+def test_live_chunks_use_a_single_in_process_worker(monkeypatch):
+    monkeypatch.setenv("TRANSCRIPTION_BACKEND", "local")
+    assert get_backend(live=True).workers == 1
+    assert get_backend().workers == transcription.LOCAL_STT_WORKERS
+    # Worker count does not change the text, so it does not split the cache
+    assert get_backend(live=True).cache_id == get_backend().cache_id
+
+
+def test_main_modules_do_nothing_on_import():
+    # Spawned workers import their parent's main module again
+    script = (
+        "import os, runpy, sys\n"
+        "before = os.fstat(1)\n"
+        "runpy.run_path('recorder_worker.py', run_name='__mp_main__')\n"
+        "runpy.run_path('run_server.py', run_name='__mp_main__')\n"
+        "assert os.fstat(1) == before\n"
+        "assert 'server' not in sys.modules and 'metamate' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=SERVICES_DIR, check=True)
+
+
+def test_stitch_drops_words_repeated_by_the_overlap():
+    assert transcription.stitch("", "  Hello there ") == "Hello there"
+    assert transcription.stitch("we should ship it on", "Ship it on Friday.") == "we should ship it on Friday."
+    # Punctuation and case do not hide a repeat
+    assert transcription.stitch("see you, Bob.", "bob see you tomorrow") == "see you, Bob. see you tomorrow"
+    # A chunk made only of repeated words adds nothing
+    assert transcription.stitch("all of this", "of this") == "all of this"
+
+
+def test_stitch_keeps_text_without_overlap():
+    assert transcription.stitch("first part", "second part") == "first part second part"
+    assert transcription.stitch("", "") == ""
+
+
+def test_benchmark_skips_samples_without_audio(monkeypatch):
+    import transcription_benchmark
+
+    durations = {"empty.wav": 0.0, "meeting.wav": 20.0}
+    monkeypatch.setattr(transcription_benchmark, "probe_media", lambda path: {"duration": durations[path]})
+
+    class Backend:
+        def transcribe(self, path):
+            assert path == "meeting.wav"
+            return "a few words"
+
+    samples = transcription_benchmark.audio_samples(["empty.wav", "meeting.wav"])
+    assert samples == [("meeting.wav", 20.0)]
+    [(path, duration, seconds, words)] = transcription_benchmark.benchmark(Backend(), samples)
+    assert (path, duration, words) == ("meeting.wav", 20.0, 3)
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+
+TRACE_FILE = "trace.jsonl"
+
+# Carry the trace into the recorder subprocess
+TRACE_ID_ENV = "METAMATE_TRACE_ID"
+PARENT_SPAN_ENV = "METAMATE_PARENT_SPAN_ID"
+JOB_ID_ENV = "METAMATE_JOB_ID"
+
+# Per task (and inherited by threads started with asyncio.to_thread), not per thread
+_current = contextvars.ContextVar("tracer", default=None)
+# (tracer, span id) of the innermost open span, likewise per task or thread
+_open_span = contextvars.ContextVar("open_span", default=None)
+_write_lock = threading.Lock()
+
+
+def new_id():
+    return uuid.uuid4().hex[:16]
+
+
+def trace_path(job_id, storage_root="storage"):
+    return os.path.join(storage_root, job_id, TRACE_FILE)
+
+
+class Tracer:
+    """Writes one job's spans as JSON lines to storage/<job_id>/trace.jsonl
+
+    The server and the recorder subprocess append to the same file; each span
+    is a single short write, so lines from the two processes do not interleave.
+    Open spans are tracked per task or thread, so spans opened concurrently on
+    one tracer each nest under their own parent.
+    """
+
+    def __init__(self, job_id, trace_id=None, parent_span_id=None, storage_root="storage"):
+        self.job_id = job_id
+        self.trace_id = trace_id or new_id()
+        self.path = trace_path(job_id, storage_root)
+        self.parent_span_id = parent_span_id
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """The tracer a parent process handed down, or None if it did not"""
+        job_id = os.getenv(JOB_ID_ENV)
+        trace_id = os.getenv(TRACE_ID_ENV)
+        if not job_id or not trace_id:
+            return None
+        return cls(job_id, trace_id, os.getenv(PARENT_SPAN_ENV))
+
+    @property
+    def current_span_id(self):
+        current = _open_span.get()
+        if current and current[0] is self:
+            return current[1]
+        return self.parent_span_id
+
+    def env(self):
+        """Environment for a subprocess whose spans belong under the current span"""
+        env = {JOB_ID_ENV: self.job_id, TRACE_ID_ENV: self.trace_id}
+        if self.current_span_id:
+            env[PARENT_SPAN_ENV] = self.current_span_id
+        return env
+
+    def record(self, name, start, end, span_id=None, parent_id=None, status="ok", error=None, **attributes):
+        """Write a finished span"""
+        entry = {
+            "trace_id": self.trace_id,
+            "span_id": span_id or new_id(),
+            "parent_id": parent_id if parent_id is not None else self.current_span_id,
+            "job_id": self.job_id,
+            "name": name,
+            "start": round(start, 6),
+            "end": round(end, 6),
+            "duration": round(end - start, 6),
+            "status": status,
+            "error": error,
+            "pid": os.getpid(),
+            "thread": threading.current_thread().name,
+            "attributes": attributes,
+        }
+        line = json.dumps(entry, default=str) + "\n"
+        try:
+            with _write_lock, open(self.path, "a") as f:
+                f.write(line)
+        except OSError as e:
+            print(f"Failed to write trace span {name}: {e}")
+
+    @contextmanager
+    def span(self, name, **attributes):
+        span_id = new_id()
+        parent_id = self.current_span_id
+        token = _open_span.set((self, span_id))
+        start = time.time()
+        try:
+            yield span_id
+        except BaseException as e:
+            _open_span.reset(token)
+            self.record(name, start, time.time(), span_id, parent_id, "error", str(e), **attributes)
+            raise
+        _open_span.reset(token)
+        self.record(name, start, time.time(), span_id, parent_id, **attributes)
+
+
+def activate(tracer):
+    """Make tracer the current one in this context; returns the one it replaced"""
+    previous = _current.get()
+    _current.set(tracer)
+    return previous
+
+
+def current_tracer():
+    return _current.get()
+
+
+@contextmanager
+def span(name, **attributes):
+    """Span on the current context's tracer; does nothing outside a traced job"""
+    tracer = current_tracer()
+    if tracer is None:
+        yield None
+        return
+    with tracer.span(name, **attributes) as span_id:
+        yield span_id
+
+
+def load_trace(job_id, trace_id=None, storage_root="storage"):
+    """Spans recorded for a job, oldest first, optionally only those of one trace"""
+    path = trace_path(job_id, storage_root)
+    if not os.path.exists(path):
+        return []
+
+    spans = []
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if trace_id is None or entry["trace_id"] == trace_id:
+                spans.append(entry)
+    return sorted(spans, key=lambda entry: entry["start"])
@@ -0,0 +1,309 @@
+import os
+import re
+import threading
+import mimetypes
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import requests
+
+from media import probe_media
+
+DEFAULT_DEEPGRAM_API_KEY = "b0a780c4baf6565a49a07b8fef1284bd3ad52384"
+
+# Local engine: a CTranslate2 Whisper model (faster-whisper) run on the CPU
+LOCAL_STT_MODEL = os.getenv("LOCAL_STT_MODEL", "small.en")
+LOCAL_STT_COMPUTE_TYPE = os.getenv("LOCAL_STT_COMPUTE_TYPE", "int8")
+LOCAL_STT_LANGUAGE = os.getenv("LOCAL_STT_LANGUAGE", "en")
+LOCAL_STT_BEAM_SIZE = int(os.getenv("LOCAL_STT_BEAM_SIZE", 1))
+# Each worker decodes one chunk at a time with this many threads, and holds its own
+# copy of the model; with a single worker, chunks are decoded in the calling process
+LOCAL_STT_THREADS_PER_WORKER = int(os.getenv("LOCAL_STT_THREADS_PER_WORKER", 2))
+LOCAL_STT_WORKERS = int(os.getenv("LOCAL_STT_WORKERS", 2))
+# Live chunks are decoded one at a time inside each recorder process
+LOCAL_STT_LIVE_WORKERS = 1
+LOCAL_STT_CHUNK_SECONDS = float(os.getenv("LOCAL_STT_CHUNK_SECONDS", 120))
+# Audio from the end of the previous chunk prepended to each chunk, as for live chunks
+LOCAL_STT_CHUNK_OVERLAP_SECONDS = float(os.getenv("LOCAL_STT_CHUNK_OVERLAP_SECONDS", 3))
+SAMPLE_RATE = 16000
+
+# Longest run of words checked when trimming text repeated by the overlap
+MAX_OVERLAP_WORDS = 30
+
+
+def _normalize(word):
+    return re.sub(r"[^\w']", "", word).lower()
+
+
+def stitch(transcript, text):
+    """Append text to transcript, dropping words the overlap made it repeat"""
+    if not transcript:
+        return text.strip()
+
+    previous = transcript.split()
+    incoming = text.split()
+    previous_norm = [_normalize(w) for w in previous[-MAX_OVERLAP_WORDS:]]
+    incoming_norm = [_normalize(w) for w in incoming[:MAX_OVERLAP_WORDS]]
+
+    overlap = 0
+    for size in range(min(len(previous_norm), len(incoming_norm)), 0, -1):
+        if previous_norm[-size:] == incoming_norm[:size]:
+            overlap = size
+            break
+
+    remainder = " ".join(incoming[overlap:])
+    return f"{transcript} {remainder}".strip() if remainder else transcript
+
+
+class TranscriptionBackend:
+    """Turns an audio file into plain transcript text"""
+
+    name = "base"
+
+    @property
+    def cache_id(self):
+        """Identifies the engine and settings, so cached transcripts are not shared across them"""
+        return self.name
+
+    def transcribe(self, audio_file_path):
+        raise NotImplementedError
+
+
+class DeepgramBackend(TranscriptionBackend):
+    """Deepgram pre-recorded transcription API"""
+
+    name = "deepgram"
+
+    def __init__(self, api_key=None, model="nova-2", language="en-US"):
+        self.api_key = api_key or os.getenv("DEEPGRAM_API_KEY", DEFAULT_DEEPGRAM_API_KEY)
+        self.model = model
+        self.language = language
+        self._client = None
+
+    @property
+    def cache_id(self):
+        return f"{self.name}:{self.model}:{self.language}"
+
+    def transcribe(self, audio_file_path):
+        from deepgram import DeepgramClient, PrerecordedOptions
+
+        if self._client is None:
+            self._client = DeepgramClient(self.api_key)
+
+        with open(audio_file_path, 'rb') as buffer_data:
+            payload = {'buffer': buffer_data}
+
+            options = PrerecordedOptions(
+                smart_format=True,
+                model=self.model,
+                language=self.language
+            )
+
+            response = self._client.listen.rest.v('1').transcribe_file(payload, options)
+
+        # too much long response - just need the transcript
+        return response['results']['channels'][0]['alternatives'][0]['transcript']
+
+
+class HTTPBackend(TranscriptionBackend):
+    """Any service that accepts raw audio in a POST body and answers {"transcript": "..."}
+
+    Used to point the pipeline at a self-hosted engine or a local stand-in server.
+    """
+
+    name = "http"
+
+    def __init__(self, url=None, timeout=300):
+        self.url = url or os.getenv("TRANSCRIPTION_URL")
+        if not self.url:
+            raise ValueError("TRANSCRIPTION_URL must be set to use the http transcription backend.")
+        self.timeout = timeout
+
+    @property
+    def cache_id(self):
+        return f"{self.name}:{self.url}"
+
+    def transcribe(self, audio_file_path):
+        content_type = mimetypes.guess_type(audio_file_path)[0] or "application/octet-stream"
+        with open(audio_file_path, 'rb') as audio:
+            response = requests.post(
+                self.url,
+                data=audio,
+                headers={"Content-Type": content_type},
+                timeout=self.timeout
+            )
+        response.raise_for_status()
+        return response.json()["transcript"]
+
+
+# Models loaded in this process, by (model, compute type, threads)
+_models = {}
+_models_lock = threading.Lock()
+
+
+def _local_model(model, compute_type, cpu_threads):
+    key = (model, compute_type, cpu_threads)
+    with _models_lock:
+        if key not in _models:
+            from faster_whisper import WhisperModel
+
+            _models[key] = WhisperModel(model, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+        return _models[key]
+
+
+def _decode_span(audio_file_path, start, seconds):
+    """start..start+seconds of the file as 16 kHz mono float samples"""
+    import numpy
+
+    result = subprocess.run(
+        [
+            "ffmpeg", "-nostdin", "-v", "error",
+            "-ss", str(start), "-t", str(seconds), "-i", audio_file_path,
+            "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True
+    )
+    return numpy.frombuffer(result.stdout, numpy.int16).astype(numpy.float32) / 32768.0
+
+
+def _transcribe_span(audio_file_path, start, seconds, model_key, language, beam_size):
+    audio = _decode_span(audio_file_path, start, seconds)
+    segments, _ = _local_model(*model_key).transcribe(
+        audio,
+        language=language or None,
+        beam_size=beam_size,
+        # Chunks are decoded independently, so there is no earlier text to condition on
+        condition_on_previous_text=False,
+        vad_filter=True
+    )
+    return " ".join(segment.text.strip() for segment in segments)
+
+
+# Worker pools outlive a single transcription, so models are loaded once per process
+_local_pools = {}
+_local_pools_lock = threading.Lock()
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """faster-whisper on the CPU, with no network calls
+
+    The audio is split into overlapping chunks that are decoded in parallel by
+    a pool of worker processes, each holding its own copy of the model, and
+    the chunk transcripts are stitched back together in order. With a single
+    worker the chunks are decoded in the calling process instead.
+    """
+
+    name = "local"
+
+    def __init__(self, model=None, compute_type=None, language=None, beam_size=None, workers=None,
+                 threads_per_worker=None, chunk_seconds=None, overlap_seconds=None):
+        self.model = model or LOCAL_STT_MODEL
+        self.compute_type = compute_type or LOCAL_STT_COMPUTE_TYPE
+        self.language = LOCAL_STT_LANGUAGE if language is None else language
+        self.beam_size = beam_size or LOCAL_STT_BEAM_SIZE
+        self.threads_per_worker = threads_per_worker or LOCAL_STT_THREADS_PER_WORKER
+        self.workers = workers or LOCAL_STT_WORKERS
+        self.chunk_seconds = chunk_seconds or LOCAL_STT_CHUNK_SECONDS
+        self.overlap_seconds = LOCAL_STT_CHUNK_OVERLAP_SECONDS if overlap_seconds is None else overlap_seconds
+
+    @property
+    def cache_id(self):
+        # Chunking changes the text at chunk boundaries; the number of workers does not
+        return (f"{self.name}:{self.model}:{self.compute_type}:{self.language}:"
+                f"{self.beam_size}:{self.chunk_seconds}:{self.overlap_seconds}")
+
+    def _model_key(self):
+        return (self.model, self.compute_type, self.threads_per_worker)
+
+    def _pool_key(self):
+        return self._model_key() + (self.workers,)
+
+    def _pool(self):
+        with _local_pools_lock:
+            pool = _local_pools.get(self._pool_key())
+            if pool is None:
+                print(f"Starting {self.workers} local transcription worker(s) with model {self.model}")
+                pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    # Spawned, not forked: the server has threads and an event loop running
+                    mp_context=multiprocessing.get_context("spawn"),
+                    # Load the model as each worker starts, not on its first chunk
+                    initializer=_local_model,
+                    initargs=self._model_key(),
+                )
+                _local_pools[self._pool_key()] = pool
+            return pool
+
+    def _spans(self, duration):
+        """(start, seconds) of each chunk, every one but the first reaching back by the overlap"""
+        spans = []
+        chunk_start = 0.0
+        while chunk_start < duration:
+            start = max(0.0, chunk_start - self.overlap_seconds)
+            spans.append((start, chunk_start + self.chunk_seconds - start))
+            chunk_start += self.chunk_seconds
+        return spans
+
+    def transcribe(self, audio_file_path):
+        spans = self._spans(probe_media(audio_file_path)["duration"])
+        args = (self._model_key(), self.language, self.beam_size)
+        if self.workers == 1:
+            return _stitch_all(_transcribe_span(audio_file_path, start, seconds, *args) for start, seconds in spans)
+
+        pool = self._pool()
+        try:
+            futures = [pool.submit(_transcribe_span, audio_file_path, start, seconds, *args) for start, seconds in spans]
+            return _stitch_all(future.result() for future in futures)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool next time
+            with _local_pools_lock:
+                if _local_pools.get(self._pool_key()) is pool:
+                    del _local_pools[self._pool_key()]
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+
+def _stitch_all(texts):
+    transcript = ""
+    for text in texts:
+        transcript = stitch(transcript, text)
+    return transcript
+
+
+def close_local_pools():
+    """Stop the local engine's worker processes"""
+    with _local_pools_lock:
+        pools = list(_local_pools.values())
+        _local_pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+BACKENDS = {
+    DeepgramBackend.name: DeepgramBackend,
+    HTTPBackend.name: HTTPBackend,
+    LocalWhisperBackend.name: LocalWhisperBackend,
+}
+
+
+def get_backend(name=None, deepgram_api_key=None, live=False):
+    """Build the transcription backend selected by name or TRANSCRIPTION_BACKEND
+
+    live is set for the short chunks transcribed inside a recorder process
+    while its meeting runs.
+    """
+    name = name or os.getenv("TRANSCRIPTION_BACKEND", DeepgramBackend.name)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown transcription backend: {name}")
+
+    if name == DeepgramBackend.name:
+        return DeepgramBackend(api_key=deepgram_api_key)
+    if name == LocalWhisperBackend.name and live:
+        # Every concurrent recording would otherwise start a pool of its own
+        return LocalWhisperBackend(workers=LOCAL_STT_LIVE_WORKERS)
+    return BACKENDS[name]()
+
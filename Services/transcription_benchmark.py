@@ -0,0 +1,83 @@
+# Compares transcription backends on recorded samples by real-time factor
+# (seconds spent transcribing per second of audio; below 1 is faster than real time).
+#
+#   python3 transcription_benchmark.py recordings/audio.wav other.wav --backends local,deepgram
+#
+# Each backend first transcribes the first sample once untimed, so the local
+# engine's worker start-up and model load are not counted against every file.
+import sys
+import time
+import argparse
+
+from media import probe_media
+from transcription import BACKENDS, close_local_pools, get_backend
+
+
+def audio_samples(audio_paths):
+    """[(path, audio seconds)] for the samples that have any audio; empty ones have no RTF"""
+    samples = []
+    for path in audio_paths:
+        duration = probe_media(path)["duration"]
+        if duration > 0:
+            samples.append((path, duration))
+        else:
+            print(f"Skipping {path}: no audio")
+    return samples
+
+
+def benchmark(backend, samples, runs=1, warmup=True):
+    """[(path, audio seconds, best transcription seconds, words)] for one backend"""
+    if warmup and samples:
+        backend.transcribe(samples[0][0])
+
+    results = []
+    for path, duration in samples:
+        timings = []
+        for _ in range(runs):
+            started_at = time.monotonic()
+            transcript = backend.transcribe(path)
+            timings.append(time.monotonic() - started_at)
+        results.append((path, duration, min(timings), len(transcript.split())))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Real-time factor of transcription backends")
+    parser.add_argument("audio", nargs="+", help="recorded audio files to transcribe")
+    parser.add_argument("--backends", default="local,deepgram",
+                        help=f"comma-separated, from {', '.join(BACKENDS)}")
+    parser.add_argument("--runs", type=int, default=1, help="timed runs per file; the fastest is kept")
+    parser.add_argument("--no-warmup", action="store_true", help="count start-up in the first file's time")
+    args = parser.parse_args()
+
+    samples = audio_samples(args.audio)
+    if not samples:
+        print("No samples with audio to benchmark")
+        return 1
+
+    totals = {}
+    for name in args.backends.split(","):
+        backend = get_backend(name.strip())
+        print(f"Benchmarking {backend.cache_id}...")
+        try:
+            results = benchmark(backend, samples, args.runs, warmup=not args.no_warmup)
+        except Exception as e:
+            print(f"  failed: {e}")
+            continue
+
+        for path, duration, seconds, words in results:
+            print(f"  {path}: {duration:.1f}s audio in {seconds:.1f}s, "
+                  f"RTF {seconds / duration:.3f}, {words} words")
+        audio_seconds = sum(result[1] for result in results)
+        totals[backend.name] = sum(result[2] for result in results) / audio_seconds
+
+    print("\nBackend       RTF")
+    for name, rtf in sorted(totals.items(), key=lambda item: item[1]):
+        print(f"{name:<12}  {rtf:.3f}")
+
+    close_local_pools()
+    return 0 if totals else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())